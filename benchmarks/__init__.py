@@ -0,0 +1,8 @@
+"""
+Benchmarks of flowutils.
+
+Run them with 'python -m benchmarks.run'. Store a baseline on your machine
+with '--save-baseline', later runs then fail if a median is slower than the
+baseline by more than '--threshold'. The baseline is machine specific and
+not checked in.
+"""
@@ -0,0 +1,84 @@
+"""Generators of synthetic fixtures for the benchmarks"""
+
+import os
+from typing import List
+
+from PIL import Image
+
+from flowutils.utils import FlowConfig, GitRepoConfig, LinkConfig, SortingRuleConfig
+
+
+def scaled(count: int, scale: float) -> int:
+    """Scale a fixture size, keeping at least one item."""
+    return max(1, int(count * scale))
+
+
+def generate_sort_folder(root: str, files: int, rules: int) -> List[SortingRuleConfig]:
+    """Create a folder with files matching the keywords of the returned rules."""
+    os.makedirs(root, exist_ok=True)
+    keywords = [f"keyword{idx}" for idx in range(rules)]
+    for idx in range(files):
+        # every fourth file matches no rule and stays in place
+        name = f"{keywords[idx % rules]}_{idx}.txt" if idx % 4 else f"other_{idx}.txt"
+        with open(os.path.join(root, name), "w") as f:
+            f.write(name)
+    return [
+        SortingRuleConfig(sub_folder_name=f"Sorted{idx}", contain_list=[keyword])
+        for idx, keyword in enumerate(keywords)
+    ]
+
+
+def generate_images(root: str, count: int, size: int):
+    """Create JPEG images with a gradient of the given edge length."""
+    os.makedirs(root, exist_ok=True)
+    gradient = Image.linear_gradient("L").resize((size, size))
+    image = Image.merge("RGB", (gradient, gradient.rotate(90), gradient.rotate(180)))
+    for idx in range(count):
+        image.save(os.path.join(root, f"image{idx}.jpg"), quality=90)
+
+
+def generate_config(
+    root: str, repos: int, links: int, projects: int = 50
+) -> FlowConfig:
+    """Create a config with many repositories, links and projects below root."""
+    project_location = os.path.join(root, "Projects")
+    return FlowConfig(
+        link_location=os.path.join(root, "Links"),
+        project_location=project_location,
+        project_names=[f"project{idx}" for idx in range(projects)],
+        project_subdirs=["docs", "src"],
+        links=[
+            LinkConfig(
+                target=os.path.join(project_location, f"project{idx % projects}"),
+                name=f"link{idx}",
+            )
+            for idx in range(links)
+        ],
+        git_repos=[
+            GitRepoConfig(
+                url=f"https://example.com/team/repo{idx}.git",
+                file_location=os.path.join(
+                    project_location, f"project{idx % projects}", f"repo{idx}", ".git"
+                ),
+            )
+            for idx in range(repos)
+        ],
+    )
+
+
+def generate_repo_tree(project_location: str, repos: int, projects: int = 50):
+    """
+    Create working trees with a minimal '.git' folder holding the origin url.
+
+    That is all 'repos collect' reads, so no git process is needed.
+    """
+    for idx in range(repos):
+        git_dir = os.path.join(
+            project_location, f"project{idx % projects}", f"repo{idx}", ".git"
+        )
+        os.makedirs(os.path.join(git_dir, "..", "src"), exist_ok=True)
+        os.makedirs(git_dir, exist_ok=True)
+        with open(os.path.join(git_dir, "config"), "w") as f:
+            f.write(
+                f'[remote "origin"]\n\turl = https://example.com/team/repo{idx}.git\n'
+            )
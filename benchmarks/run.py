@@ -0,0 +1,250 @@
+"""Run the benchmarks, save the results and compare them against a baseline"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import rich
+import typer
+from rich.table import Table
+from typer.testing import CliRunner
+
+from benchmarks.generators import (
+    generate_config,
+    generate_images,
+    generate_repo_tree,
+    generate_sort_folder,
+    scaled,
+)
+from flowutils import links, repos
+from flowutils.image import resize_images
+from flowutils.sort import sort_folder
+from flowutils.utils import load_config, save_config
+
+app = typer.Typer()
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+@dataclass
+class Benchmark:
+    """
+    A named benchmark.
+
+    The setup creates its fixtures in a fresh folder with the given scale and
+    returns the function that is timed, so fixtures are never measured.
+    """
+
+    name: str
+    setup: Callable[[str, float], Callable[[], None]]
+
+
+@contextlib.contextmanager
+def flow_config(path: str):
+    """Point FLOW_CONFIG to a config file while the block runs."""
+    previous = os.environ.get("FLOW_CONFIG")
+    os.environ["FLOW_CONFIG"] = path
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ["FLOW_CONFIG"]
+        else:
+            os.environ["FLOW_CONFIG"] = previous
+
+
+def setup_sort_folder(root: str, scale: float):
+    folder = os.path.join(root, "Downloads")
+    rules = generate_sort_folder(folder, scaled(2000, scale), scaled(20, scale))
+    return lambda: sort_folder(folder, rules)
+
+
+def setup_resize_images(root: str, scale: float):
+    source = os.path.join(root, "images")
+    generate_images(source, scaled(20, scale), 2048)
+    return lambda: resize_images(
+        source, os.path.join(root, "resized"), ["jpg"], 512, 85
+    )
+
+
+def setup_config_roundtrip(root: str, scale: float):
+    config_path = os.path.join(root, "config.yaml")
+    with flow_config(config_path):
+        save_config(generate_config(root, scaled(2000, scale), scaled(2000, scale)))
+
+    def roundtrip():
+        with flow_config(config_path):
+            config = load_config()
+            config.add_project("benchmark")
+            save_config(config)
+
+    return roundtrip
+
+
+def setup_links_create(root: str, scale: float):
+    config_path = os.path.join(root, "config.yaml")
+    with flow_config(config_path):
+        save_config(generate_config(root, 0, scaled(1000, scale)))
+
+    def create():
+        with flow_config(config_path):
+            result = CliRunner().invoke(links.app, ["create"])
+        assert result.exit_code == 0, result.output
+
+    return create
+
+
+def setup_repos_collect(root: str, scale: float):
+    config_path = os.path.join(root, "config.yaml")
+    config = generate_config(root, 0, 0)
+    generate_repo_tree(config.project_location, scaled(500, scale))
+    with flow_config(config_path):
+        save_config(config)
+
+    def collect():
+        with flow_config(config_path):
+            result = CliRunner().invoke(repos.app, ["collect", "--full"])
+        assert result.exit_code == 0, result.output
+
+    return collect
+
+
+def setup_cli_help(root: str, scale: float):
+    def cli_help():
+        subprocess.run(
+            [sys.executable, "-m", "flowutils.main", "--help"],
+            check=True,
+            capture_output=True,
+        )
+
+    return cli_help
+
+
+BENCHMARKS = [
+    Benchmark("sort_folder", setup_sort_folder),
+    Benchmark("resize_images", setup_resize_images),
+    Benchmark("config_roundtrip", setup_config_roundtrip),
+    Benchmark("links_create", setup_links_create),
+    Benchmark("repos_collect", setup_repos_collect),
+    Benchmark("cli_help", setup_cli_help),
+]
+
+
+def run_benchmark(benchmark: Benchmark, scale: float, repeat: int) -> Dict:
+    """Time a benchmark, with fresh fixtures and without console output for every run."""
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix="flow-bench-") as root:
+            measured = benchmark.setup(root, scale)
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                measured()
+                runs.append(time.perf_counter() - start)
+    return {"median": statistics.median(runs), "min": min(runs), "runs": runs}
+
+
+def run_benchmarks(
+    scale: float = 1.0, repeat: int = 5, names: Optional[List[str]] = None
+) -> Dict:
+    """Run the selected benchmarks, all by default."""
+    results = {
+        benchmark.name: run_benchmark(benchmark, scale, repeat)
+        for benchmark in BENCHMARKS
+        if not names or benchmark.name in names
+    }
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "results": results,
+    }
+
+
+def find_regressions(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Get the benchmarks whose median grew by more than the threshold."""
+    regressions = []
+    for name, result in current["results"].items():
+        previous = baseline["results"].get(name)
+        if previous and result["median"] > previous["median"] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def print_results(current: Dict, baseline: Optional[Dict], regressions: List[str]):
+    table = Table(title=f"Benchmarks (scale {current['scale']})")
+    table.add_column("Benchmark")
+    table.add_column("Median", justify="right")
+    table.add_column("Min", justify="right")
+    table.add_column("Baseline", justify="right")
+    table.add_column("Change", justify="right")
+    for name, result in current["results"].items():
+        previous = (baseline or {}).get("results", {}).get(name)
+        change = "-"
+        if previous:
+            change = f"{result['median'] / previous['median'] - 1:+.0%}"
+            if name in regressions:
+                change = f"[red]{change}"
+        table.add_row(
+            name,
+            f"{result['median'] * 1000:.1f} ms",
+            f"{result['min'] * 1000:.1f} ms",
+            f"{previous['median'] * 1000:.1f} ms" if previous else "-",
+            change,
+        )
+    rich.print(table)
+
+
+@app.command()
+def main(
+    names: List[str] = typer.Argument(None, help="Benchmarks to run, all by default"),
+    scale: float = typer.Option(1.0, help="Multiplier of the fixture sizes"),
+    repeat: int = typer.Option(5, help="Number of timed runs per benchmark"),
+    output: Optional[str] = typer.Option(None, help="Write the results as JSON"),
+    baseline: str = typer.Option(DEFAULT_BASELINE, help="Baseline results to compare"),
+    save_baseline: bool = typer.Option(
+        False, "--save-baseline", help="Store the results as the new baseline"
+    ),
+    threshold: float = typer.Option(
+        0.2, help="Allowed slowdown of the median against the baseline, 0.2 is 20%"
+    ),
+):
+    """Run the benchmarks and fail if one regressed against the baseline."""
+    current = run_benchmarks(scale, repeat, names)
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    previous = None
+    if os.path.isfile(baseline):
+        with open(baseline, "r") as f:
+            previous = json.load(f)
+        if previous.get("scale") != current["scale"]:
+            rich.print("[yellow]Baseline was recorded with another scale, ignored.")
+            previous = None
+
+    regressions = find_regressions(current, previous, threshold) if previous else []
+    print_results(current, previous, regressions)
+
+    if save_baseline:
+        with open(baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        rich.print(f"[blue]Baseline saved to: {baseline}")
+    elif regressions:
+        rich.print(
+            f"[red]Slower than the baseline by more than {threshold:.0%}: "
+            f"{', '.join(regressions)}"
+        )
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
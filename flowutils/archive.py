@@ -0,0 +1,252 @@
+"""module for streaming project folders into compressed archives"""
+
+import gzip
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+from dataclasses import dataclass
+from typing import List, Optional
+
+# read and write the tar stream in large blocks so the compressor stays busy
+STREAM_BUFFER = 1024 * 1024
+
+
+@dataclass
+class Compressor:
+    """A compressor command that reads stdin and writes stdout."""
+
+    extension: str
+    compress: Optional[List[str]]
+    decompress: Optional[List[str]]
+
+
+# preferred first, the gzip entry without commands is the in-process fallback
+COMPRESSORS = [
+    Compressor(".tar.zst", ["zstd", "-T0", "-q", "-c"], ["zstd", "-d", "-q", "-c"]),
+    Compressor(".tar.gz", ["pigz", "-c"], ["pigz", "-d", "-c"]),
+    Compressor(".tar.gz", None, None),
+]
+
+
+class ArchiveError(Exception):
+    """Raised when an archive cannot be written, verified or extracted."""
+
+
+@dataclass
+class ArchiveSummary:
+    """Number of members and bytes of file content in an archive."""
+
+    members: int = 0
+    size: int = 0
+
+
+def find_compressor() -> Compressor:
+    """Get the fastest compressor that is installed."""
+    for compressor in COMPRESSORS:
+        if compressor.compress is None or shutil.which(compressor.compress[0]):
+            return compressor
+    return COMPRESSORS[-1]
+
+
+def find_decompressor(archive_path: str) -> Compressor:
+    """Get a compressor able to read an archive, based on its extension."""
+    for compressor in COMPRESSORS:
+        if not archive_path.endswith(compressor.extension):
+            continue
+        if compressor.decompress is None or shutil.which(compressor.decompress[0]):
+            return compressor
+    raise ArchiveError(f"No decompressor installed for '{archive_path}'")
+
+
+def _count(summary: ArchiveSummary, member: tarfile.TarInfo):
+    summary.members += 1
+    summary.size += member.size if member.isfile() else 0
+
+
+def _run_stream(command: List[str], stdin, stdout) -> subprocess.Popen:
+    return subprocess.Popen(
+        command, stdin=stdin, stdout=stdout, stderr=subprocess.PIPE, bufsize=0
+    )
+
+
+def _finish(process: subprocess.Popen, check: bool = True):
+    stderr = process.stderr.read().decode(errors="replace")
+    if process.wait() != 0 and check:
+        raise ArchiveError(f"'{process.args[0]}' failed: {stderr.strip()}")
+
+
+def write_archive(
+    source: str, archive_path: str, compressor: Compressor
+) -> ArchiveSummary:
+    """
+    Stream a folder as a tar into a compressor, without temporary copies.
+
+    The tar stream is written straight into the stdin of the compressor,
+    which writes the archive file.
+    """
+    summary = ArchiveSummary()
+
+    def add_filter(member: tarfile.TarInfo) -> tarfile.TarInfo:
+        _count(summary, member)
+        return member
+
+    arcname = os.path.basename(os.path.normpath(source))
+    with open(archive_path, "wb") as archive_file:
+        if compressor.compress is None:
+            with gzip.GzipFile(
+                fileobj=archive_file, mode="wb", compresslevel=6
+            ) as stream:
+                with tarfile.open(
+                    fileobj=stream, mode="w|", bufsize=STREAM_BUFFER
+                ) as tar:
+                    tar.add(source, arcname=arcname, filter=add_filter)
+            return summary
+
+        process = _run_stream(compressor.compress, subprocess.PIPE, archive_file)
+        failed = True
+        try:
+            with tarfile.open(
+                fileobj=process.stdin, mode="w|", bufsize=STREAM_BUFFER
+            ) as tar:
+                tar.add(source, arcname=arcname, filter=add_filter)
+            failed = False
+        finally:
+            process.stdin.close()
+            # don't hide the error that stopped the stream early
+            _finish(process, check=not failed)
+    return summary
+
+
+def _open_stream(archive_path: str, compressor: Compressor, archive_file):
+    if compressor.decompress is None:
+        return None, gzip.GzipFile(fileobj=archive_file, mode="rb")
+    process = _run_stream(compressor.decompress, archive_file, subprocess.PIPE)
+    return process, process.stdout
+
+
+def restore_filter(member: tarfile.TarInfo, dest_path: str) -> tarfile.TarInfo:
+    """
+    Extraction filter used for restoring archives.
+
+    Same as the 'data' filter, except that symlinks may point anywhere, so
+    projects with links like '.venv/bin/python' restore as they were written.
+    Members are still never written outside of the destination.
+    """
+    if not member.issym():
+        return tarfile.data_filter(member, dest_path)
+    checked = tarfile.data_filter(member.replace(linkname=".", deep=False), dest_path)
+    return checked.replace(linkname=member.linkname, deep=False)
+
+
+def read_archive(
+    archive_path: str, compressor: Compressor, extract_to: Optional[str] = None
+) -> ArchiveSummary:
+    """
+    Decompress and read the whole archive, extracting it if a folder is given.
+
+    Reading every member also checks the integrity of the compressed stream.
+    Without a folder, members are checked with the filter used for extracting,
+    so an archive that verifies can also be restored.
+    """
+    summary = ArchiveSummary()
+    use_filter = hasattr(tarfile, "data_filter")
+    with tempfile.TemporaryDirectory() as empty_dir:
+        with open(archive_path, "rb") as archive_file:
+            process, stream = _open_stream(archive_path, compressor, archive_file)
+            failed = True
+            try:
+                with tarfile.open(
+                    fileobj=stream, mode="r|", bufsize=STREAM_BUFFER
+                ) as tar:
+                    for member in tar:
+                        _count(summary, member)
+                        if extract_to is not None:
+                            if use_filter:
+                                tar.extract(member, extract_to, filter=restore_filter)
+                            else:
+                                tar.extract(member, extract_to)
+                            continue
+                        if use_filter:
+                            restore_filter(member, empty_dir)
+                        if member.isfile():
+                            extracted = tar.extractfile(member)
+                            while extracted.read(STREAM_BUFFER):
+                                pass
+                # read the padding after the end marker so the decompressor can finish
+                while stream.read(STREAM_BUFFER):
+                    pass
+                failed = False
+            except (tarfile.TarError, EOFError, OSError) as e:
+                raise ArchiveError(f"Could not read '{archive_path}': {e}") from e
+            finally:
+                stream.close()
+                if process is not None:
+                    # a failed read stops the decompressor early, keep the first error
+                    _finish(process, check=not failed)
+    return summary
+
+
+def archive_folder(source: str, archive_dir: str) -> str:
+    """
+    Archive a folder, verify the archive and return its path.
+
+    The archive is written to a '.part' file and only renamed into place
+    once reading it back yields the same members and bytes.
+    """
+    compressor = find_compressor()
+    name = os.path.basename(os.path.normpath(source))
+    archive_path = os.path.join(archive_dir, name + compressor.extension)
+    if os.path.exists(archive_path):
+        raise ArchiveError(f"Archive '{archive_path}' already exists")
+    os.makedirs(archive_dir, exist_ok=True)
+
+    part_path = archive_path + ".part"
+    try:
+        written = write_archive(source, part_path, compressor)
+        verified = read_archive(part_path, compressor)
+    except BaseException as e:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        if isinstance(e, OSError):
+            raise ArchiveError(str(e)) from e
+        raise
+    if written != verified:
+        os.remove(part_path)
+        raise ArchiveError(
+            f"Verification failed: wrote {written.members} members, read {verified.members}"
+        )
+    os.replace(part_path, archive_path)
+    return archive_path
+
+
+def find_archive(archive_dir: str, name: str) -> Optional[str]:
+    """Get the archive of a folder name, if there is one."""
+    for compressor in COMPRESSORS:
+        archive_path = os.path.join(archive_dir, name + compressor.extension)
+        if os.path.isfile(archive_path):
+            return archive_path
+    return None
+
+
+def restore_folder(archive_path: str, destination: str) -> ArchiveSummary:
+    """
+    Extract an archive into the destination folder.
+
+    The archive is extracted into a temporary folder next to its target and
+    only renamed into place once every member was extracted.
+    """
+    compressor = find_decompressor(archive_path)
+    os.makedirs(destination, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(prefix=".restore-", dir=destination)
+    try:
+        summary = read_archive(archive_path, compressor, temp_dir)
+        for entry in os.listdir(temp_dir):
+            target = os.path.join(destination, entry)
+            if os.path.lexists(target):
+                raise ArchiveError(f"'{target}' already exists")
+            os.rename(os.path.join(temp_dir, entry), target)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return summary
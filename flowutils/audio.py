@@ -1,39 +1,272 @@
+import json
+import os
 import subprocess
-from typing import Optional
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from typing import Iterator, List, Optional, Tuple
 
+import numpy as np
 import rich
 import typer
-from pydub import AudioSegment
+from rich.table import Table
+
+from flowutils.profiling import span, timed
+from flowutils.utils import default_jobs
 
 app = typer.Typer()
 
+AUDIO_EXTENSIONS = (
+    ".mp3",
+    ".m4a",
+    ".m4b",
+    ".aac",
+    ".wav",
+    ".flac",
+    ".ogg",
+    ".opus",
+    ".aiff",
+    ".wma",
+)
+
+
+@dataclass
+class AudioInfo:
+    """Container metadata of an audio file."""
+
+    file_path: str
+    duration: Optional[float] = None
+    codec: Optional[str] = None
+    bit_rate: Optional[int] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class ConversionResult:
+    """Outcome of converting one file of an audio library."""
+
+    source_path: str
+    target_path: str
+    duration: float = 0.0
+    skipped: bool = False
+    error: Optional[str] = None
+
 
 @app.command()
 def toipod(
-    mp3_file_path: str = typer.Argument(help="Location path of the mp3 input file"),
+    mp3_file_path: str = typer.Argument(
+        help="Location path of the mp3 input file or a folder of audio files"
+    ),
     m4a_file_path: Optional[str] = typer.Argument(
-        None, help="Location path of the m4a file"
+        None, help="Location path of the m4a file or the output folder"
+    ),
+    jobs: int = typer.Option(
+        default_jobs(), "--jobs", "-j", help="Number of files converted in parallel"
+    ),
+    copy_tags: bool = typer.Option(
+        True, "--tags/--no-tags", help="Copy tags and cover art to the m4a file"
     ),
 ):
-    """Convert mp3 file to m4a file."""
+    """Convert mp3 file to m4a file, or a whole folder into a mirrored folder."""
     if not is_ffmpeg_installed():
         rich.print("[red]ffmpeg is not installed.")
         return
+    if os.path.isdir(mp3_file_path):
+        if m4a_file_path is None:
+            m4a_file_path = f"{mp3_file_path.rstrip(os.sep)}_m4a"
+        results = convert_library(mp3_file_path, m4a_file_path, jobs, copy_tags)
+        if any(result.error for result in results):
+            raise typer.Exit(code=1)
+        return
+
     if m4a_file_path is None:
         m4a_file_path = mp3_file_path.replace(".mp3", ".m4a")
-    convert_mp3_to_m4a(mp3_file_path, m4a_file_path)
+    try:
+        convert_mp3_to_m4a(mp3_file_path, m4a_file_path, copy_tags)
+    except subprocess.CalledProcessError as e:
+        rich.print(f"[red]Error converting {mp3_file_path}: {e.stderr}")
+        raise typer.Exit(code=1)
     rich.print(f"[blue]M4A file created at: {m4a_file_path}")
 
 
 @app.command()
-def info(file_path: str = typer.Argument(help="Location path of the sound input file")):
-    """Get info about an mp3 file."""
+def info(
+    file_path: str = typer.Argument(
+        help="Location path of the sound input file or a folder of sound files"
+    ),
+    jobs: int = typer.Option(
+        default_jobs(), "--jobs", "-j", help="Number of files probed in parallel"
+    ),
+    json_output: bool = typer.Option(False, "--json", help="Print the info as JSON"),
+):
+    """Get info about an audio file or all audio files in a folder."""
     if not is_ffmpeg_installed():
         rich.print("[red]ffmpeg is not installed.")
         return
-    sound = AudioSegment.from_file(file_path)
-    # Get the file type of the audio file
-    rich.print(f"[blue]File duration: {sound.duration_seconds:03f} s")
+    if os.path.isdir(file_path):
+        infos = probe_audio_files(find_audio_files(file_path), jobs)
+    else:
+        infos = [probe_audio(file_path)]
+
+    if json_output:
+        typer.echo(json.dumps([asdict(audio_info) for audio_info in infos], indent=2))
+    elif len(infos) == 1 and not os.path.isdir(file_path):
+        print_audio_info(infos[0])
+    else:
+        print_audio_table(infos)
+
+
+@app.command()
+def split(
+    file_path: str = typer.Argument(help="Location path of the sound input file"),
+    output_folder: str = typer.Argument(help="Folder for the split segments"),
+    threshold: float = typer.Option(
+        -40.0, "--threshold", "-t", help="Frames below this dBFS count as silence"
+    ),
+    min_silence: float = typer.Option(
+        1.0, "--min-silence", "-m", help="Minimum silence length in seconds"
+    ),
+    frame_ms: int = typer.Option(10, help="Length of an analysis frame in ms"),
+    reencode: bool = typer.Option(
+        False, help="Re-encode the segments instead of stream-copying them"
+    ),
+    dry_run: bool = typer.Option(
+        False, "--dry", "-d", help="Only print the split points"
+    ),
+):
+    """Split an audio file at its silences."""
+    if frame_ms <= 0:
+        rich.print("[red]The frame length must be greater than 0 ms.")
+        raise typer.Exit(code=1)
+    if not is_ffmpeg_installed():
+        rich.print("[red]ffmpeg is not installed.")
+        return
+    dbfs = compute_dbfs_profile(file_path, frame_ms)
+    silences = find_silence_runs(dbfs, threshold, round(min_silence * 1000 / frame_ms))
+    split_points = compute_split_points(silences, len(dbfs), frame_ms)
+    total_duration = len(dbfs) * frame_ms / 1000
+    segments = list(zip([0.0] + split_points, split_points + [total_duration]))
+
+    rich.print(f"[blue]Found {len(silences)} silences, {len(segments)} segments.")
+    if dry_run:
+        for idx, (start, end) in enumerate(segments):
+            rich.print(f"[blue]Segment {idx + 1}: {start:.2f} s -> {end:.2f} s")
+        return
+    export_segments(file_path, output_folder, segments, reencode)
+    rich.print(f"[blue]Segments written to: {output_folder}")
+
+
+def print_audio_info(audio_info: AudioInfo):
+    """Print the info of a single audio file."""
+    if audio_info.error:
+        rich.print(f"[red]Error reading {audio_info.file_path}: {audio_info.error}")
+        return
+    rich.print(f"[blue]File duration: {audio_info.duration or 0:03f} s")
+    rich.print(f"[blue]Codec: {audio_info.codec}")
+    rich.print(f"[blue]Bitrate: {_format_bit_rate(audio_info.bit_rate)}")
+    rich.print(f"[blue]Sample rate: {audio_info.sample_rate} Hz")
+    rich.print(f"[blue]Channels: {audio_info.channels}")
+
+
+def print_audio_table(infos: List[AudioInfo]):
+    """Print the info of several audio files as a table."""
+    table = Table(title="Audio files")
+    table.add_column("File")
+    table.add_column("Duration (s)", justify="right")
+    table.add_column("Codec")
+    table.add_column("Bitrate", justify="right")
+    table.add_column("Sample rate", justify="right")
+    table.add_column("Channels", justify="right")
+    for audio_info in infos:
+        if audio_info.error:
+            table.add_row(audio_info.file_path, f"[red]{audio_info.error}")
+            continue
+        table.add_row(
+            audio_info.file_path,
+            f"{audio_info.duration or 0:.3f}",
+            audio_info.codec,
+            _format_bit_rate(audio_info.bit_rate),
+            str(audio_info.sample_rate),
+            str(audio_info.channels),
+        )
+    rich.print(table)
+    total_duration = sum(audio_info.duration or 0 for audio_info in infos)
+    rich.print(f"[blue]{len(infos)} files, {total_duration / 3600:.2f} h in total.")
+
+
+def _format_bit_rate(bit_rate: Optional[int]) -> str:
+    if bit_rate is None:
+        return "-"
+    return f"{bit_rate // 1000} kb/s"
+
+
+@timed("scan")
+def find_audio_files(folder_path: str) -> List[str]:
+    """Find all audio files below the folder, sorted by path."""
+    audio_files = []
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(AUDIO_EXTENSIONS):
+                audio_files.append(os.path.join(root, filename))
+    return audio_files
+
+
+@timed("tool.ffprobe")
+def probe_audio(file_path: str) -> AudioInfo:
+    """
+    Read the metadata of an audio file with ffprobe.
+
+    Only the container and stream headers are read, no samples are decoded.
+    """
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "a:0",
+        "-show_entries",
+        "format=duration,bit_rate:stream=codec_name,sample_rate,channels,bit_rate",
+        "-of",
+        "json",
+        file_path,
+    ]
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode != 0:
+        return AudioInfo(file_path=file_path, error=process.stderr.strip())
+    return parse_ffprobe_output(file_path, process.stdout)
+
+
+def parse_ffprobe_output(file_path: str, output: str) -> AudioInfo:
+    """Parse the JSON output of ffprobe into an AudioInfo."""
+    data = json.loads(output)
+    streams = data.get("streams") or [{}]
+    stream = streams[0]
+    file_format = data.get("format", {})
+    if not stream:
+        return AudioInfo(file_path=file_path, error="No audio stream found")
+
+    bit_rate = stream.get("bit_rate") or file_format.get("bit_rate")
+    return AudioInfo(
+        file_path=file_path,
+        duration=_optional(float, file_format.get("duration")),
+        codec=stream.get("codec_name"),
+        bit_rate=_optional(int, bit_rate),
+        sample_rate=_optional(int, stream.get("sample_rate")),
+        channels=_optional(int, stream.get("channels")),
+    )
+
+
+def _optional(cast, value):
+    return None if value in (None, "N/A") else cast(value)
+
+
+def probe_audio_files(file_paths: List[str], jobs: int) -> List[AudioInfo]:
+    """Probe several audio files in parallel, keeping the input order."""
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        return list(executor.map(probe_audio, file_paths))
 
 
 def is_ffmpeg_installed():
@@ -45,7 +278,342 @@ def is_ffmpeg_installed():
         return False
 
 
-def convert_mp3_to_m4a(mp3_file_path, m4a_file_path):
-    """Convert mp3 file to m4a file."""
-    mp3_audio = AudioSegment.from_mp3(mp3_file_path)
-    mp3_audio.export(m4a_file_path, format="ipod")
+@timed("tool.ffprobe")
+def get_audio_codec(file_path: str) -> Optional[str]:
+    """Get the codec name of the first audio stream via ffprobe."""
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "a:0",
+        "-show_entries",
+        "stream=codec_name",
+        "-of",
+        "default=noprint_wrappers=1:nokey=1",
+        file_path,
+    ]
+    process = subprocess.run(command, capture_output=True, text=True, check=True)
+    codec = process.stdout.strip()
+    return codec or None
+
+
+def build_m4a_command(
+    input_file_path: str,
+    m4a_file_path: str,
+    codec: Optional[str] = None,
+    copy_tags: bool = False,
+) -> list[str]:
+    """
+    Build the ffmpeg command converting an audio file to an ipod m4a file.
+
+    The audio is piped from ffmpeg's decoder straight into the AAC encoder,
+    so memory stays constant regardless of the duration. If the input is
+    already AAC, the stream is copied without re-encoding. With copy_tags the
+    metadata and an embedded cover image are carried over as well.
+    """
+    audio_codec = "copy" if codec == "aac" else "aac"
+    command = [
+        "ffmpeg",
+        "-y",
+        "-nostdin",
+        "-v",
+        "error",
+        "-nostats",
+        "-progress",
+        "pipe:1",
+        "-i",
+        input_file_path,
+        "-map",
+        "0:a:0",
+        "-c:a",
+        audio_codec,
+    ]
+    if copy_tags:
+        command += [
+            "-map",
+            "0:v:0?",
+            "-c:v",
+            "copy",
+            "-disposition:v:0",
+            "attached_pic",
+            "-map_metadata",
+            "0",
+        ]
+    else:
+        command += ["-vn"]
+    return command + ["-f", "ipod", m4a_file_path]
+
+
+def parse_progress_duration(progress_output: str) -> float:
+    """Get the processed duration in seconds from ffmpeg's -progress output."""
+    duration_us = 0
+    for line in progress_output.splitlines():
+        key, _, value = line.partition("=")
+        if key == "out_time_us" and value.strip().isdigit():
+            duration_us = int(value)
+    return duration_us / 1_000_000
+
+
+def convert_mp3_to_m4a(mp3_file_path, m4a_file_path, copy_tags=False) -> float:
+    """
+    Convert mp3 file to m4a file.
+
+    Returns the duration of the converted audio in seconds.
+    """
+    if mp3_file_path.lower().endswith(".mp3"):
+        codec = "mp3"
+    else:
+        codec = get_audio_codec(mp3_file_path)
+    command = build_m4a_command(mp3_file_path, m4a_file_path, codec, copy_tags)
+    # parallel workers must not read from the terminal
+    with span("tool.ffmpeg"):
+        process = subprocess.run(
+            command,
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    return parse_progress_duration(process.stdout)
+
+
+def is_up_to_date(source_path: str, target_path: str) -> bool:
+    """Check if the target exists and is not older than the source."""
+    try:
+        return os.stat(target_path).st_mtime >= os.stat(source_path).st_mtime
+    except FileNotFoundError:
+        return False
+
+
+def plan_library_conversion(source_folder: str, target_folder: str) -> List[tuple]:
+    """Map every audio file in the source folder to its m4a path in the target folder."""
+    target_root = os.path.abspath(target_folder)
+    plan = []
+    for source_path in find_audio_files(source_folder):
+        if os.path.abspath(source_path).startswith(target_root + os.sep):
+            continue
+        relative_path = os.path.relpath(source_path, source_folder)
+        target_path = os.path.join(
+            target_folder, f"{os.path.splitext(relative_path)[0]}.m4a"
+        )
+        plan.append((source_path, target_path))
+    return plan
+
+
+def _convert_library_file(
+    source_path: str, target_path: str, copy_tags: bool
+) -> ConversionResult:
+    result = ConversionResult(source_path=source_path, target_path=target_path)
+    if is_up_to_date(source_path, target_path):
+        result.skipped = True
+        return result
+
+    os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+    partial_path = f"{target_path}.part"
+    try:
+        result.duration = convert_mp3_to_m4a(source_path, partial_path, copy_tags)
+        os.replace(partial_path, target_path)
+    except subprocess.CalledProcessError as e:
+        result.error = (e.stderr or str(e)).strip()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return result
+
+
+def convert_library(
+    source_folder: str, target_folder: str, jobs: int, copy_tags: bool = True
+) -> List[ConversionResult]:
+    """
+    Convert an audio library into a mirrored folder of m4a files.
+
+    Files whose m4a output is newer than the source are skipped. The
+    conversions run in a pool of ffmpeg processes and a throughput
+    summary is printed at the end.
+    """
+    plan = plan_library_conversion(source_folder, target_folder)
+    rich.print(f"[blue]Converting {len(plan)} files with {jobs} jobs")
+
+    start = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [
+            executor.submit(_convert_library_file, source, target, copy_tags)
+            for source, target in plan
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result.error:
+                rich.print(f"[red]Failed: {result.source_path}")
+            elif not result.skipped:
+                rich.print(f"[green]Converted: {result.source_path}")
+    elapsed = time.perf_counter() - start
+
+    print_conversion_summary(results, elapsed)
+    return results
+
+
+def print_conversion_summary(results: List[ConversionResult], elapsed: float):
+    """Print counts and throughput of a library conversion."""
+    converted = [r for r in results if not r.skipped and not r.error]
+    skipped = [r for r in results if r.skipped]
+    failed = [r for r in results if r.error]
+    audio_hours = sum(r.duration for r in converted) / 3600
+    elapsed = max(elapsed, 1e-9)
+
+    rich.print(
+        f"[blue]{len(converted)} converted, {len(skipped)} up to date, "
+        f"{len(failed)} failed in {elapsed:.1f} s"
+    )
+    rich.print(
+        f"[blue]Throughput: {len(converted) / elapsed:.2f} tracks/s, "
+        f"{audio_hours / elapsed:.4f} audio-hours/s"
+    )
+    for result in failed:
+        rich.print(f"[red]{result.source_path}: {result.error}")
+
+
+def decode_pcm_chunks(
+    file_path: str, sample_rate: int, chunk_samples: int
+) -> Iterator[np.ndarray]:
+    """
+    Decode an audio file to mono 16 bit PCM and yield it in chunks.
+
+    The samples are streamed from ffmpeg's stdout, so only one chunk is held
+    in memory at a time.
+    """
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-i",
+        file_path,
+        "-vn",
+        "-ac",
+        "1",
+        "-ar",
+        str(sample_rate),
+        "-f",
+        "s16le",
+        "pipe:1",
+    ]
+    chunk_bytes = chunk_samples * 2
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    try:
+        pending = b""
+        while True:
+            data = process.stdout.read(chunk_bytes - len(pending))
+            if not data:
+                break
+            pending += data
+            if len(pending) == chunk_bytes:
+                yield np.frombuffer(pending, dtype="<i2")
+                pending = b""
+        if pending:
+            yield np.frombuffer(pending[: len(pending) // 2 * 2], dtype="<i2")
+    finally:
+        process.stdout.close()
+        return_code = process.wait()
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, command)
+
+
+def frame_dbfs(samples: np.ndarray, frame_length: int) -> np.ndarray:
+    """
+    Compute the RMS loudness in dBFS of consecutive frames of samples.
+
+    A trailing partial frame gets its own value, computed over the samples
+    it has, so silence at the very end of a file is not lost.
+    """
+    frame_count = len(samples) // frame_length
+    frames = samples[: frame_count * frame_length].reshape(frame_count, frame_length)
+    frames = frames.astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(np.square(frames), axis=1))
+    rest = samples[frame_count * frame_length :].astype(np.float32) / 32768.0
+    if len(rest):
+        rms = np.append(rms, np.sqrt(np.mean(np.square(rest))))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+@timed("process")
+def compute_dbfs_profile(
+    file_path: str, frame_ms: int = 10, sample_rate: int = 16000
+) -> np.ndarray:
+    """Compute the dBFS of every frame of an audio file in streaming chunks."""
+    frame_length = sample_rate * frame_ms // 1000
+    # roughly one minute of audio per chunk, aligned to whole frames
+    chunk_samples = frame_length * (60_000 // frame_ms)
+    profiles = []
+    for chunk in decode_pcm_chunks(file_path, sample_rate, chunk_samples):
+        profiles.append(frame_dbfs(chunk, frame_length).astype(np.float32))
+    if not profiles:
+        return np.empty(0, dtype=np.float32)
+    return np.concatenate(profiles)
+
+
+def find_silence_runs(
+    dbfs: np.ndarray, threshold: float, min_frames: int
+) -> List[Tuple[int, int]]:
+    """Find runs of frames below the threshold that are at least min_frames long."""
+    silent = np.concatenate(([False], dbfs < threshold, [False]))
+    edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    keep = (ends - starts) >= max(min_frames, 1)
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+
+def compute_split_points(
+    silences: List[Tuple[int, int]], frame_count: int, frame_ms: int
+) -> List[float]:
+    """
+    Compute split points in seconds in the middle of each silence.
+
+    Silences touching the start or the end of the audio do not split it.
+    """
+    return [
+        (start + end) / 2 * frame_ms / 1000
+        for start, end in silences
+        if start > 0 and end < frame_count
+    ]
+
+
+def export_segments(
+    file_path: str,
+    output_folder: str,
+    segments: List[Tuple[float, float]],
+    reencode: bool = False,
+):
+    """Export segments of an audio file, stream-copying them if possible."""
+    os.makedirs(output_folder, exist_ok=True)
+    stem, extension = os.path.splitext(os.path.basename(file_path))
+    for idx, (start, end) in enumerate(segments):
+        output_path = os.path.join(output_folder, f"{stem}_{idx + 1:03d}{extension}")
+        command = [
+            "ffmpeg",
+            "-y",
+            "-v",
+            "error",
+            "-ss",
+            f"{start:.3f}",
+            "-to",
+            f"{end:.3f}",
+            "-i",
+            file_path,
+            "-map",
+            "0:a:0",
+        ]
+        if not reencode:
+            with span("tool.ffmpeg"):
+                process = subprocess.run(
+                    command + ["-c", "copy", output_path],
+                    capture_output=True,
+                    text=True,
+                )
+            if process.returncode == 0:
+                rich.print(f"[green]Exported: {output_path}")
+                continue
+            rich.print(f"[yellow]Stream copy failed, re-encoding {output_path}")
+        with span("tool.ffmpeg"):
+            subprocess.run(command + [output_path], capture_output=True, check=True)
+        rich.print(f"[green]Exported: {output_path}")
@@ -2,11 +2,19 @@
 
 import os
 from datetime import datetime
+from typing import List
 
 import rich
 import typer
 
-from flowutils.utils import get_config_path
+from flowutils.utils import (
+    CONFIG_SECTIONS,
+    get_config_path,
+    get_section_path,
+    load_config,
+    update_config,
+    FlowConfig,
+)
 
 app = typer.Typer()
 
@@ -26,10 +34,42 @@ def backup():
         with open(config_path, "r") as source, open(backup_path, "w") as target:
             target.write(source.read())
         rich.print(f"[green]Config backed up to: {backup_path}")
+        config = load_config([])
+        for section in config.sections:
+            section_path = get_section_path(config, section)
+            with open(section_path, "r") as source:
+                with open(f"{section_path}.{timestamp}.bak", "w") as target:
+                    target.write(source.read())
+            rich.print(f"[green]Section '{section}' backed up.")
     except IOError as e:
         rich.print(f"[red]Error backing up config: {str(e)}")
         raise typer.Exit(code=1)
 
 
+@app.command()
+def split(
+    sections: List[str] = typer.Argument(
+        None, help=f"Sections to move to their own file: {', '.join(CONFIG_SECTIONS)}"
+    ),
+):
+    """Split sections of the config into their own files, loaded only when needed."""
+    sections = sections or list(CONFIG_SECTIONS)
+    unknown = [section for section in sections if section not in CONFIG_SECTIONS]
+    if unknown:
+        rich.print(f"[red]Unknown sections: {', '.join(unknown)}")
+        raise typer.Exit(code=1)
+
+    def add_sections(config: FlowConfig):
+        for section in sections:
+            config.sections.setdefault(section, f"{section}.yaml")
+        return config
+
+    config = update_config(add_sections)
+    for section in sections:
+        rich.print(
+            f"[green]Section '{section}' stored in: {get_section_path(config, section)}"
+        )
+
+
 if __name__ == "__main__":
     app()
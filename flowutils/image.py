@@ -6,6 +6,8 @@ from PIL import Image
 import rich
 import typer
 
+from flowutils.profiling import span
+
 app = typer.Typer()
 
 
@@ -20,7 +22,9 @@ def resize_images(
     """Resize images in the input folder and save them to the output folder."""
     os.makedirs(output_folder, exist_ok=True)
 
-    for filename in os.listdir(input_folder):
+    with span("scan"):
+        filenames = os.listdir(input_folder)
+    for filename in filenames:
         if any(filename.lower().endswith(fmt.lower()) for fmt in formats):
             input_path = os.path.join(input_folder, filename)
             output_path = os.path.join(output_folder, filename)
@@ -29,14 +33,19 @@ def resize_images(
                 rich.print(f"[blue]Would resize: {input_path} -> {output_path}")
             else:
                 try:
-                    with Image.open(input_path) as img:
-                        img.thumbnail((max_size, max_size))
-                        img.save(output_path, quality=quality, optimize=True)
+                    resize_image(input_path, output_path, max_size, quality)
                     rich.print(f"[green]Resized: {input_path} -> {output_path}")
                 except Exception as e:
                     rich.print(f"[red]Error processing {input_path}: {str(e)}")
 
 
+def resize_image(input_path: str, output_path: str, max_size: int, quality: int):
+    """Resize one image so its longer edge is at most max_size."""
+    with span("process"), Image.open(input_path) as img:
+        img.thumbnail((max_size, max_size))
+        img.save(output_path, quality=quality, optimize=True)
+
+
 @app.command()
 def resize(
     input_folder: str = typer.Argument(help="Input folder path"),
@@ -1,50 +1,150 @@
 """module for link commands"""
 
 import os
+from dataclasses import dataclass
 from os.path import abspath
+from typing import Dict, List, Optional
 
 import rich
 import typer
 
-from flowutils.utils import load_config, LinkConfig, save_config
+from flowutils.shell import SHELLS, JUMP_FUNCTION, write_export
+from flowutils.utils import load_config, LinkConfig, update_config, FlowConfig
 
 app = typer.Typer()
 
 
-@app.command()
-def create():
-    """Create the links."""
-    config = load_config()
+@dataclass
+class LinkChange:
+    """A change needed to bring a link in line with the config."""
+
+    action: str
+    name: str
+    target: Optional[str] = None
+    current: Optional[str] = None
+
+
+def read_link_location(link_location: str) -> Dict[str, Optional[str]]:
+    """Read the link folder once, mapping names to symlink targets (None if not a symlink)."""
+    current = {}
+    try:
+        with os.scandir(link_location) as entries:
+            for entry in entries:
+                current[entry.name] = (
+                    os.readlink(entry.path) if entry.is_symlink() else None
+                )
+    except FileNotFoundError:
+        pass
+    return current
+
 
+def plan_link_changes(
+    links: List[LinkConfig], current: Dict[str, Optional[str]], prune: bool = False
+) -> List[LinkChange]:
+    """
+    Compare the configured links with the link folder.
+
+    Links that already point to their target are left alone. Entries that
+    are not symlinks are never replaced, and unmanaged symlinks are only
+    removed when pruning.
+    """
+    changes = []
+    for link in links:
+        if link.name not in current:
+            changes.append(LinkChange("create", link.name, link.target))
+        elif current[link.name] is None:
+            changes.append(LinkChange("conflict", link.name, link.target))
+        elif current[link.name] != link.target:
+            changes.append(
+                LinkChange("retarget", link.name, link.target, current[link.name])
+            )
+    if prune:
+        names = {link.name for link in links}
+        for name, target in sorted(current.items()):
+            if name not in names and target is not None:
+                changes.append(LinkChange("remove", name, current=target))
+    return changes
+
+
+def apply_link_change(link_location: str, change: LinkChange):
+    """Apply a change, retargeting by renaming a new symlink over the old one."""
+    link_path = os.path.join(link_location, change.name)
+    if change.action == "create":
+        os.symlink(change.target, link_path)
+    elif change.action == "retarget":
+        tmp_path = f"{link_path}.{os.getpid()}.tmp"
+        os.symlink(change.target, tmp_path)
+        os.replace(tmp_path, link_path)
+    elif change.action == "remove":
+        os.remove(link_path)
+
+
+def reconcile_links(config: FlowConfig, prune: bool = False, dry: bool = False):
+    """Create, retarget or remove only the links that differ from the config."""
     link_location = config.get_link_location()
-    os.makedirs(link_location, exist_ok=True)
-    link: LinkConfig
-    for link in config.links:
-        link_path = os.path.join(link_location, link.name)
-        if os.path.exists(link_path):
-            os.remove(link_path)
-        os.symlink(link.target, link_path)
+    changes = plan_link_changes(config.links, read_link_location(link_location), prune)
+    if not dry:
+        os.makedirs(link_location, exist_ok=True)
+
+    prefix = "Would " if dry else ""
+    for change in changes:
+        if change.action == "conflict":
+            rich.print(
+                f"[red]'{change.name}' exists and is not a link, it is left unchanged."
+            )
+            continue
+        if not dry:
+            apply_link_change(link_location, change)
+        if change.action == "create":
+            rich.print(f"[green]{prefix}create {change.name} -> {change.target}")
+        elif change.action == "retarget":
+            rich.print(
+                f"[yellow]{prefix}retarget {change.name}: {change.current} -> {change.target}"
+            )
+        else:
+            rich.print(f"[red]{prefix}remove {change.name} -> {change.current}")
 
-    rich.print("[blue]Links created.")
+    if not changes:
+        rich.print("[blue]Links are up to date.")
+    elif not dry:
+        rich.print("[blue]Links created.")
+
+
+@app.command()
+def create(
+    prune: bool = typer.Option(
+        False, "--prune", help="Remove symlinks that are not in the config"
+    ),
+    dry: bool = typer.Option(False, "--dry", help="Only show what would change"),
+):
+    """Create the links."""
+    config = load_config(["links"])
+    reconcile_links(config, prune, dry)
 
 
 @app.command()
 def add(target_directory: str, name: str):
     """Add a link to the config file."""
-    config = load_config()
-
     link: LinkConfig = LinkConfig(target=abspath(target_directory), name=name)
-    config.links.append(link)
-    save_config(config)
 
-    rich.print(f"[blue]Link '{name}' added.")
-    create()
+    def add_link(config: FlowConfig):
+        existing = config.get_link(name)
+        config.add_link(link)
+        return config, existing
+
+    config, existing = update_config(add_link, ["links"])
+
+    if existing is None:
+        rich.print(f"[blue]Link '{name}' added.")
+    else:
+        rich.print(f"[blue]Link '{name}' updated.")
+    reconcile_links(config)
 
 
 @app.command(name="list")
 def list_links():
     """List the links."""
-    config = load_config()
+    config = load_config(["links"])
     links = config.links
     if not links:
         rich.print("[blue]No links found.")
@@ -53,3 +153,21 @@ def list_links():
     rich.print("[orange]Links:")
     for link in links:
         rich.print(f"[blue]{link.name} [green] -> {link.target}")
+
+
+@app.command()
+def export(
+    shell: str = typer.Option("bash", help=f"Shell to export for: {', '.join(SHELLS)}"),
+):
+    """Export a jump function for links, projects and repositories to a shell file."""
+    if shell not in SHELLS:
+        rich.print(f"[red]Unsupported shell '{shell}', use one of: {', '.join(SHELLS)}")
+        raise typer.Exit(code=1)
+    config = load_config()
+    path = write_export(config, shell)
+
+    rich.print(f"[blue]Shell file written to: {path}")
+    rich.print(
+        f"Add 'source {path}' to your shell config and jump with '{JUMP_FUNCTION} <name>'. "
+        "The file is updated whenever the config is saved."
+    )
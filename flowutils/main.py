@@ -4,6 +4,7 @@ from os.path import dirname, isdir, join
 import typer
 import rich
 from flowutils import (
+    profiling,
     projects,
     links,
     repos,
@@ -14,6 +15,7 @@ from flowutils import (
     url,
     pdf,
     image,
+    pipeline,
 )
 
 from flowutils.utils import FlowConfig, get_config_path, save_config
@@ -29,6 +31,23 @@ app.add_typer(config.app, name="config")
 app.add_typer(url.app, name="url")
 app.add_typer(pdf.app, name="pdf")
 app.add_typer(image.app, name="image")
+app.add_typer(pipeline.app, name="pipeline")
+
+
+@app.callback()
+def main(
+    ctx: typer.Context,
+    profile: bool = typer.Option(
+        False, "--profile", help="Print timing spans and write cProfile stats"
+    ),
+    profile_file: str = typer.Option(
+        "flow.prof", help="File for the cProfile stats of --profile"
+    ),
+):
+    """Manage projects, links, repositories and media files."""
+    if profile:
+        profiling.start()
+        ctx.call_on_close(lambda: profiling.stop(profile_file))
 
 
 @app.command()
@@ -5,13 +5,286 @@ This script provides functionality to compress scanned PDF files,
 reducing their file size while maintaining reasonable quality.
 """
 
+import glob
 import os
+import shutil
 import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+from typing import List, Optional, Tuple
+
 import typer
 from rich import print as rprint
+from rich.table import Table
+
+from flowutils.pdfscan import PdfInspection, PdfScanError, inspect_pdf
+from flowutils.profiling import span, timed
+from flowutils.utils import default_jobs, format_size
 
 app = typer.Typer()
 
+COMPRESSED_SUFFIX = "_compressed"
+
+
+ADAPTIVE_PROFILES = ("/screen", "/ebook", "/printer")
+ADAPTIVE_DPIS = (72, 100, 150, 200, 300)
+
+
+@dataclass
+class CompressionOptions:
+    """Options of a compression run."""
+
+    dpi: int = 150
+    adaptive: bool = False
+    min_dpi: int = 150
+    threshold: float = 0.05
+    split_pages: bool = False
+    prescan: bool = False
+    jobs: int = 1
+
+
+@dataclass
+class CompressionResult:
+    """Outcome of compressing one PDF file."""
+
+    input_path: str
+    output_path: str
+    size_before: int = 0
+    size_after: int = 0
+    seconds: float = 0.0
+    settings: Optional[str] = None
+    kept_original: bool = False
+    skip_reason: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def outcome(self) -> str:
+        if self.error is not None:
+            return "failed"
+        if self.skip_reason is not None:
+            return f"skipped: {self.skip_reason}"
+        if self.kept_original:
+            return "kept original"
+        return self.settings or ""
+
+
+def build_gs_command(
+    input_path: str,
+    output_path: str,
+    dpi: int = 150,
+    pdf_settings: str = "/screen",
+    downsample: bool = False,
+    page_range: Optional[Tuple[int, int]] = None,
+) -> List[str]:
+    """
+    Build the ghostscript command for compressing a PDF file.
+
+    With downsample the embedded images are resampled to the given dpi
+    instead of the default resolution of the PDF settings profile. With a
+    page range only the pages from first to last (inclusive) are written.
+    """
+    command = [
+        "gs",
+        "-sDEVICE=pdfwrite",
+        "-dCompatibilityLevel=1.4",
+        f"-dPDFSETTINGS={pdf_settings}",
+        "-dNOPAUSE",
+        "-dQUIET",
+        "-dBATCH",
+        f"-r{dpi}",
+    ]
+    if downsample:
+        for image_type in ("Color", "Gray", "Mono"):
+            command += [
+                f"-dDownsample{image_type}Images=true",
+                f"-d{image_type}ImageResolution={dpi}",
+            ]
+    if page_range is not None:
+        command += [f"-dFirstPage={page_range[0]}", f"-dLastPage={page_range[1]}"]
+    return command + [f"-sOutputFile={output_path}", input_path]
+
+
+def build_merge_command(part_paths: List[str], output_path: str) -> List[str]:
+    """
+    Build the ghostscript command concatenating PDF files in the given order.
+
+    Images are neither downsampled nor re-encoded as JPEG again.
+    """
+    return [
+        "gs",
+        "-sDEVICE=pdfwrite",
+        "-dNOPAUSE",
+        "-dQUIET",
+        "-dBATCH",
+        "-dPassThroughJPEGImages=true",
+        "-dDownsampleColorImages=false",
+        "-dDownsampleGrayImages=false",
+        "-dDownsampleMonoImages=false",
+        f"-sOutputFile={output_path}",
+        *part_paths,
+    ]
+
+
+@timed("tool.gs")
+def count_pdf_pages(input_path: str) -> int:
+    """Count the pages of a PDF file with ghostscript."""
+    process = subprocess.run(
+        [
+            "gs",
+            "-q",
+            "-dNODISPLAY",
+            "-dSAFER",
+            f"--permit-file-read={input_path}",
+            f"-sFile={input_path}",
+            "-c",
+            "File (r) file runpdfbegin pdfpagecount = quit",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return int(process.stdout.strip().splitlines()[-1])
+
+
+def split_page_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    """Split the pages 1..page_count into at most parts contiguous ranges."""
+    parts = max(1, min(parts, page_count))
+    size, rest = divmod(page_count, parts)
+    ranges = []
+    first_page = 1
+    for idx in range(parts):
+        last_page = first_page + size - 1 + (1 if idx < rest else 0)
+        ranges.append((first_page, last_page))
+        first_page = last_page + 1
+    return ranges
+
+
+def get_candidate_settings(
+    options: CompressionOptions, max_dpi: Optional[float] = None
+) -> List[Tuple[str, int]]:
+    """
+    Get the (profile, dpi) pairs to try for the given options.
+
+    In adaptive mode, DPIs at or above max_dpi are left out, as they cannot
+    downsample the images any further.
+    """
+    if not options.adaptive:
+        return [("/screen", options.dpi)]
+    dpis = sorted(
+        dpi
+        for dpi in ADAPTIVE_DPIS
+        if dpi >= options.min_dpi and (max_dpi is None or dpi < max_dpi)
+    )
+    dpis = dpis or [options.min_dpi]
+    return [(profile, dpi) for profile in ADAPTIVE_PROFILES for dpi in dpis]
+
+
+def get_prescan_skip_reason(
+    inspection: PdfInspection, options: CompressionOptions
+) -> Optional[str]:
+    """Get the reason why compressing the inspected file won't pay off, if any."""
+    if inspection.image_count == 0:
+        return "no raster images"
+    effective_dpi = inspection.effective_dpi()
+    target_dpi = options.min_dpi if options.adaptive else options.dpi
+    if effective_dpi is not None and effective_dpi <= target_dpi:
+        return f"images at {effective_dpi:.0f} dpi"
+    return None
+
+
+@timed("tool.gs")
+def run_ghostscript(command: List[str]) -> Optional[str]:
+    """Run ghostscript with captured output and return the error, if any."""
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode == 0:
+        return None
+    return (process.stderr or process.stdout).strip() or (
+        f"ghostscript exited with code {process.returncode}"
+    )
+
+
+def compress_pdf_ranges(
+    input_path: str,
+    output_path: str,
+    pdf_settings: str,
+    dpi: int,
+    options: CompressionOptions,
+) -> Optional[str]:
+    """
+    Compress a PDF file as page ranges in parallel and merge the results.
+
+    The document is split into one page range per job. Every range is written
+    by its own ghostscript process and the parts are merged in page order.
+    The page count of the merged file is verified against the input. Returns
+    the error, if any.
+    """
+    try:
+        page_count = count_pdf_pages(input_path)
+    except (subprocess.CalledProcessError, ValueError, IndexError) as e:
+        return f"Could not count pages: {e}"
+    if page_count < 1:
+        return "PDF file has no pages"
+
+    page_ranges = split_page_ranges(page_count, options.jobs)
+    base = os.path.splitext(output_path)[0]
+    part_paths = [f"{base}.part{idx}.pdf" for idx in range(len(page_ranges))]
+    try:
+        with ThreadPoolExecutor(max_workers=max(options.jobs, 1)) as executor:
+            errors = list(
+                executor.map(
+                    lambda part: run_ghostscript(
+                        build_gs_command(
+                            input_path,
+                            part[0],
+                            dpi,
+                            pdf_settings,
+                            downsample=options.adaptive,
+                            page_range=part[1],
+                        )
+                    ),
+                    zip(part_paths, page_ranges),
+                )
+            )
+        error = next((error for error in errors if error), None)
+        if error is not None:
+            return error
+        if len(part_paths) == 1:
+            os.replace(part_paths[0], output_path)
+        else:
+            error = run_ghostscript(build_merge_command(part_paths, output_path))
+            if error is not None:
+                return error
+        merged_page_count = count_pdf_pages(output_path)
+    except (subprocess.CalledProcessError, ValueError, IndexError) as e:
+        return f"Could not count pages of the merged file: {e}"
+    finally:
+        for part_path in part_paths:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    if merged_page_count != page_count:
+        return f"Merged file has {merged_page_count} pages instead of {page_count}"
+    return None
+
+
+def run_candidate(
+    input_path: str,
+    output_path: str,
+    pdf_settings: str,
+    dpi: int,
+    options: CompressionOptions,
+) -> Optional[str]:
+    """Compress a PDF file with one profile and dpi and return the error, if any."""
+    if options.split_pages:
+        return compress_pdf_ranges(input_path, output_path, pdf_settings, dpi, options)
+    return run_ghostscript(
+        build_gs_command(
+            input_path, output_path, dpi, pdf_settings, downsample=options.adaptive
+        )
+    )
+
 
 def compress_pdf(input_path: str, output_path: str, dpi: int = 150) -> None:
     """
@@ -26,48 +299,345 @@ def compress_pdf(input_path: str, output_path: str, dpi: int = 150) -> None:
         subprocess.CalledProcessError: If the ghostscript command fails.
     """
     try:
-        subprocess.run(
-            [
-                "gs",
-                "-sDEVICE=pdfwrite",
-                "-dCompatibilityLevel=1.4",
-                "-dPDFSETTINGS=/screen",
-                "-dNOPAUSE",
-                "-dQUIET",
-                "-dBATCH",
-                f"-r{dpi}",
-                f"-sOutputFile={output_path}",
-                input_path,
-            ],
-            check=True,
-        )
+        with span("tool.gs"):
+            subprocess.run(build_gs_command(input_path, output_path, dpi), check=True)
     except subprocess.CalledProcessError as e:
         rprint(f"[red]Error compressing PDF: {e}")
         raise
 
 
+@timed("scan")
+def find_pdf_files(pattern: str) -> Tuple[str, List[str]]:
+    """
+    Find the PDF files of a folder or a glob pattern.
+
+    Returns the base folder used for mirroring the layout and the sorted
+    list of PDF files. Files that are outputs of a previous run, marked by
+    the '_compressed' suffix, are left out.
+    """
+    if os.path.isdir(pattern):
+        base_folder = pattern
+        paths = glob.glob(os.path.join(pattern, "**", "*"), recursive=True)
+    else:
+        paths = glob.glob(pattern, recursive=True)
+        base_folder = os.path.commonpath(paths) if paths else "."
+        if os.path.isfile(base_folder):
+            base_folder = os.path.dirname(base_folder)
+    pdf_files = sorted(
+        path
+        for path in paths
+        if path.lower().endswith(".pdf")
+        and os.path.isfile(path)
+        and not os.path.splitext(path)[0].endswith(COMPRESSED_SUFFIX)
+    )
+    return base_folder, pdf_files
+
+
+def get_batch_output_path(
+    input_path: str, base_folder: str, output_dir: Optional[str]
+) -> str:
+    """Get the output path of a file, mirrored into output_dir if given."""
+    if output_dir is None:
+        base, ext = os.path.splitext(input_path)
+        return f"{base}{COMPRESSED_SUFFIX}{ext}"
+    return os.path.join(output_dir, os.path.relpath(input_path, base_folder))
+
+
+def compress_pdf_file(
+    input_path: str,
+    output_path: str,
+    options: CompressionOptions,
+    in_place: bool = False,
+) -> CompressionResult:
+    """
+    Compress one PDF file and measure sizes and time without printing.
+
+    All candidate settings are tried concurrently in a temporary folder next
+    to the output and the smallest result wins. In adaptive mode the original
+    is kept if no candidate is smaller by at least the threshold. With prescan
+    the file is inspected first and skipped without starting ghostscript if
+    it has no images or its images are already below the target DPI.
+    """
+    if in_place:
+        output_path = input_path
+    result = CompressionResult(input_path=input_path, output_path=output_path)
+    result.size_before = os.path.getsize(input_path)
+
+    max_dpi = None
+    if options.prescan:
+        try:
+            inspection = inspect_pdf(input_path)
+        except PdfScanError:
+            inspection = None
+        if inspection is not None:
+            result.skip_reason = get_prescan_skip_reason(inspection, options)
+            max_dpi = inspection.effective_dpi()
+        if result.skip_reason is not None:
+            keep_original(result)
+            return result
+
+    output_folder = os.path.dirname(output_path) or "."
+    os.makedirs(output_folder, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=".flow-pdf-", dir=output_folder)
+
+    start = time.perf_counter()
+    try:
+        candidates = [
+            (profile, dpi, os.path.join(work_dir, f"{idx}.pdf"))
+            for idx, (profile, dpi) in enumerate(
+                get_candidate_settings(options, max_dpi)
+            )
+        ]
+        # with split pages the page ranges already use all jobs
+        candidate_jobs = 1 if options.split_pages else options.jobs
+        with ThreadPoolExecutor(max_workers=max(candidate_jobs, 1)) as executor:
+            errors = list(
+                executor.map(
+                    lambda candidate: run_candidate(
+                        input_path, candidate[2], candidate[0], candidate[1], options
+                    ),
+                    candidates,
+                )
+            )
+        finished = [
+            candidate
+            for candidate, error in zip(candidates, errors)
+            if error is None and os.path.isfile(candidate[2])
+        ]
+        if not finished:
+            result.error = next((error for error in errors if error), "No output")
+            return result
+
+        profile, dpi, best_path = min(
+            finished, key=lambda candidate: os.path.getsize(candidate[2])
+        )
+        result.settings = f"{profile} @ {dpi} dpi"
+        best_size = os.path.getsize(best_path)
+        if options.adaptive and best_size > result.size_before * (
+            1 - options.threshold
+        ):
+            keep_original(result)
+            return result
+
+        os.replace(best_path, output_path)
+        result.size_after = best_size
+        return result
+    finally:
+        result.seconds = time.perf_counter() - start
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def keep_original(result: CompressionResult):
+    """Keep the input file unchanged, copying it to the output if that differs."""
+    result.kept_original = True
+    result.size_after = result.size_before
+    if os.path.abspath(result.input_path) != os.path.abspath(result.output_path):
+        os.makedirs(os.path.dirname(result.output_path) or ".", exist_ok=True)
+        shutil.copyfile(result.input_path, result.output_path)
+
+
+def compress_pdfs(
+    pattern: str,
+    output_dir: Optional[str] = None,
+    in_place: bool = False,
+    options: Optional[CompressionOptions] = None,
+    jobs: int = 1,
+) -> List[CompressionResult]:
+    """
+    Compress all PDF files of a folder or glob pattern in parallel.
+
+    Each worker runs its own ghostscript process. The outputs are written
+    next to the inputs with a '_compressed' suffix, mirrored into output_dir,
+    or replace the inputs when in_place is set.
+    """
+    options = options or CompressionOptions()
+    base_folder, pdf_files = find_pdf_files(pattern)
+    # share the workers between the files and the candidates of each file
+    file_options = replace(options, jobs=max(1, jobs // max(len(pdf_files), 1)))
+    results = []
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = []
+        for input_path in pdf_files:
+            output_path = (
+                input_path
+                if in_place
+                else get_batch_output_path(input_path, base_folder, output_dir)
+            )
+            futures.append(
+                executor.submit(
+                    compress_pdf_file, input_path, output_path, file_options, in_place
+                )
+            )
+        for future in as_completed(futures):
+            results.append(future.result())
+    return sorted(results, key=lambda result: result.input_path)
+
+
+def print_compression_summary(results: List[CompressionResult]):
+    """Print sizes and times of a batch and report the failures at the end."""
+    table = Table(title="PDF compression")
+    table.add_column("File")
+    table.add_column("Before", justify="right")
+    table.add_column("After", justify="right")
+    table.add_column("Ratio", justify="right")
+    table.add_column("Time (s)", justify="right")
+    table.add_column("Outcome")
+    succeeded = [result for result in results if result.error is None]
+    kept = [result for result in succeeded if result.kept_original]
+    failed = [result for result in results if result.error is not None]
+    for result in succeeded:
+        table.add_row(
+            result.input_path,
+            format_size(result.size_before),
+            format_size(result.size_after),
+            f"{result.size_after / max(result.size_before, 1):.0%}",
+            f"{result.seconds:.1f}",
+            result.outcome,
+        )
+    rprint(table)
+
+    size_before = sum(result.size_before for result in succeeded)
+    size_after = sum(result.size_after for result in succeeded)
+    rprint(
+        f"[blue]{len(succeeded) - len(kept)} compressed, {len(kept)} kept, "
+        f"{len(failed)} failed: "
+        f"{format_size(size_before)} -> {format_size(size_after)}"
+    )
+    for result in failed:
+        rprint(f"[red]Failed: {result.input_path}: {result.error}")
+
+
 @app.command()
 def compress(
-    input_file: str = typer.Argument(..., help="Path to the input PDF file"),
+    input_file: str = typer.Argument(
+        ..., help="Path to the input PDF file, a folder or a quoted glob pattern"
+    ),
     output_file: str = typer.Option(None, help="Path for the output compressed PDF"),
     dpi: int = typer.Option(150, help="DPI for the output file"),
+    output_dir: str = typer.Option(
+        None, help="Folder mirroring the input layout for batch outputs"
+    ),
+    in_place: bool = typer.Option(
+        False, "--in-place", help="Replace the input files with the compressed ones"
+    ),
+    jobs: int = typer.Option(
+        default_jobs(), "--jobs", "-j", help="Number of parallel ghostscript workers"
+    ),
+    adaptive: bool = typer.Option(
+        False, help="Try several profiles and DPIs and keep the smallest result"
+    ),
+    min_dpi: int = typer.Option(
+        150, help="Minimum image DPI of the adaptive candidates"
+    ),
+    threshold: float = typer.Option(
+        0.05, help="Minimum relative saving to replace the original (adaptive)"
+    ),
+    split_pages: bool = typer.Option(
+        False, help="Compress page ranges in parallel and merge them afterwards"
+    ),
+    prescan: bool = typer.Option(
+        False, help="Skip files without images or with images below the target DPI"
+    ),
 ):
     """
     Compress a scanned PDF file and save the result.
 
     If no output file is specified, the compressed file will be saved with
-    '_compressed' appended to the original filename.
+    '_compressed' appended to the original filename. Folders and glob
+    patterns are compressed in parallel and summarized at the end. In
+    adaptive mode the original is kept when compressing does not pay off.
+    With split pages, large documents are compressed as parallel page ranges.
+    With prescan, files that won't shrink are skipped without running gs.
     """
+    options = CompressionOptions(
+        dpi=dpi,
+        adaptive=adaptive,
+        min_dpi=min_dpi,
+        threshold=threshold,
+        split_pages=split_pages,
+        prescan=prescan,
+        jobs=jobs,
+    )
+    if os.path.isdir(input_file) or glob.has_magic(input_file):
+        results = compress_pdfs(input_file, output_dir, in_place, options, jobs)
+        if not results:
+            rprint(f"[yellow]No PDF files found for: {input_file}")
+            return
+        print_compression_summary(results)
+        if any(result.error for result in results):
+            raise typer.Exit(code=1)
+        return
+
     if not os.path.exists(input_file):
         rprint(f"[red]Input file not found: {input_file}")
         return
 
     if output_file is None:
-        base, ext = os.path.splitext(input_file)
-        output_file = f"{base}_compressed{ext}"
+        if output_dir is not None:
+            output_file = os.path.join(output_dir, os.path.basename(input_file))
+        else:
+            base, ext = os.path.splitext(input_file)
+            output_file = f"{base}{COMPRESSED_SUFFIX}{ext}"
+
+    # these write through a temporary folder, which also covers in-place runs
+    if adaptive or split_pages or prescan or in_place or output_dir is not None:
+        result = compress_pdf_file(input_file, output_file, options, in_place)
+        print_compression_summary([result])
+        if result.error:
+            raise typer.Exit(code=1)
+        return
 
     try:
         compress_pdf(input_file, output_file, dpi)
         rprint(f"[green]PDF compressed successfully. Saved as: {output_file}")
     except subprocess.CalledProcessError:
         rprint("[red]Failed to compress PDF.")
+
+
+@app.command(name="inspect")
+def inspect_command(
+    input_file: str = typer.Argument(
+        ..., help="Path to the input PDF file, a folder or a quoted glob pattern"
+    ),
+):
+    """
+    Show pages, images and the estimated image DPI of PDF files.
+
+    The files are not rendered, only their object dictionaries are read.
+    """
+    if os.path.isdir(input_file) or glob.has_magic(input_file):
+        _, pdf_files = find_pdf_files(input_file)
+    else:
+        pdf_files = [input_file]
+
+    table = Table(title="PDF inspection")
+    table.add_column("File")
+    table.add_column("Pages", justify="right")
+    table.add_column("Images", justify="right")
+    table.add_column("Largest image", justify="right")
+    table.add_column("Filters")
+    table.add_column("DPI", justify="right")
+    for pdf_file in pdf_files:
+        try:
+            inspection = inspect_pdf(pdf_file)
+        except (PdfScanError, OSError) as e:
+            table.add_row(pdf_file, f"[red]{e}")
+            continue
+        largest = max(
+            inspection.images,
+            key=lambda image: image.width * image.height,
+            default=None,
+        )
+        filters = sorted(
+            {name for image in inspection.images for name in image.filters}
+        )
+        effective_dpi = inspection.effective_dpi()
+        table.add_row(
+            pdf_file,
+            str(inspection.page_count),
+            str(inspection.image_count),
+            f"{largest.width}x{largest.height}" if largest else "-",
+            ", ".join(filters) or "-",
+            f"{effective_dpi:.0f}" if effective_dpi else "-",
+        )
+    rprint(table)
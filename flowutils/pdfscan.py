@@ -0,0 +1,483 @@
+"""
+Module for inspecting PDF files without rendering them.
+
+Only the cross-reference data and the object dictionaries are read through a
+memory map. Content and image streams are never decoded, so inspecting a PDF
+costs a few small reads no matter how large the file is.
+"""
+
+import mmap
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from flowutils.profiling import timed
+
+# size of the window searched for an image dictionary at an object offset
+OBJECT_WINDOW = 2048
+TRAILER_WINDOW = 4096
+# relative difference of image and page aspect ratios still taken as a full page
+PAGE_ASPECT_TOLERANCE = 0.1
+# deepest nesting of arrays and dictionaries parsed before giving up
+MAX_NESTING = 100
+
+_WHITESPACE = re.compile(rb"(?:[\x00\t\n\x0c\r ]+|%[^\r\n]*)*")
+_NUMBER = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)")
+_REFERENCE = re.compile(rb"(\d+)[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+R")
+_NAME = re.compile(rb"/([^\x00\t\n\x0c\r ()<>\[\]{}/%]*)")
+_KEYWORD = re.compile(rb"[A-Za-z]+")
+_OBJECT_HEADER = re.compile(rb"(\d+)[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+obj")
+_XREF_SUBSECTION = re.compile(rb"(\d+)[\t ]+(\d+)")
+_XREF_ENTRY = re.compile(rb"(\d{10})[\t ](\d{5})[\t ]([nf])")
+_STARTXREF = re.compile(rb"startxref[\x00\t\n\x0c\r ]+(\d+)")
+_NAME_ESCAPE = re.compile(rb"#([0-9A-Fa-f]{2})")
+
+
+class PdfScanError(Exception):
+    """Raised when a PDF file cannot be inspected."""
+
+
+@dataclass(frozen=True)
+class Ref:
+    """Reference to an indirect PDF object."""
+
+    num: int
+    gen: int = 0
+
+
+class Name(str):
+    """PDF name object, stored without the leading slash."""
+
+
+@dataclass
+class PdfImage:
+    """Dictionary data of an embedded raster image."""
+
+    width: int
+    height: int
+    filters: List[str] = field(default_factory=list)
+    bits_per_component: Optional[int] = None
+    color_space: Optional[str] = None
+
+
+@dataclass
+class PdfInspection:
+    """Summary of a PDF file read from its object dictionaries."""
+
+    page_count: int
+    page_width: float
+    page_height: float
+    images: List[PdfImage] = field(default_factory=list)
+
+    @property
+    def image_count(self) -> int:
+        return len(self.images)
+
+    def is_page_sized(self, image: PdfImage) -> bool:
+        """Check if an image has the aspect ratio of the page, like a scanned page."""
+        if image.width <= 0 or image.height <= 0:
+            return False
+        page_ratio = self.page_width / self.page_height
+        image_ratio = image.width / image.height
+        # a scan may be stored rotated against the media box
+        return any(
+            abs(image_ratio / ratio - 1) <= PAGE_ASPECT_TOLERANCE
+            for ratio in (page_ratio, 1 / page_ratio)
+        )
+
+    def effective_dpi(self) -> Optional[float]:
+        """
+        Estimate the DPI of the images, assuming they cover a full page.
+
+        The highest estimate of all images is returned, as that image bounds
+        what downsampling can gain. The placement of images is not read, so
+        the estimate is only made if every image has the aspect ratio of the
+        page, as scans do. A smaller photo on a page has a higher DPI than its
+        size suggests. Returns None if there is no reliable estimate.
+        """
+        if not self.images or self.page_width <= 0 or self.page_height <= 0:
+            return None
+        if not all(self.is_page_sized(image) for image in self.images):
+            return None
+        width_inch = self.page_width / 72
+        height_inch = self.page_height / 72
+        return max(
+            max(image.width / width_inch, image.height / height_inch)
+            for image in self.images
+        )
+
+
+class _ValueParser:
+    """Parser of PDF values in a bytes-like buffer."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def _skip_whitespace(self, pos: int) -> int:
+        return _WHITESPACE.match(self.data, pos).end()
+
+    def parse_value(self, pos: int, depth: int = 0):
+        """Parse the PDF value at pos and return it with the end position."""
+        if depth > MAX_NESTING:
+            raise PdfScanError(f"Values nested too deeply at {pos}")
+        data = self.data
+        pos = self._skip_whitespace(pos)
+        char = data[pos : pos + 1]
+        if char == b"<":
+            if data[pos + 1 : pos + 2] == b"<":
+                return self._parse_dict(pos + 2, depth + 1)
+            end = data.find(b">", pos)
+            if end < 0:
+                raise PdfScanError(f"Unterminated hex string at {pos}")
+            return bytes(data[pos + 1 : end]), end + 1
+        if char == b"[":
+            return self._parse_array(pos + 1, depth + 1)
+        if char == b"(":
+            return self._parse_string(pos + 1)
+        if char == b"/":
+            match = _NAME.match(data, pos)
+            name = _NAME_ESCAPE.sub(
+                lambda m: bytes([int(m.group(1), 16)]), match.group(1)
+            )
+            return Name(name.decode("latin-1")), match.end()
+        match = _REFERENCE.match(data, pos)
+        if match:
+            return Ref(int(match.group(1)), int(match.group(2))), match.end()
+        match = _NUMBER.match(data, pos)
+        if match:
+            token = match.group()
+            number = float(token) if b"." in token else int(token)
+            return number, match.end()
+        match = _KEYWORD.match(data, pos)
+        if match:
+            keyword = match.group()
+            values = {b"true": True, b"false": False, b"null": None}
+            if keyword in values:
+                return values[keyword], match.end()
+            return keyword.decode("latin-1"), match.end()
+        raise PdfScanError(f"Unexpected token {char!r} at {pos}")
+
+    def _parse_dict(self, pos: int, depth: int):
+        result = {}
+        while True:
+            pos = self._skip_whitespace(pos)
+            if self.data[pos : pos + 2] == b">>":
+                return result, pos + 2
+            key, pos = self.parse_value(pos, depth)
+            if not isinstance(key, Name):
+                raise PdfScanError(f"Dictionary key is not a name at {pos}")
+            result[str(key)], pos = self.parse_value(pos, depth)
+
+    def _parse_array(self, pos: int, depth: int):
+        result = []
+        while True:
+            pos = self._skip_whitespace(pos)
+            if self.data[pos : pos + 1] == b"]":
+                return result, pos + 1
+            if pos >= len(self.data):
+                raise PdfScanError("Unterminated array")
+            value, pos = self.parse_value(pos, depth)
+            result.append(value)
+
+    def _parse_string(self, pos: int):
+        data = self.data
+        depth = 1
+        start = pos
+        while depth:
+            char = data[pos : pos + 1]
+            if not char:
+                raise PdfScanError(f"Unterminated string at {start}")
+            if char == b"\\":
+                pos += 1
+            elif char == b"(":
+                depth += 1
+            elif char == b")":
+                depth -= 1
+            pos += 1
+        return bytes(data[start : pos - 1]), pos
+
+
+class PdfScanner(_ValueParser):
+    """Random-access reader of PDF objects on top of a memory-mapped file."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.xref: Dict[int, Tuple[int, int, int]] = {}
+        self.trailer: dict = {}
+        self._object_streams: Dict[int, Tuple[bytes, Dict[int, int]]] = {}
+        self._read_xref_chain(self._find_startxref())
+
+    # cross-reference data
+
+    def _find_startxref(self) -> int:
+        tail_start = max(0, len(self.data) - TRAILER_WINDOW)
+        matches = list(_STARTXREF.finditer(self.data, tail_start))
+        if not matches:
+            raise PdfScanError("No startxref found")
+        return int(matches[-1].group(1))
+
+    def _read_xref_chain(self, offset: int):
+        # the newest section comes first, older sections must not override it
+        visited = set()
+        pending = [offset]
+        while pending:
+            offset = pending.pop(0)
+            if offset in visited or offset >= len(self.data):
+                continue
+            visited.add(offset)
+            pos = self._skip_whitespace(offset)
+            if self.data[pos : pos + 4] == b"xref":
+                trailer = self._read_xref_table(pos + 4)
+                if "XRefStm" in trailer:
+                    pending.insert(0, trailer["XRefStm"])
+            else:
+                trailer = self._read_xref_stream(pos)
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+            if "Prev" in trailer:
+                pending.append(trailer["Prev"])
+
+    def _read_xref_table(self, pos: int) -> dict:
+        while True:
+            pos = self._skip_whitespace(pos)
+            match = _XREF_SUBSECTION.match(self.data, pos)
+            if not match:
+                break
+            first, count = int(match.group(1)), int(match.group(2))
+            pos = match.end()
+            for num in range(first, first + count):
+                pos = self._skip_whitespace(pos)
+                entry = _XREF_ENTRY.match(self.data, pos)
+                if not entry:
+                    raise PdfScanError(f"Broken xref entry at {pos}")
+                pos = entry.end()
+                if entry.group(3) == b"n":
+                    self.xref.setdefault(
+                        num, (1, int(entry.group(1)), int(entry.group(2)))
+                    )
+        if self.data[pos : pos + 7] != b"trailer":
+            raise PdfScanError(f"No trailer after xref table at {pos}")
+        trailer, _ = self.parse_value(pos + 7)
+        return trailer
+
+    def _read_xref_stream(self, pos: int) -> dict:
+        stream_dict, stream_data = self._read_stream_object(pos)
+        if stream_dict.get("Type") != "XRef":
+            raise PdfScanError(f"No xref found at {pos}")
+        widths = stream_dict["W"]
+        size = stream_dict["Size"]
+        index = stream_dict.get("Index", [0, size])
+        entry_pos = 0
+        for first, count in zip(index[0::2], index[1::2]):
+            for num in range(first, first + count):
+                fields = []
+                for width in widths:
+                    value = int.from_bytes(
+                        stream_data[entry_pos : entry_pos + width], "big"
+                    )
+                    fields.append(value)
+                    entry_pos += width
+                entry_type = fields[0] if widths[0] else 1
+                if entry_type in (1, 2):
+                    self.xref.setdefault(num, (entry_type, fields[1], fields[2]))
+        return stream_dict
+
+    # objects
+
+    def _read_stream_object(self, pos: int) -> Tuple[dict, bytes]:
+        """Read and decode a stream object, only used for xref and object streams."""
+        match = _OBJECT_HEADER.match(self.data, self._skip_whitespace(pos))
+        if not match:
+            raise PdfScanError(f"No object found at {pos}")
+        stream_dict, pos = self.parse_value(match.end())
+        pos = self._skip_whitespace(pos)
+        if self.data[pos : pos + 6] != b"stream":
+            raise PdfScanError(f"Object at {pos} is not a stream")
+        pos += 6
+        if self.data[pos : pos + 2] == b"\r\n":
+            pos += 2
+        elif self.data[pos : pos + 1] in (b"\n", b"\r"):
+            pos += 1
+        length = self.resolve(stream_dict.get("Length"))
+        raw = bytes(self.data[pos : pos + length])
+        return stream_dict, _decode_stream(stream_dict, raw)
+
+    def get_object(self, num: int):
+        """Get the object with the given number, None if it does not exist."""
+        entry = self.xref.get(num)
+        if entry is None:
+            return None
+        entry_type, first, second = entry
+        if entry_type == 1:
+            match = _OBJECT_HEADER.match(self.data, self._skip_whitespace(first))
+            if not match:
+                raise PdfScanError(f"No object {num} at offset {first}")
+            return self.parse_value(match.end())[0]
+        data, offsets = self._get_object_stream(first)
+        return _ValueParser(data).parse_value(offsets[second])[0]
+
+    def _get_object_stream(self, num: int) -> Tuple[bytes, Dict[int, int]]:
+        if num not in self._object_streams:
+            entry = self.xref.get(num)
+            if entry is None or entry[0] != 1:
+                raise PdfScanError(f"Object stream {num} not found")
+            stream_dict, data = self._read_stream_object(entry[1])
+            header = data[: stream_dict["First"]].split()
+            offsets = [int(offset) + stream_dict["First"] for offset in header[1::2]]
+            self._object_streams[num] = (data, dict(enumerate(offsets)))
+        return self._object_streams[num]
+
+    def resolve(self, value):
+        """Follow references until a direct value is reached."""
+        seen = set()
+        while isinstance(value, Ref):
+            if value.num in seen:
+                raise PdfScanError(f"Reference loop at object {value.num}")
+            seen.add(value.num)
+            value = self.get_object(value.num)
+        return value
+
+    # document data
+
+    def page_count(self) -> int:
+        catalog = self.resolve(self.trailer.get("Root"))
+        if not isinstance(catalog, dict):
+            raise PdfScanError("No document catalog found")
+        pages = self.resolve(catalog.get("Pages"))
+        return int(self.resolve(pages.get("Count", 0)))
+
+    def first_page_size(self) -> Tuple[float, float]:
+        """Get width and height in points of the first page."""
+        catalog = self.resolve(self.trailer.get("Root"))
+        node = self.resolve(catalog.get("Pages"))
+        media_box = None
+        for _ in range(64):
+            media_box = self.resolve(node.get("MediaBox", media_box))
+            kids = self.resolve(node.get("Kids"))
+            if node.get("Type") == "Page" or not kids:
+                break
+            node = self.resolve(kids[0])
+        if not media_box:
+            return 612.0, 792.0
+        x0, y0, x1, y1 = (float(self.resolve(value)) for value in media_box)
+        return abs(x1 - x0), abs(y1 - y0)
+
+    def images(self) -> List[PdfImage]:
+        """
+        Find the image XObjects of the document.
+
+        Streams cannot live in object streams, so only objects with a file
+        offset are checked, each with a bounded read of its dictionary.
+        """
+        images = []
+        for num, (entry_type, offset, _) in sorted(self.xref.items()):
+            if entry_type != 1:
+                continue
+            if self.data.find(b"/Image", offset, offset + OBJECT_WINDOW) < 0:
+                continue
+            try:
+                value = self.get_object(num)
+            except PdfScanError:
+                continue
+            if not isinstance(value, dict) or value.get("Subtype") != "Image":
+                continue
+            images.append(self._to_image(value))
+        return images
+
+    def _to_image(self, image_dict: dict) -> PdfImage:
+        filters = self.resolve(image_dict.get("Filter", []))
+        if not isinstance(filters, list):
+            filters = [filters]
+        color_space = self.resolve(image_dict.get("ColorSpace"))
+        if isinstance(color_space, list):
+            color_space = color_space[0] if color_space else None
+        bits = self.resolve(image_dict.get("BitsPerComponent"))
+        return PdfImage(
+            width=int(self.resolve(image_dict.get("Width", 0))),
+            height=int(self.resolve(image_dict.get("Height", 0))),
+            filters=[str(self.resolve(name)) for name in filters],
+            bits_per_component=int(bits) if bits is not None else None,
+            color_space=str(color_space) if color_space is not None else None,
+        )
+
+
+def _decode_stream(stream_dict: dict, raw: bytes) -> bytes:
+    filters = stream_dict.get("Filter", [])
+    if not isinstance(filters, list):
+        filters = [filters]
+    params = stream_dict.get("DecodeParms") or {}
+    if isinstance(params, list):
+        params = params[0] if params else {}
+    data = raw
+    for name in filters:
+        if name != "FlateDecode":
+            raise PdfScanError(f"Unsupported filter {name}")
+        try:
+            data = zlib.decompress(data)
+        except zlib.error as e:
+            raise PdfScanError(f"Broken stream: {e}")
+    predictor = params.get("Predictor", 1) if isinstance(params, dict) else 1
+    if predictor >= 10:
+        data = _undo_png_predictor(data, params.get("Columns", 1))
+    return data
+
+
+def _undo_png_predictor(data: bytes, columns: int) -> bytes:
+    row_length = columns + 1
+    previous = bytearray(columns)
+    output = bytearray()
+    for row_start in range(0, len(data) - row_length + 1, row_length):
+        filter_type = data[row_start]
+        row = bytearray(data[row_start + 1 : row_start + row_length])
+        for idx in range(columns):
+            left = row[idx - 1] if idx else 0
+            up = previous[idx]
+            up_left = previous[idx - 1] if idx else 0
+            if filter_type == 1:
+                row[idx] = (row[idx] + left) & 0xFF
+            elif filter_type == 2:
+                row[idx] = (row[idx] + up) & 0xFF
+            elif filter_type == 3:
+                row[idx] = (row[idx] + (left + up) // 2) & 0xFF
+            elif filter_type == 4:
+                estimate = left + up - up_left
+                distances = (
+                    abs(estimate - left),
+                    abs(estimate - up),
+                    abs(estimate - up_left),
+                )
+                nearest = (left, up, up_left)[distances.index(min(distances))]
+                row[idx] = (row[idx] + nearest) & 0xFF
+        output += row
+        previous = row
+    return bytes(output)
+
+
+@timed("pdf.inspect")
+def inspect_pdf(file_path: str) -> PdfInspection:
+    """
+    Inspect a PDF file without rendering it.
+
+    Raises:
+        PdfScanError: If the file structure cannot be read, e.g. because the
+            cross-reference data is broken.
+    """
+    with open(file_path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise PdfScanError(f"Empty file: {file_path}")
+        try:
+            scanner = PdfScanner(data)
+            page_width, page_height = scanner.first_page_size()
+            return PdfInspection(
+                page_count=scanner.page_count(),
+                page_width=page_width,
+                page_height=page_height,
+                images=scanner.images(),
+            )
+        except (KeyError, IndexError, TypeError, ValueError, AttributeError) as e:
+            raise PdfScanError(f"Cannot inspect {file_path}: {e}")
+        finally:
+            data.close()
@@ -0,0 +1,422 @@
+"""
+module for declarative pipelines of flowutils steps
+
+A pipeline file lists input globs and steps. Every step names an action and
+the step its files come from, so each file flows through the steps on its
+own instead of waiting for a stage to finish for all files:
+
+    inputs: ["videos/*.MTS", "scans/*.pdf"]
+    workdir: out
+    jobs: 8
+    steps:
+      - name: audio
+        action: convert_video_to_mp3
+        match: "*.MTS"
+        limit: 2
+      - name: m4a
+        action: convert_mp3_to_m4a
+        input: audio
+      - name: pdf
+        action: compress_pdf
+        match: "*.pdf"
+        options: {dpi: 100}
+
+Relative paths are resolved against the folder of the pipeline file. The
+output of a step defaults to '{workdir}/{step}/{rel}/{stem}{suffix}' and can
+be changed with 'output', using the fields workdir, step, rel, stem, name,
+suffix and parent. 'rel' is the folder of the input relative to the base of
+its glob, so inputs of the same name in different folders do not clash.
+Two items of a run writing the same output are reported as a failure.
+"""
+
+import fnmatch
+import glob
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import rich
+import typer
+import yaml
+from pydantic import BaseModel, ValidationError, model_validator
+from rich.table import Table
+
+from flowutils.audio import convert_mp3_to_m4a
+from flowutils.image import resize_image
+from flowutils.pdf import compress_pdf
+from flowutils.profiling import span
+from flowutils.utils import SortingRuleConfig, default_jobs
+from flowutils.video import (
+    convert_avchd_to_mp4,
+    convert_video_to_mp3,
+    cut_video_into_scenes,
+)
+
+app = typer.Typer()
+
+PIPELINE_INPUTS = "inputs"
+
+
+def _require_output(paths: List[str]) -> List[str]:
+    # several wrapped functions report errors by printing, not by raising
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise RuntimeError(f"no output written to '{missing[0]}'")
+    return paths
+
+
+def _list_output_files(folder: str) -> List[str]:
+    files = sorted(entry.path for entry in os.scandir(folder) if entry.is_file())
+    if not files:
+        raise RuntimeError(f"no output written to '{folder}'")
+    return files
+
+
+def run_avchd_to_mp4(path: str, output: str, options: dict) -> List[str]:
+    os.makedirs(output, exist_ok=True)
+    convert_avchd_to_mp4(path, output, overwrite=True, **options)
+    return _list_output_files(output)
+
+
+def run_cut_scenes(path: str, output: str, options: dict) -> List[str]:
+    os.makedirs(output, exist_ok=True)
+    cut_video_into_scenes(path, format_path(options["scenes"], path), output)
+    return _list_output_files(output)
+
+
+def run_video_to_mp3(path: str, output: str, options: dict) -> List[str]:
+    # ffmpeg does not replace a stale output, which would then be passed on
+    if os.path.exists(output):
+        os.remove(output)
+    convert_video_to_mp3(path, output, **options)
+    return _require_output([output])
+
+
+def run_mp3_to_m4a(path: str, output: str, options: dict) -> List[str]:
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    convert_mp3_to_m4a(path, output, **options)
+    return _require_output([output])
+
+
+def run_resize_image(path: str, output: str, options: dict) -> List[str]:
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    resize_image(
+        path, output, options.get("max_size", 1024), options.get("quality", 85)
+    )
+    return _require_output([output])
+
+
+def run_compress_pdf(path: str, output: str, options: dict) -> List[str]:
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    compress_pdf(path, output, **options)
+    return _require_output([output])
+
+
+def run_sort_file(path: str, output: str, options: dict) -> List[str]:
+    """Move a file into the sub folder of the first rule matching its name, like sort_folder."""
+    folder = options.get("folder") or os.path.dirname(path)
+    name = os.path.basename(path)
+    for rule_options in options.get("rules", []):
+        rule = SortingRuleConfig(**rule_options)
+        if any(keyword.lower() in name.lower() for keyword in rule.contain_list):
+            target_path = os.path.join(folder, rule.sub_folder_name, name)
+            if os.path.exists(target_path):
+                raise FileExistsError(f"'{target_path}' already exists")
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            shutil.move(path, target_path)
+            return [target_path]
+    return [path]
+
+
+@dataclass
+class Action:
+    """
+    A function a step can run on one file.
+
+    Folder actions write into a folder per input and pass on every new file.
+    A suffix of None keeps the suffix of the input file.
+    """
+
+    run: Callable[[str, str, dict], List[str]]
+    suffix: Optional[str] = None
+    folder: bool = False
+
+
+ACTIONS: Dict[str, Action] = {
+    "convert_avchd_to_mp4": Action(run_avchd_to_mp4, folder=True),
+    "cut_video_into_scenes": Action(run_cut_scenes, folder=True),
+    "convert_video_to_mp3": Action(run_video_to_mp3, suffix=".mp3"),
+    "convert_mp3_to_m4a": Action(run_mp3_to_m4a, suffix=".m4a"),
+    "resize_images": Action(run_resize_image),
+    "compress_pdf": Action(run_compress_pdf),
+    "sort_folder": Action(run_sort_file),
+}
+
+
+class PipelineStepConfig(BaseModel):
+    """Pipeline step config model."""
+
+    name: str
+    action: str
+    input: str = PIPELINE_INPUTS
+    match: Optional[str] = None
+    output: Optional[str] = None
+    limit: Optional[int] = None
+    options: dict = {}
+
+
+class PipelineConfig(BaseModel):
+    """Pipeline config model."""
+
+    inputs: Union[str, List[str]] = []
+    workdir: str = "."
+    jobs: Optional[int] = None
+    steps: List[PipelineStepConfig] = []
+
+    @model_validator(mode="after")
+    def check_steps(self):
+        names = {PIPELINE_INPUTS}
+        for step in self.steps:
+            if step.action not in ACTIONS:
+                raise ValueError(
+                    f"unknown action '{step.action}' in step '{step.name}'"
+                )
+            # only earlier steps can be referenced, so the graph has no cycles
+            if step.input not in names:
+                raise ValueError(
+                    f"step '{step.name}' reads from unknown step '{step.input}'"
+                )
+            if step.name in names:
+                raise ValueError(f"duplicate step name '{step.name}'")
+            if step.limit is not None and step.limit < 1:
+                raise ValueError(f"limit of step '{step.name}' must be at least 1")
+            names.add(step.name)
+        return self
+
+
+def format_path(template: str, path: str, **fields) -> str:
+    """Fill a path template with the parts of the input path."""
+    name = os.path.basename(path.rstrip(os.sep))
+    stem, suffix = os.path.splitext(name)
+    return os.path.expanduser(
+        template.format(
+            name=name,
+            stem=stem,
+            suffix=suffix,
+            parent=os.path.dirname(path),
+            **fields,
+        )
+    )
+
+
+def get_step_output(
+    step: PipelineStepConfig, path: str, workdir: str, rel: str = "."
+) -> str:
+    """Get the output file, or folder for folder actions, of a step for one input."""
+    action = ACTIONS[step.action]
+    template = step.output or (
+        "{workdir}/{step}/{rel}/{stem}"
+        if action.folder
+        else "{workdir}/{step}/{rel}/{stem}{suffix}"
+    )
+    output = format_path(template, path, workdir=workdir, step=step.name, rel=rel)
+    if action.suffix is not None and not action.folder:
+        output = os.path.splitext(output)[0] + action.suffix
+    return os.path.normpath(output)
+
+
+def load_pipeline(pipeline_path: str) -> PipelineConfig:
+    """Load a pipeline file, resolving relative paths against its folder."""
+    with open(pipeline_path, "r") as f:
+        pipeline = PipelineConfig(**(yaml.safe_load(f) or {}))
+    base = os.path.dirname(os.path.abspath(pipeline_path))
+    inputs = [pipeline.inputs] if isinstance(pipeline.inputs, str) else pipeline.inputs
+    pipeline.inputs = [os.path.join(base, os.path.expanduser(p)) for p in inputs]
+    pipeline.workdir = os.path.join(base, os.path.expanduser(pipeline.workdir))
+    return pipeline
+
+
+def get_glob_base(pattern: str) -> str:
+    """Get the folder of a glob pattern before its first wildcard."""
+    if not glob.has_magic(pattern):
+        return os.path.dirname(pattern)
+    parts = []
+    for part in pattern.split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or os.sep
+
+
+def find_inputs(pipeline: PipelineConfig) -> List[Tuple[str, str]]:
+    """
+    Expand the input globs, without duplicates.
+
+    Returns every path with its folder relative to the base of its glob.
+    """
+    inputs = {}
+    for pattern in pipeline.inputs:
+        base = get_glob_base(pattern)
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            inputs.setdefault(path, os.path.relpath(os.path.dirname(path), base))
+    return list(inputs.items())
+
+
+@dataclass
+class StepSummary:
+    """Outcome of all items of a step."""
+
+    done: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+
+class PipelineRunner:
+    """
+    Run every file through the steps as a dependency graph.
+
+    An item is one step applied to one file. When it finishes, its outputs
+    become items of the steps reading from it right away. Items run in one
+    thread pool, while each step runs at most 'limit' items at a time.
+    """
+
+    def __init__(self, pipeline: PipelineConfig, jobs: int, dry: bool = False):
+        self.pipeline = pipeline
+        self.jobs = max(jobs, 1)
+        self.dry = dry
+        self.children: Dict[str, List[PipelineStepConfig]] = {PIPELINE_INPUTS: []}
+        for step in pipeline.steps:
+            self.children.setdefault(step.input, []).append(step)
+            self.children.setdefault(step.name, [])
+        self.queues = {step.name: deque() for step in pipeline.steps}
+        self.running = {step.name: 0 for step in pipeline.steps}
+        self.summaries = {step.name: StepSummary() for step in pipeline.steps}
+        # output path of every submitted item, to catch two items writing one file
+        self.claimed: Dict[str, str] = {}
+
+    def enqueue(self, source: str, inputs: List[Tuple[str, str]]):
+        for step in self.children[source]:
+            for path, rel in inputs:
+                if step.match is None or fnmatch.fnmatch(
+                    os.path.basename(path), step.match
+                ):
+                    self.queues[step.name].append((step, path, rel))
+
+    def claim_output(self, step: PipelineStepConfig, path: str, output: str) -> bool:
+        """Reserve an output path for an item, failing it if another item has it."""
+        other = self.claimed.setdefault(output, path)
+        if other == path:
+            return True
+        self.fail(step, path, f"output '{output}' is also written for '{other}'")
+        return False
+
+    def run_item(self, step: PipelineStepConfig, path: str, output: str) -> List[str]:
+        action = ACTIONS[step.action]
+        if self.dry:
+            rich.print(f"[blue]Would run {step.name}: {path} -> {output}")
+            return [] if action.folder else [output]
+        with span(f"pipeline.{step.name}"):
+            return action.run(path, output, step.options)
+
+    def limit(self, step: PipelineStepConfig) -> int:
+        return step.limit or self.jobs
+
+    def run(self, inputs: List[Tuple[str, str]]) -> Dict[str, StepSummary]:
+        self.enqueue(PIPELINE_INPUTS, inputs)
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while True:
+                for step in self.pipeline.steps:
+                    queue = self.queues[step.name]
+                    while (
+                        queue
+                        and len(futures) < self.jobs
+                        and self.running[step.name] < self.limit(step)
+                    ):
+                        _, path, rel = queue.popleft()
+                        output = get_step_output(step, path, self.pipeline.workdir, rel)
+                        if not self.claim_output(step, path, output):
+                            continue
+                        self.running[step.name] += 1
+                        future = executor.submit(self.run_item, step, path, output)
+                        futures[future] = (step, path, rel, output, time.perf_counter())
+                if not futures:
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step, path, rel, output, started = futures.pop(future)
+                    self.running[step.name] -= 1
+                    self.summaries[step.name].seconds += time.perf_counter() - started
+                    self.finish(step, path, rel, output, future)
+        return self.summaries
+
+    def fail(self, step: PipelineStepConfig, path: str, error: str):
+        summary = self.summaries[step.name]
+        summary.failed += 1
+        summary.errors.append(f"{path}: {error}")
+        rich.print(f"[red]Step '{step.name}' failed for '{path}': {error}")
+
+    def finish(
+        self, step: PipelineStepConfig, path: str, rel: str, output: str, future
+    ):
+        try:
+            outputs = future.result()
+        except Exception as e:
+            self.fail(step, path, str(e))
+            return
+        self.summaries[step.name].done += 1
+        if ACTIONS[step.action].folder:
+            # the files of two folder outputs may share names, keep them apart
+            rel = os.path.join(rel, os.path.basename(output))
+        self.enqueue(step.name, [(output_path, rel) for output_path in outputs])
+
+
+def print_pipeline_summary(summaries: Dict[str, StepSummary], elapsed: float):
+    table = Table(title=f"Pipeline ({elapsed:.1f} s)")
+    table.add_column("Step")
+    table.add_column("Done", justify="right")
+    table.add_column("Failed", justify="right")
+    table.add_column("Busy", justify="right")
+    for name, summary in summaries.items():
+        table.add_row(
+            name,
+            str(summary.done),
+            f"[red]{summary.failed}" if summary.failed else "0",
+            f"{summary.seconds:.1f} s",
+        )
+    rich.print(table)
+
+
+@app.command()
+def run(
+    pipeline_file: str = typer.Argument(help="Pipeline YAML file"),
+    jobs: Optional[int] = typer.Option(
+        None, "--jobs", "-j", help="Number of items run at the same time"
+    ),
+    dry: bool = typer.Option(False, "--dry", help="Only show what would run"),
+):
+    """Run a pipeline file, passing every file through its steps concurrently."""
+    try:
+        pipeline = load_pipeline(pipeline_file)
+    except (OSError, yaml.YAMLError, ValidationError) as e:
+        rich.print(f"[red]Could not load pipeline '{pipeline_file}': {e}")
+        raise typer.Exit(code=1)
+
+    inputs = find_inputs(pipeline)
+    if not inputs:
+        rich.print("[yellow]No input files found.")
+        return
+
+    start = time.perf_counter()
+    runner = PipelineRunner(pipeline, jobs or pipeline.jobs or default_jobs(), dry)
+    summaries = runner.run(inputs)
+    if dry:
+        return
+    print_pipeline_summary(summaries, time.perf_counter() - start)
+    if any(summary.failed for summary in summaries.values()):
+        raise typer.Exit(code=1)
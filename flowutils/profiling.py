@@ -0,0 +1,132 @@
+"""module for timing spans and profiling of flow commands"""
+
+import cProfile
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from functools import wraps
+from typing import Dict, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+# taken when the main module imports this module first, to time the imports after it
+IMPORT_START = time.perf_counter()
+_NO_SPAN = nullcontext()
+
+
+@dataclass
+class SpanStats:
+    """Number of calls and total seconds of a named span, summed over all threads."""
+
+    calls: int = 0
+    seconds: float = 0.0
+
+
+_enabled = False
+_lock = threading.Lock()
+_spans: Dict[str, SpanStats] = {}
+_profiler: Optional[cProfile.Profile] = None
+_started: Optional[float] = None
+
+
+class _Span:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def span(name: str):
+    """
+    Time a block as a named span, e.g. 'scan' or 'tool.ffmpeg'.
+
+    Spans of the same name are summed. While profiling is off this returns
+    a shared no-op context, so spans can stay on hot paths.
+    """
+    return _Span(name) if _enabled else _NO_SPAN
+
+
+def timed(name: str):
+    """Decorator timing every call of a function as a named span."""
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record(name: str, seconds: float):
+    """Add a measured duration to a span."""
+    with _lock:
+        stats = _spans.setdefault(name, SpanStats())
+        stats.calls += 1
+        stats.seconds += seconds
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def get_spans() -> Dict[str, SpanStats]:
+    """Get a copy of the spans recorded so far."""
+    with _lock:
+        return {name: SpanStats(s.calls, s.seconds) for name, s in _spans.items()}
+
+
+def start(with_cprofile: bool = True):
+    """Start recording spans, and the cProfile profiler of the main thread."""
+    global _enabled, _profiler, _started
+    _spans.clear()
+    _enabled = True
+    _started = time.perf_counter()
+    record("import", _started - IMPORT_START)
+    if with_cprofile:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def stop(dump_path: Optional[str] = None):
+    """Stop recording, write the pstats dump if given and print the spans to stderr."""
+    global _enabled, _profiler
+    total = time.perf_counter() - _started
+    if _profiler is not None:
+        _profiler.disable()
+        if dump_path is not None:
+            _profiler.dump_stats(dump_path)
+    _enabled = False
+    _profiler = None
+    print_spans(total, dump_path)
+
+
+def print_spans(total: float, dump_path: Optional[str] = None):
+    """Print the spans sorted by time, spans of worker threads may overlap."""
+    table = Table(title=f"Profile ({total:.3f} s command time)")
+    table.add_column("Span")
+    table.add_column("Calls", justify="right")
+    table.add_column("Total", justify="right")
+    table.add_column("Mean", justify="right")
+    spans = sorted(get_spans().items(), key=lambda item: -item[1].seconds)
+    for name, stats in spans:
+        table.add_row(
+            name,
+            str(stats.calls),
+            f"{stats.seconds * 1000:.1f} ms",
+            f"{stats.seconds / stats.calls * 1000:.2f} ms",
+        )
+    console = Console(stderr=True)
+    console.print(table)
+    if dump_path is not None:
+        console.print(f"[blue]cProfile stats written to: {dump_path}")
@@ -1,20 +1,54 @@
+import heapq
+import json
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
 from os.path import isdir, join
+from typing import List, Optional, Tuple
 
 import rich
 import typer
 from rich.panel import Panel
 from rich.pretty import Pretty
+from rich.table import Table
 
-from flowutils.utils import load_config, save_config
+from flowutils.archive import (
+    ArchiveError,
+    archive_folder,
+    find_archive,
+    restore_folder,
+)
+from flowutils.profiling import timed
+from flowutils.template import COPY_MODES, materialize_template, scan_template
+from flowutils.utils import (
+    default_jobs,
+    format_age,
+    format_size,
+    load_cache,
+    load_config,
+    save_cache,
+    update_config,
+    FlowConfig,
+)
 
 app = typer.Typer()
 
+PROJECT_STATS_CACHE = "project_stats"
+# largest files remembered per directory, the most 'projects stats --top' can show
+LARGEST_FILES = 10
+STATS_SORT_KEYS = {
+    "size": lambda stats: -stats.size,
+    "files": lambda stats: -stats.files,
+    "modified": lambda stats: -(stats.last_modified or 0),
+    "name": lambda stats: stats.name,
+}
+
 
 @app.command(name="list")
 def list_projects():
     """Show the projects."""
-    config = load_config()
+    config = load_config(["projects"])
     pretty = Pretty(config.project_names)
     panel = Panel(pretty, title="Projects")
     rich.print(panel)
@@ -23,33 +57,69 @@ def list_projects():
 @app.command()
 def capture():
     """Capture the projects and add them to the config file."""
-    config = load_config()
-    projects = os.listdir(config.get_project_location())
-    config.project_names = sorted(
+    project_location = load_config([]).get_project_location()
+    project_names = sorted(
         [
             project
-            for project in projects
-            if isdir(join(config.get_project_location(), project))
-            and not project.startswith(".")
+            for project in os.listdir(project_location)
+            if isdir(join(project_location, project)) and not project.startswith(".")
         ]
     )
-    save_config(config)
-    rich.print(f"[blue]Captured {len(config.project_names)} projects.")
+
+    def set_project_names(config: FlowConfig):
+        config.project_names = project_names
+
+    update_config(set_project_names, ["projects"])
+    rich.print(f"[blue]Captured {len(project_names)} projects.")
 
 
 @app.command()
-def create():
+def create(
+    template: Optional[str] = typer.Option(
+        None, help="Template folder copied into every project"
+    ),
+    mode: str = typer.Option(
+        "auto",
+        help="How template files are copied: auto (reflink or copy), "
+        "hardlink (reflink, hardlink or copy) or copy",
+    ),
+    jobs: int = typer.Option(
+        default_jobs() * 4, "--jobs", "-j", help="Number of files copied in parallel"
+    ),
+):
     """Create the project directories."""
-    config = load_config()
+    config = load_config(["projects"])
+    if mode not in COPY_MODES:
+        rich.print(
+            f"[red]Unsupported mode '{mode}', use one of: {', '.join(COPY_MODES)}"
+        )
+        raise typer.Exit(code=1)
+
+    template = template or config.project_template
+    if template is not None and not isdir(os.path.expanduser(template)):
+        rich.print(f"[red]Template folder '{template}' does not exist.")
+        raise typer.Exit(code=1)
 
     project_location = config.get_project_location()
+    projects = [os.path.join(project_location, name) for name in config.project_names]
 
-    for name in config.project_names:
+    for project in projects:
         for subdir in config.project_subdirs:
-            dir_path = os.path.join(project_location, name, subdir)
-            if not isdir(dir_path):
-                os.makedirs(dir_path, exist_ok=True)
-                rich.print(f"[yellow]Created directory '{dir_path}'.")
+            dir_path = os.path.join(project, subdir)
+            try:
+                os.makedirs(dir_path)
+            except FileExistsError:
+                continue
+            rich.print(f"[yellow]Created directory '{dir_path}'.")
+
+    if template is not None:
+        tree = scan_template(os.path.expanduser(template))
+        result = materialize_template(tree, projects, mode, jobs)
+        rich.print(
+            f"[green]Template applied: {result.reflinked} reflinked, "
+            f"{result.hardlinked} hardlinked, {result.copied} copied, "
+            f"{result.skipped} already present, {result.dirs} directories created."
+        )
 
     rich.print("[blue]Project directories created.")
 
@@ -57,11 +127,277 @@ def create():
 @app.command()
 def add(project: str):
     """Add a project to the config file."""
-    config = load_config()
-    if project in config.project_names:
+    if not update_config(lambda config: config.add_project(project), ["projects"]):
         rich.print(f"[yellow]Project '{project}' already exists.")
         return
-    config.project_names.append(project)
-    save_config(config)
 
     rich.print(f"[blue]Project '{project}' added.")
+
+
+@dataclass
+class ProjectStats:
+    """Size, file count, last change and largest files of a project."""
+
+    name: str
+    size: int = 0
+    files: int = 0
+    last_modified: Optional[float] = None
+    largest: List[Tuple[str, int]] = field(default_factory=list)
+    missing: bool = False
+    unreadable: int = 0
+
+
+def scan_stats_directory(path: str, entry: Optional[dict]) -> Optional[dict]:
+    """
+    Get the file statistics of one directory, without its subdirectories.
+
+    The cache entry is reused while the mtime of the directory is unchanged.
+    Returns None if the directory does not exist, and an entry marked as
+    unreadable if it cannot be listed.
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    if entry is not None and entry.get("mtime") == mtime:
+        return entry
+
+    size = files = 0
+    modified = None
+    largest = []
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for dir_entry in entries:
+                try:
+                    if dir_entry.is_dir(follow_symlinks=False):
+                        subdirs.append(dir_entry.name)
+                    elif dir_entry.is_file(follow_symlinks=False):
+                        stat = dir_entry.stat(follow_symlinks=False)
+                        size += stat.st_size
+                        files += 1
+                        modified = max(modified or 0, stat.st_mtime)
+                        largest.append((dir_entry.name, stat.st_size))
+                except OSError:
+                    continue
+    except OSError:
+        return {"mtime": mtime, "unreadable": True}
+    return {
+        "mtime": mtime,
+        "size": size,
+        "files": files,
+        "modified": modified,
+        "largest": heapq.nlargest(LARGEST_FILES, largest, key=lambda item: item[1]),
+        "subdirs": subdirs,
+    }
+
+
+@timed("scan")
+def collect_project_stats(
+    project_location: str, names: List[str], jobs: int = 1, dir_cache=None
+) -> List[ProjectStats]:
+    """
+    Walk all projects level by level, scanning the directories of a level in parallel.
+
+    If a directory cache is given, unchanged directories are taken from it
+    and it is replaced by the entries of the directories that still exist.
+    """
+    dir_cache = {} if dir_cache is None else dir_cache
+    stats = {name: ProjectStats(name=name) for name in names}
+    new_cache = {}
+    level = [(name, join(project_location, name)) for name in names]
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        while level:
+            entries = executor.map(
+                lambda item: scan_stats_directory(item[1], dir_cache.get(item[1])),
+                level,
+            )
+            next_level = []
+            for (name, path), entry in zip(level, entries):
+                project = stats[name]
+                if entry is None:
+                    project.missing = path == join(project_location, name)
+                    continue
+                if entry.get("unreadable"):
+                    # not cached, so the directory is listed again next time
+                    project.unreadable += 1
+                    continue
+                new_cache[path] = entry
+                project.size += entry["size"]
+                project.files += entry["files"]
+                if entry["modified"] is not None:
+                    project.last_modified = max(
+                        project.last_modified or 0, entry["modified"]
+                    )
+                rel_dir = os.path.relpath(path, join(project_location, name))
+                project.largest = heapq.nlargest(
+                    LARGEST_FILES,
+                    project.largest
+                    + [
+                        (os.path.normpath(join(rel_dir, file_name)), file_size)
+                        for file_name, file_size in entry["largest"]
+                    ],
+                    key=lambda item: item[1],
+                )
+                next_level += [(name, join(path, sub)) for sub in entry["subdirs"]]
+            level = next_level
+    dir_cache.clear()
+    dir_cache.update(new_cache)
+    return list(stats.values())
+
+
+def print_project_stats(stats: List[ProjectStats], top: int, json_output: bool):
+    """Print the statistics as a table or as JSON."""
+    for project in stats:
+        project.largest = project.largest[:top]
+    if json_output:
+        typer.echo(json.dumps([asdict(project) for project in stats], indent=2))
+        return
+
+    table = Table(title="Projects")
+    table.add_column("Project")
+    table.add_column("Size", justify="right")
+    table.add_column("Files", justify="right")
+    table.add_column("Last modified", justify="right")
+    table.add_column("Largest files")
+    for project in stats:
+        if project.missing:
+            table.add_row(project.name, "[red]missing")
+            continue
+        table.add_row(
+            project.name,
+            format_size(project.size),
+            str(project.files),
+            format_age(project.last_modified),
+            ", ".join(
+                f"{name} ({format_size(size)})" for name, size in project.largest
+            ),
+        )
+    rich.print(table)
+    for project in stats:
+        if project.unreadable:
+            rich.print(
+                f"[yellow]Project '{project.name}': {project.unreadable} "
+                "unreadable directories skipped."
+            )
+
+
+@app.command()
+def stats(
+    sort: str = typer.Option("size", help=f"Sort by {', '.join(STATS_SORT_KEYS)}"),
+    top: int = typer.Option(
+        3, help=f"Number of largest files, at most {LARGEST_FILES}"
+    ),
+    jobs: int = typer.Option(
+        default_jobs() * 4,
+        "--jobs",
+        "-j",
+        help="Number of directories scanned in parallel",
+    ),
+    json_output: bool = typer.Option(False, "--json", help="Print the stats as JSON"),
+    full: bool = typer.Option(
+        False,
+        "--full",
+        help="Rescan everything. Directories are otherwise only rescanned when "
+        "their mtime changed, so files edited in place may be missed",
+    ),
+):
+    """Show size, file count, last change and largest files of every project."""
+    if sort not in STATS_SORT_KEYS:
+        rich.print(
+            f"[red]Unsupported sort '{sort}', use one of: {', '.join(STATS_SORT_KEYS)}"
+        )
+        raise typer.Exit(code=1)
+    config = load_config(["projects"])
+    project_location = config.get_project_location()
+
+    cache = load_cache(PROJECT_STATS_CACHE)
+    cache_key = {"root": os.path.abspath(project_location)}
+    if full or cache.get("key") != cache_key:
+        cache = {}
+    dir_cache = cache.get("dirs", {})
+    project_stats = collect_project_stats(
+        project_location, config.project_names, jobs, dir_cache
+    )
+    save_cache(PROJECT_STATS_CACHE, {"key": cache_key, "dirs": dir_cache})
+
+    project_stats.sort(key=STATS_SORT_KEYS[sort])
+    print_project_stats(project_stats, top, json_output)
+
+
+def is_plain_name(name: str) -> bool:
+    """Check that a name is a single path component, not '.' or '..'."""
+    separators = [os.sep] + ([os.altsep] if os.altsep else [])
+    return name not in ("", ".", "..") and not any(sep in name for sep in separators)
+
+
+def check_project_name(name: str):
+    if not is_plain_name(name):
+        rich.print(f"[red]Invalid project name '{name}'.")
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def archive(name: str):
+    """Archive a project into a compressed tar, then remove it."""
+    check_project_name(name)
+    config = load_config(["projects"])
+    if not config.has_project(name):
+        rich.print(f"[red]Project '{name}' is not in the config.")
+        raise typer.Exit(code=1)
+    project_path = join(config.get_project_location(), name)
+    if not isdir(project_path):
+        rich.print(f"[red]Project folder '{project_path}' does not exist.")
+        raise typer.Exit(code=1)
+    archive_location = os.path.realpath(config.get_project_archive_location())
+    real_project_path = os.path.realpath(project_path)
+    if os.path.commonpath([archive_location, real_project_path]) == real_project_path:
+        rich.print(
+            f"[red]Project folder '{project_path}' contains the archive location."
+        )
+        raise typer.Exit(code=1)
+
+    try:
+        archive_path = archive_folder(
+            project_path, config.get_project_archive_location()
+        )
+    except ArchiveError as e:
+        rich.print(f"[red]Could not archive '{name}': {e}")
+        raise typer.Exit(code=1)
+
+    shutil.rmtree(project_path)
+    update_config(lambda config: config.remove_project(name), ["projects"])
+    rich.print(f"[blue]Project '{name}' archived to '{archive_path}'.")
+
+
+@app.command()
+def restore(
+    name: str,
+    keep_archive: bool = typer.Option(
+        False, "--keep-archive", help="Keep the archive after restoring"
+    ),
+):
+    """Restore an archived project and add it to the config file."""
+    check_project_name(name)
+    config = load_config(["projects"])
+    project_location = config.get_project_location()
+    archive_path = find_archive(config.get_project_archive_location(), name)
+    if archive_path is None:
+        rich.print(f"[red]No archive found for project '{name}'.")
+        raise typer.Exit(code=1)
+    if os.path.lexists(join(project_location, name)):
+        rich.print(
+            f"[red]Project folder '{join(project_location, name)}' already exists."
+        )
+        raise typer.Exit(code=1)
+
+    try:
+        restore_folder(archive_path, project_location)
+    except ArchiveError as e:
+        rich.print(f"[red]Could not restore '{name}': {e}")
+        raise typer.Exit(code=1)
+
+    if not keep_archive:
+        os.remove(archive_path)
+    update_config(lambda config: config.add_project(name), ["projects"])
+    rich.print(f"[blue]Project '{name}' restored from '{archive_path}'.")
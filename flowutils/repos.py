@@ -1,57 +1,217 @@
+import configparser
+import hashlib
+import json
 import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from dataclasses import asdict, dataclass
+from fnmatch import fnmatch
 from os.path import isdir, dirname
-from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 import git
 import rich
 import typer
+from rich.table import Table
 
-from flowutils.utils import load_config, GitRepoConfig, save_config
+from flowutils.profiling import span, timed
+from flowutils.utils import (
+    load_config,
+    GitRepoConfig,
+    update_config,
+    FlowConfig,
+    default_jobs,
+    format_age,
+    load_cache,
+    save_cache,
+)
 
 app = typer.Typer()
 
+# directories that never contain repositories worth collecting
+PRUNED_DIRECTORIES = [".git", "node_modules", ".venv"]
+# seconds to wait before retrying a failed clone, multiplied by the attempt
+RETRY_DELAY = 2.0
+REPOS_CACHE = "repos"
+
 
 @app.command()
-def collect():
+def collect(
+    ignore: List[str] = typer.Option(
+        [], "--ignore", "-i", help="Glob of directory names to skip"
+    ),
+    jobs: int = typer.Option(
+        default_jobs() * 4,
+        "--jobs",
+        "-j",
+        help="Number of directories scanned in parallel",
+    ),
+    full: bool = typer.Option(
+        False, "--full", help="Rescan everything instead of using the mtime cache"
+    ),
+):
     """Collect the Git repositories."""
-    config = load_config()
+    config = load_config(["repos"])
 
     project_location = config.get_project_location()
-    git_repos = config.git_repos
+    ignore_globs = PRUNED_DIRECTORIES + config.repo_ignore_globs + ignore
+
+    cache = load_cache(REPOS_CACHE)
+    cache_key = {"root": os.path.abspath(project_location), "ignore": ignore_globs}
+    if full or cache.get("key") != cache_key:
+        cache = {}
+    dir_cache = cache.get("dirs", {})
+    git_repo_paths = discover_repos(project_location, ignore_globs, jobs, dir_cache)
+    save_cache(REPOS_CACHE, {"key": cache_key, "dirs": dir_cache})
+
+    found = [
+        GitRepoConfig(file_location=git_repo_path, url=git_repo_url)
+        for git_repo_path in git_repo_paths
+        if (git_repo_url := get_remote_url(git_repo_path))
+    ]
+
+    def add_git_repos(config: FlowConfig):
+        added = [repo_info for repo_info in found if config.add_git_repo(repo_info)]
+        return added, len(config.git_repos)
+
+    added, total = update_config(add_git_repos, ["repos"])
+    for repo_info in added:
+        rich.print(
+            f"[green]Git repository found at '{repo_info.file_location}' with url: {repo_info.url}."
+        )
+
+    rich.print(f"[blue]{total} Git repositories collected.")
+
+
+def scan_directory(
+    path: str, ignore_globs: List[str]
+) -> Tuple[Optional[str], List[str]]:
+    """
+    Scan one directory for a repository.
+
+    Returns the path of the '.git' entry if the directory is a repository,
+    otherwise None and the subdirectories to descend into. The working
+    tree of a repository is not descended into.
+    """
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name == ".git":
+                    return entry.path, []
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                if any(fnmatch(entry.name, pattern) for pattern in ignore_globs):
+                    continue
+                subdirs.append(entry.path)
+    except OSError:
+        return None, []
+    return None, subdirs
 
-    for root, dirs, files in os.walk(project_location):
-        if ".git" in dirs:
-            git_repo_path = Path(os.path.join(root, ".git"))
-            git_repo_url = get_remote_url(str(git_repo_path))
-            if git_repo_url:
-                repo_info = GitRepoConfig(
-                    file_location=str(git_repo_path), url=git_repo_url
-                )
-                if repo_info not in git_repos:
-                    git_repos.append(repo_info)
-                    rich.print(
-                        f"[green]Git repository found at '{git_repo_path}' with url: {git_repo_url}."
-                    )
 
-    config.git_repos = git_repos
-    save_config(config)
+def scan_directory_cached(
+    path: str, ignore_globs: List[str], entry: Optional[dict]
+) -> Tuple[Optional[str], List[str], Optional[dict]]:
+    """
+    Scan one directory, reusing its cache entry if it is still valid.
 
-    rich.print(f"[blue]{len(git_repos)} Git repositories collected.")
+    A known repository is re-validated with a single stat of its '.git'
+    entry. Any other directory is only listed again if its mtime changed,
+    otherwise its cached subdirectories are returned. Returns the '.git'
+    path, the subdirectories and the new cache entry.
+    """
+    if entry is not None and "git" in entry and os.path.lexists(entry["git"]):
+        return entry["git"], [], entry
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None, [], None
+    if entry is not None and entry.get("mtime") == mtime:
+        return None, [os.path.join(path, name) for name in entry["subdirs"]], entry
+
+    git_path, subdirs = scan_directory(path, ignore_globs)
+    if git_path is not None:
+        return git_path, [], {"git": git_path}
+    names = [os.path.basename(subdir) for subdir in subdirs]
+    return None, subdirs, {"mtime": mtime, "subdirs": names}
+
+
+@timed("scan")
+def discover_repos(
+    root: str,
+    ignore_globs: List[str],
+    jobs: int = 1,
+    dir_cache: Optional[dict] = None,
+) -> List[str]:
+    """
+    Find the '.git' paths of all repositories below root.
+
+    The tree is walked level by level and the directories of one level are
+    scanned concurrently. Ignored directories and the working trees of found
+    repositories are pruned.
+
+    If a directory cache is given, it is used and updated in place. Changes
+    deep in the tree do not touch the mtime of the parent directories, so
+    every cached directory is still visited, but with one stat instead of a
+    listing. Directories that are gone drop out of the cache.
+    """
+    use_cache = dir_cache is not None
+    old_cache = dict(dir_cache) if use_cache else {}
+    if use_cache:
+        dir_cache.clear()
+
+    def scan(path: str):
+        if use_cache:
+            return path, *scan_directory_cached(path, ignore_globs, old_cache.get(path))
+        return path, *scan_directory(path, ignore_globs), None
+
+    git_paths = []
+    frontier = [root]
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        while frontier:
+            next_frontier = []
+            for path, git_path, subdirs, entry in executor.map(scan, frontier):
+                if git_path is not None:
+                    git_paths.append(git_path)
+                if use_cache and entry is not None:
+                    dir_cache[path] = entry
+                next_frontier.extend(subdirs)
+            frontier = next_frontier
+    return sorted(git_paths)
+
+
+def resolve_git_dir(git_path: str) -> str:
+    """Resolve a '.git' file of worktrees and submodules to the git directory."""
+    if os.path.isfile(git_path):
+        with open(git_path) as f:
+            content = f.read().strip()
+        if content.startswith("gitdir:"):
+            git_dir = content[len("gitdir:") :].strip()
+            git_path = os.path.join(os.path.dirname(git_path), git_dir)
+    commondir_path = os.path.join(git_path, "commondir")
+    if os.path.isfile(commondir_path):
+        with open(commondir_path) as f:
+            git_path = os.path.join(git_path, f.read().strip())
+    return os.path.normpath(git_path)
 
 
 def get_remote_url(repo_path):
-    """Get the remote URL of a Git repository."""
+    """Get the origin URL of a Git repository by parsing its config file."""
+    config_path = os.path.join(resolve_git_dir(repo_path), "config")
+    parser = configparser.ConfigParser(strict=False, interpolation=None)
     try:
-        repo = git.Repo(repo_path, search_parent_directories=True)
-        return repo.remotes.origin.url
-    except (git.InvalidGitRepositoryError, AttributeError):
+        parser.read(config_path)
+    except (configparser.Error, OSError, UnicodeDecodeError):
         return None
+    return parser.get('remote "origin"', "url", fallback=None)
 
 
 @app.command(name="list")
 def list_repos():
     """List the Git repositories."""
-    config = load_config()
+    config = load_config(["repos"])
     git_repos = config.git_repos
     if not git_repos:
         rich.print("[blue]No Git repositories found.")
@@ -62,25 +222,396 @@ def list_repos():
         rich.print(f"[blue]{repo.file_location} [green] -> {repo.url}")
 
 
+@dataclass
+class CloneResult:
+    """Outcome of cloning one repository."""
+
+    repo: GitRepoConfig
+    attempts: int = 0
+    skipped: bool = False
+    from_snapshot: bool = False
+    error: Optional[str] = None
+
+
+def get_work_tree(repo_info: GitRepoConfig) -> str:
+    return os.path.abspath(dirname(repo_info.file_location))
+
+
+def get_repo_key(repo_info: GitRepoConfig) -> str:
+    """
+    Get a unique file name for a repository, derived from its working tree path.
+
+    The folder name keeps it readable, a hash of the whole path keeps paths
+    like 'my_app/api' and 'my/app_api' apart.
+    """
+    work_tree = get_work_tree(repo_info)
+    digest = hashlib.sha256(work_tree.encode()).hexdigest()[:16]
+    return f"{os.path.basename(work_tree)}-{digest}"
+
+
+def get_mirror_url(snapshot_path: str) -> Optional[str]:
+    """Get the origin url of a mirror, None if it is not a usable repository."""
+    process = _run_git(snapshot_path, "config", "--get", "remote.origin.url")
+    return process.stdout.strip() if process.returncode == 0 else None
+
+
+def group_nested_repos(
+    git_repos: List[GitRepoConfig],
+) -> Tuple[List[GitRepoConfig], Dict[str, List[GitRepoConfig]]]:
+    """
+    Split repos into those outside any other repo and the nested repos of each one.
+
+    A nested repo belongs to the nearest configured repo whose working tree
+    contains it, keyed by that working tree.
+    """
+    work_trees = {get_work_tree(repo_info): repo_info for repo_info in git_repos}
+    top_level = []
+    nested = {}
+    for work_tree, repo_info in work_trees.items():
+        parent = dirname(work_tree)
+        while parent not in work_trees and dirname(parent) != parent:
+            parent = dirname(parent)
+        if parent in work_trees:
+            nested.setdefault(parent, []).append(repo_info)
+        else:
+            top_level.append(repo_info)
+    return top_level, nested
+
+
+def get_log_path(log_dir: str, repo_info: GitRepoConfig) -> str:
+    """Get the log file of a repository, named after its working tree path."""
+    return os.path.join(log_dir, get_repo_key(repo_info) + ".log")
+
+
+def get_snapshot_path(snapshot_dir: str, repo_info: GitRepoConfig) -> str:
+    """Get the bare mirror of a repository in the snapshot folder."""
+    return os.path.join(snapshot_dir, get_repo_key(repo_info) + ".git")
+
+
+def clone_repo(
+    repo_info: GitRepoConfig,
+    clone_options: dict,
+    retries: int = 0,
+    log_dir: Optional[str] = None,
+    snapshot_dir: Optional[str] = None,
+) -> CloneResult:
+    """
+    Clone a repository, retrying failed attempts.
+
+    The clone options are passed to 'git clone', e.g. depth, filter or
+    reference. If a log folder is given, the outcome of every attempt is
+    written to the log file of the repository. If a snapshot folder holds a
+    mirror of the repository, it is cloned from the mirror and origin is
+    pointed back to the real url afterwards. A mirror of another url is
+    ignored.
+    """
+    result = CloneResult(repo=repo_info)
+    if isdir(repo_info.file_location):
+        result.skipped = True
+        return result
+
+    source = repo_info.url
+    if snapshot_dir is not None:
+        snapshot_path = get_snapshot_path(snapshot_dir, repo_info)
+        if isdir(snapshot_path) and get_mirror_url(snapshot_path) == repo_info.url:
+            source = snapshot_path
+            result.from_snapshot = True
+
+    log_lines = []
+    for attempt in range(retries + 1):
+        result.attempts = attempt + 1
+        try:
+            with span("tool.git"):
+                cloned = git.Repo.clone_from(
+                    source, dirname(repo_info.file_location), **clone_options
+                )
+            if source != repo_info.url:
+                cloned.remotes.origin.set_url(repo_info.url)
+            result.error = None
+            log_lines.append(f"attempt {result.attempts}: cloned {source}")
+            break
+        except git.GitCommandError as e:
+            result.error = str(e)
+            log_lines.append(f"attempt {result.attempts}: {e}")
+            if attempt < retries:
+                time.sleep(RETRY_DELAY * (attempt + 1))
+
+    if log_dir is not None:
+        os.makedirs(log_dir, exist_ok=True)
+        with open(get_log_path(log_dir, repo_info), "w") as f:
+            f.write("\n".join(log_lines) + "\n")
+    return result
+
+
 @app.command()
-def create():
+def create(
+    jobs: int = typer.Option(
+        default_jobs(), "--jobs", "-j", help="Number of repositories cloned in parallel"
+    ),
+    retries: int = typer.Option(2, help="Number of retries of a failed clone"),
+    filter_spec: Optional[str] = typer.Option(
+        None, "--filter", help="Partial clone filter, e.g. 'blob:none'"
+    ),
+    depth: Optional[int] = typer.Option(None, help="Create shallow clones"),
+    reference: Optional[str] = typer.Option(
+        None, help="Local repository used as object cache"
+    ),
+    log_dir: Optional[str] = typer.Option(None, help="Folder for one log per repo"),
+    from_snapshot: bool = typer.Option(
+        False, "--from-snapshot", help="Clone from the mirrors of 'repos snapshot'"
+    ),
+):
     """Create the Git repositories."""
-    config = load_config()
+    config = load_config(["repos"])
+    snapshot_dir = config.get_repo_snapshot_location() if from_snapshot else None
+
+    clone_options = {}
+    if filter_spec is not None:
+        clone_options["filter"] = filter_spec
+    if depth is not None:
+        clone_options["depth"] = depth
+    if reference is not None:
+        clone_options["reference_if_able"] = os.path.expanduser(reference)
+
+    def submit(repo_info: GitRepoConfig):
+        return executor.submit(
+            clone_repo, repo_info, clone_options, retries, log_dir, snapshot_dir
+        )
+
+    # a nested repo is cloned after its parent, which needs an empty folder
+    top_level, nested = group_nested_repos(config.git_repos)
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = {submit(repo_info) for repo_info in top_level}
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                failed += report_clone_result(result)
+                futures |= {
+                    submit(child)
+                    for child in nested.pop(get_work_tree(result.repo), [])
+                }
+
+    rich.print("[blue]Git repositories created.")
+    if failed:
+        rich.print(f"[red]{failed} repositories could not be cloned.")
+        raise typer.Exit(code=1)
+
+
+def report_clone_result(result: CloneResult) -> int:
+    """Print the outcome of a clone and return 1 if it failed."""
+    repo_info = result.repo
+    if result.skipped:
+        rich.print(
+            f"[yellow]Git repository already exists at '{repo_info.file_location}'."
+        )
+        return 0
+    if result.error is None:
+        source = "snapshot" if result.from_snapshot else repo_info.url
+        rich.print(
+            f"[green]Git repository cloned from '{source}' to '{repo_info.file_location}'."
+        )
+        return 0
+    rich.print(
+        f"[red]An error occurred while cloning the repository from '{repo_info.url}' "
+        f"after {result.attempts} attempts: {result.error}"
+    )
+    return 1
+
+
+@dataclass
+class SnapshotResult:
+    """Outcome of creating or updating the mirror of one repository."""
+
+    repo: GitRepoConfig
+    path: str
+    created: bool = False
+    error: Optional[str] = None
+
 
-    for repo_info in config.git_repos:
-        if isdir(repo_info.file_location):
-            rich.print(
-                f"[yellow]Git repository already exists at '{repo_info.file_location}'."
+def snapshot_repo(repo_info: GitRepoConfig, snapshot_dir: str) -> SnapshotResult:
+    """
+    Create or update the bare mirror of a repository.
+
+    New mirrors are cloned next to their final path and renamed into place,
+    so an interrupted clone never looks like a usable mirror. Existing
+    mirrors only fetch what changed.
+    """
+    result = SnapshotResult(
+        repo=repo_info, path=get_snapshot_path(snapshot_dir, repo_info)
+    )
+    if isdir(result.path):
+        _run_git(result.path, "remote", "set-url", "origin", repo_info.url)
+        process = _run_git(result.path, "remote", "update", "--prune")
+    else:
+        result.created = True
+        tmp_path = f"{result.path}.{os.getpid()}.tmp"
+        with span("tool.git"):
+            process = subprocess.run(
+                ["git", "clone", "--mirror", "--quiet", repo_info.url, tmp_path],
+                capture_output=True,
+                text=True,
             )
+        if process.returncode == 0:
+            os.replace(tmp_path, result.path)
+        else:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    if process.returncode != 0:
+        result.error = process.stderr.strip()
+    return result
+
+
+@app.command()
+def snapshot(
+    jobs: int = typer.Option(
+        default_jobs() * 4, "--jobs", "-j", help="Number of repositories in parallel"
+    ),
+):
+    """Create or update a local bare mirror of every repository."""
+    config = load_config(["repos"])
+    snapshot_dir = config.get_repo_snapshot_location()
+    os.makedirs(snapshot_dir, exist_ok=True)
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [
+            executor.submit(snapshot_repo, repo_info, snapshot_dir)
+            for repo_info in config.git_repos
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            if result.error is not None:
+                failed += 1
+                rich.print(
+                    f"[red]Could not snapshot '{result.repo.url}': {result.error}"
+                )
+            elif result.created:
+                rich.print(f"[green]Mirrored '{result.repo.url}' to '{result.path}'.")
+            else:
+                rich.print(f"[green]Updated mirror '{result.path}'.")
+
+    rich.print(f"[blue]{len(config.git_repos) - failed} repositories in snapshot.")
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@dataclass
+class RepoStatus:
+    """State of a repository working tree."""
+
+    path: str
+    branch: Optional[str] = None
+    dirty: int = 0
+    ahead: Optional[int] = None
+    behind: Optional[int] = None
+    last_commit: Optional[int] = None
+    error: Optional[str] = None
+
+
+def parse_status_output(path: str, output: str) -> RepoStatus:
+    """Parse the output of 'git status --porcelain=v2 --branch'."""
+    status = RepoStatus(path=path)
+    for line in output.splitlines():
+        if line.startswith("# branch.head "):
+            status.branch = line[len("# branch.head ") :]
+        elif line.startswith("# branch.ab "):
+            ahead, behind = line[len("# branch.ab ") :].split()
+            status.ahead = int(ahead)
+            status.behind = -int(behind)
+        elif line and not line.startswith("#"):
+            status.dirty += 1
+    return status
+
+
+@timed("tool.git")
+def _run_git(work_tree: str, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        ["git", "-C", work_tree, *args], capture_output=True, text=True
+    )
+
+
+def get_repo_status(work_tree: str) -> RepoStatus:
+    """Get branch, dirty files, ahead/behind counts and last commit time."""
+    if not isdir(work_tree):
+        return RepoStatus(path=work_tree, error="missing")
+    process = _run_git(work_tree, "status", "--porcelain=v2", "--branch")
+    if process.returncode != 0:
+        return RepoStatus(path=work_tree, error=process.stderr.strip())
+    status = parse_status_output(work_tree, process.stdout)
+    process = _run_git(work_tree, "log", "-1", "--format=%ct")
+    if process.returncode == 0 and process.stdout.strip():
+        status.last_commit = int(process.stdout.strip())
+    return status
+
+
+def fetch_repo(work_tree: str) -> RepoStatus:
+    """Fetch the remotes of a repository and get its status afterwards."""
+    if not isdir(work_tree):
+        return RepoStatus(path=work_tree, error="missing")
+    process = _run_git(work_tree, "fetch", "--quiet", "--prune")
+    status = get_repo_status(work_tree)
+    if process.returncode != 0 and status.error is None:
+        status.error = process.stderr.strip()
+    return status
+
+
+def collect_statuses(worker, git_repos: List[GitRepoConfig], jobs: int):
+    """Run the worker for the working tree of every repository in parallel."""
+    work_trees = [dirname(repo_info.file_location) for repo_info in git_repos]
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        return list(executor.map(worker, work_trees))
+
+
+def print_statuses(statuses: List[RepoStatus], json_output: bool):
+    """Print the statuses as a table or as JSON."""
+    if json_output:
+        typer.echo(json.dumps([asdict(status) for status in statuses], indent=2))
+        return
+
+    table = Table(title="Git repositories")
+    table.add_column("Repository")
+    table.add_column("Branch")
+    table.add_column("Dirty", justify="right")
+    table.add_column("Ahead", justify="right")
+    table.add_column("Behind", justify="right")
+    table.add_column("Last commit", justify="right")
+    for status in statuses:
+        if status.error is not None:
+            table.add_row(status.path, f"[red]{status.error}")
             continue
-        try:
-            git.Repo.clone_from(repo_info.url, dirname(repo_info.file_location))
-            rich.print(
-                f"[green]Git repository cloned from '{repo_info.url}' to '{repo_info.file_location}'."
-            )
-        except git.GitCommandError as e:
-            rich.print(
-                f"[red]An error occurred while cloning the repository from '{repo_info.url}': {str(e)}"
-            )
+        table.add_row(
+            status.path,
+            status.branch,
+            f"[yellow]{status.dirty}" if status.dirty else "0",
+            "-" if status.ahead is None else str(status.ahead),
+            "-" if status.behind is None else str(status.behind),
+            format_age(status.last_commit),
+        )
+    rich.print(table)
 
-    rich.print("[blue]Git repositories created.")
+
+@app.command()
+def status(
+    jobs: int = typer.Option(
+        default_jobs() * 4, "--jobs", "-j", help="Number of repositories in parallel"
+    ),
+    json_output: bool = typer.Option(False, "--json", help="Print the status as JSON"),
+):
+    """Show branch, dirty state and ahead/behind counts of all repositories."""
+    config = load_config(["repos"])
+    print_statuses(
+        collect_statuses(get_repo_status, config.git_repos, jobs), json_output
+    )
+
+
+@app.command()
+def fetch(
+    jobs: int = typer.Option(
+        default_jobs() * 4, "--jobs", "-j", help="Number of repositories in parallel"
+    ),
+    json_output: bool = typer.Option(False, "--json", help="Print the status as JSON"),
+):
+    """Fetch all repositories and show their status."""
+    config = load_config(["repos"])
+    print_statuses(collect_statuses(fetch_repo, config.git_repos, jobs), json_output)
@@ -0,0 +1,133 @@
+"""module for generating static shell navigation files"""
+
+import os
+import shlex
+from os.path import abspath, dirname, join
+from typing import Dict
+
+from flowutils.utils import FlowConfig, get_config_path, load_config
+
+SHELLS = ["bash", "zsh", "fish"]
+JUMP_FUNCTION = "fj"
+HEADER = "# generated by 'flow links export', regenerated when the config changes"
+
+
+def get_shell_export_path(shell: str) -> str:
+    """Get the path of the export file of a shell, kept next to the config file."""
+    return join(dirname(get_config_path()), "shell", f"flow.{shell}")
+
+
+def collect_jump_targets(config: FlowConfig) -> Dict[str, str]:
+    """
+    Map jump names to absolute directories.
+
+    Links come first, then projects and their subdirectories, then repository
+    working trees relative to the project location. The first name wins.
+    """
+    targets = {}
+    link_location = abspath(config.get_link_location())
+    for link in config.links:
+        target = join(link_location, os.path.expanduser(link.target))
+        targets.setdefault(link.name, os.path.normpath(target))
+
+    project_location = abspath(config.get_project_location())
+    for name in config.project_names:
+        targets.setdefault(name, join(project_location, name))
+        for subdir in config.project_subdirs:
+            targets.setdefault(f"{name}/{subdir}", join(project_location, name, subdir))
+
+    for repo in config.git_repos:
+        work_tree = abspath(dirname(repo.file_location))
+        name = os.path.relpath(work_tree, project_location)
+        if name.startswith(os.pardir):
+            name = os.path.basename(work_tree)
+        targets.setdefault(name, work_tree)
+    return targets
+
+
+def _quote_fish(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def render_posix(targets: Dict[str, str], shell: str) -> str:
+    """Render the jump function and its completion for bash or zsh."""
+    lines = [HEADER, f"{JUMP_FUNCTION}() {{", '    case "$1" in']
+    for name, path in targets.items():
+        lines.append(f"        {shlex.quote(name)}) cd -- {shlex.quote(path)} ;;")
+    lines += [
+        f"        *) echo \"{JUMP_FUNCTION}: unknown target '$1'\" >&2; return 1 ;;",
+        "    esac",
+        "}",
+        f"_{JUMP_FUNCTION}_names=({' '.join(shlex.quote(name) for name in targets)})",
+    ]
+    if shell == "zsh":
+        lines += [
+            f'_{JUMP_FUNCTION}() {{ compadd -- "${{_{JUMP_FUNCTION}_names[@]}}"; }}',
+            f"(( $+functions[compdef] )) && compdef _{JUMP_FUNCTION} {JUMP_FUNCTION}",
+        ]
+    else:
+        lines += [
+            f"_{JUMP_FUNCTION}() {{",
+            f'    COMPREPLY=($(compgen -W "${{_{JUMP_FUNCTION}_names[*]}}" -- "${{COMP_WORDS[COMP_CWORD]}}"))',
+            "}",
+            f"complete -F _{JUMP_FUNCTION} {JUMP_FUNCTION}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def render_fish(targets: Dict[str, str]) -> str:
+    """Render the jump function and its completion for fish."""
+    lines = [HEADER, f"function {JUMP_FUNCTION}", "    switch $argv[1]"]
+    for name, path in targets.items():
+        lines += [
+            f"        case {_quote_fish(name)}",
+            f"            cd {_quote_fish(path)}",
+        ]
+    lines += [
+        "        case '*'",
+        f"            echo \"{JUMP_FUNCTION}: unknown target '$argv[1]'\" >&2",
+        "            return 1",
+        "    end",
+        "end",
+        f"complete -c {JUMP_FUNCTION} -f",
+    ]
+    for name in targets:
+        lines.append(f"complete -c {JUMP_FUNCTION} -a {_quote_fish(name)}")
+    return "\n".join(lines) + "\n"
+
+
+def render_export(config: FlowConfig, shell: str) -> str:
+    """Render the export file of a shell."""
+    targets = collect_jump_targets(config)
+    if shell == "fish":
+        return render_fish(targets)
+    return render_posix(targets, shell)
+
+
+def write_export(config: FlowConfig, shell: str) -> str:
+    """Write the export file of a shell if its content changed and return its path."""
+    path = get_shell_export_path(shell)
+    content = render_export(config, shell)
+    try:
+        with open(path, "r") as f:
+            if f.read() == content:
+                return path
+    except OSError:
+        pass
+    os.makedirs(dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def refresh_exports(config: FlowConfig):
+    """Regenerate the export files that were created before."""
+    shells = [shell for shell in SHELLS if os.path.isfile(get_shell_export_path(shell))]
+    if not shells:
+        return
+    if not all(config.is_section_loaded(s) for s in ("links", "projects", "repos")):
+        config = load_config()
+    for shell in shells:
+        write_export(config, shell)
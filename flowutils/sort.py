@@ -7,11 +7,13 @@ from typing import List
 import rich
 import typer
 
+from flowutils.profiling import span
 from flowutils.utils import (
     load_config,
     SortingRuleConfig,
     SortFolderConfig,
-    save_config,
+    update_config,
+    FlowConfig,
 )
 
 app = typer.Typer()
@@ -23,7 +25,9 @@ def sort_folder(
     """Sort files in a folder based on the given rules."""
     for rule in rules:
         applied_rule = False
-        for filename in os.listdir(folder_path):
+        with span("scan"):
+            filenames = os.listdir(folder_path)
+        for filename in filenames:
             file_path = os.path.join(folder_path, filename)
             if os.path.isfile(file_path):
                 if any(
@@ -46,8 +50,9 @@ def sort_folder(
                             f"[blue]Would move: {file_path} -> {rule.sub_folder_name}"
                         )
                     else:
-                        os.makedirs(target_folder, exist_ok=True)
-                        shutil.move(file_path, target_path)
+                        with span("process"):
+                            os.makedirs(target_folder, exist_ok=True)
+                            shutil.move(file_path, target_path)
                         rich.print(
                             f"[green]Moved: {file_path} -> {rule.sub_folder_name}"
                         )
@@ -60,7 +65,7 @@ def run(
     ),
 ):
     """Sort files in configured folders."""
-    config = load_config()
+    config = load_config(["sort"])
 
     for folder_config in config.sort.folder_configs:
         folder_path = os.path.expanduser(folder_config.target_folder)
@@ -77,27 +82,30 @@ def run(
 @app.command()
 def add_rule(target_folder: str, sub_folder_name: str, keywords: List[str]):
     """Add a sorting rule to the config file."""
-    config = load_config()
-
     new_rule = SortingRuleConfig(sub_folder_name=sub_folder_name, contain_list=keywords)
 
-    for folder_config in config.sort.folder_configs:
-        if folder_config.target_folder == target_folder:
-            folder_config.rules.append(new_rule)
-            save_config(config)
-            rich.print(f"[blue]Rule added for {target_folder}")
-            return
+    def add_sorting_rule(config: FlowConfig) -> bool:
+        for folder_config in config.sort.folder_configs:
+            if folder_config.target_folder == target_folder:
+                folder_config.rules.append(new_rule)
+                return False
+
+        new_folder_config = SortFolderConfig(
+            target_folder=target_folder, rules=[new_rule]
+        )
+        config.sort.folder_configs.append(new_folder_config)
+        return True
 
-    new_folder_config = SortFolderConfig(target_folder=target_folder, rules=[new_rule])
-    config.sort.folder_configs.append(new_folder_config)
-    save_config(config)
-    rich.print(f"[blue]New folder config and rule added for {target_folder}")
+    if update_config(add_sorting_rule, ["sort"]):
+        rich.print(f"[blue]New folder config and rule added for {target_folder}")
+    else:
+        rich.print(f"[blue]Rule added for {target_folder}")
 
 
 @app.command(name="list")
 def list_rules():
     """List all sorting rules."""
-    config = load_config()
+    config = load_config(["sort"])
 
     if not config.sort.folder_configs:
         rich.print("[blue]No sorting rules found.")
@@ -0,0 +1,178 @@
+"""module for materializing project templates"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+# ioctl request to share the extents of one file with another (linux/fs.h)
+FICLONE = 0x40049409
+COPY_MODES = ["auto", "hardlink", "copy"]
+# errors meaning the file system cannot reflink, so it is not tried again
+UNSUPPORTED_ERRNOS = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL}
+
+
+@dataclass
+class TemplateTree:
+    """Relative directories, files and symlinks of a template."""
+
+    root: str
+    dirs: List[str] = field(default_factory=list)
+    files: List[str] = field(default_factory=list)
+    symlinks: List[str] = field(default_factory=list)
+
+
+@dataclass
+class TemplateResult:
+    """Counts of how the template files were materialized."""
+
+    dirs: int = 0
+    reflinked: int = 0
+    hardlinked: int = 0
+    copied: int = 0
+    skipped: int = 0
+
+
+def scan_template(root: str) -> TemplateTree:
+    """Walk the template once, parents before children."""
+    tree = TemplateTree(root=root)
+    pending = [""]
+    while pending:
+        rel_dir = pending.pop()
+        with os.scandir(os.path.join(root, rel_dir)) as entries:
+            for entry in entries:
+                rel_path = os.path.join(rel_dir, entry.name)
+                if entry.is_symlink():
+                    tree.symlinks.append(rel_path)
+                elif entry.is_dir():
+                    tree.dirs.append(rel_path)
+                    pending.append(rel_path)
+                else:
+                    tree.files.append(rel_path)
+    tree.dirs.sort()
+    return tree
+
+
+def _clonefile_darwin(src: str, dst: str) -> bool:
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0:
+        return True
+    error = ctypes.get_errno()
+    raise OSError(error, os.strerror(error), dst)
+
+
+def _ficlone_linux(src: str, dst: str) -> bool:
+    import fcntl
+
+    with open(src, "rb") as src_file:
+        fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            fcntl.ioctl(fd, FICLONE, src_file.fileno())
+        except OSError:
+            os.close(fd)
+            os.remove(dst)
+            raise
+        os.close(fd)
+    return True
+
+
+def reflink_file(src: str, dst: str) -> bool:
+    """Create dst as a copy-on-write clone of src sharing its blocks."""
+    if sys.platform == "darwin":
+        return _clonefile_darwin(src, dst)
+    if sys.platform.startswith("linux"):
+        return _ficlone_linux(src, dst)
+    raise OSError(errno.EOPNOTSUPP, "reflinks are not supported", dst)
+
+
+class TemplateCopier:
+    """
+    Copy files, preferring reflinks, then hardlinks in hardlink mode, then a copy.
+
+    Once a reflink fails because the file system does not support it, it is
+    not attempted again.
+    """
+
+    def __init__(self, mode: str = "auto"):
+        self.mode = mode
+        self.try_reflink = mode != "copy"
+
+    def copy(self, src: str, dst: str) -> str:
+        if self.try_reflink:
+            try:
+                reflink_file(src, dst)
+                shutil.copystat(src, dst)
+                return "reflinked"
+            except OSError as e:
+                if e.errno in UNSUPPORTED_ERRNOS:
+                    self.try_reflink = False
+        if self.mode == "hardlink":
+            try:
+                os.link(src, dst)
+                return "hardlinked"
+            except OSError:
+                pass
+        shutil.copy2(src, dst)
+        return "copied"
+
+
+def create_dirs(paths: List[str]) -> int:
+    """Create directories sorted parents first, one mkdir each, and count the new ones."""
+    created = 0
+    for path in paths:
+        try:
+            os.mkdir(path)
+            created += 1
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            os.makedirs(path)
+            created += 1
+    return created
+
+
+def materialize_template(
+    tree: TemplateTree, destinations: List[str], mode: str = "auto", jobs: int = 1
+) -> TemplateResult:
+    """
+    Materialize a template into every destination.
+
+    Directories are created in one batch, files are cloned in parallel.
+    Files that already exist in a destination are never overwritten.
+    """
+    result = TemplateResult()
+    result.dirs = create_dirs(
+        sorted(
+            list(destinations)
+            + [os.path.join(dest, rel) for dest in destinations for rel in tree.dirs]
+        )
+    )
+
+    copier = TemplateCopier(mode)
+
+    def materialize(pair: Tuple[str, str]) -> str:
+        dest, rel_path = pair
+        src = os.path.join(tree.root, rel_path)
+        dst = os.path.join(dest, rel_path)
+        if os.path.lexists(dst):
+            return "skipped"
+        if rel_path in symlinks:
+            os.symlink(os.readlink(src), dst)
+            return "copied"
+        return copier.copy(src, dst)
+
+    symlinks = set(tree.symlinks)
+    pairs = [
+        (dest, rel_path)
+        for dest in destinations
+        for rel_path in tree.files + tree.symlinks
+    ]
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        for outcome in executor.map(materialize, pairs):
+            setattr(result, outcome, getattr(result, outcome) + 1)
+    return result
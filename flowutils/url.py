@@ -1,6 +1,10 @@
 """module for url methods"""
 
+import os
+import sys
 import urllib.parse
+from contextlib import nullcontext
+from typing import ContextManager, Iterable, Iterator, Optional, TextIO
 
 import pyperclip
 import rich
@@ -18,6 +22,75 @@ def forklift_link(filepath: str):
     rich.print("The link was copied to clipboard")
 
 
+@app.command()
+def forklift_links(
+    input_file: Optional[str] = typer.Argument(
+        None, help="File with one path per entry, stdin if missing or '-'"
+    ),
+    null: bool = typer.Option(
+        False, "--null", "-0", help="Paths are separated by NUL, as from 'find -print0'"
+    ),
+    expand: bool = typer.Option(
+        False, "--expand", "-e", help="Create links for all files below directories"
+    ),
+    copy: bool = typer.Option(
+        False, "--copy", help="Copy all links to the clipboard at the end"
+    ),
+):
+    """Stream forklift links for many paths, one link per output line."""
+    delimiter = "\0" if null else "\n"
+    copied = []
+    with open_input(input_file) as stream:
+        paths = read_paths(stream, delimiter)
+        if expand:
+            paths = expand_directories(paths)
+        out = sys.stdout
+        for path in paths:
+            link = create_openforklift_uri(path)
+            out.write(link + "\n")
+            if copy:
+                copied.append(link)
+    out.flush()
+    if copy:
+        pyperclip.copy("\n".join(copied))
+        rich.print(f"{len(copied)} links were copied to clipboard", file=sys.stderr)
+
+
+def open_input(input_file: Optional[str]) -> ContextManager[TextIO]:
+    """Open the input file, or stdin which is left open afterwards."""
+    if input_file is None or input_file == "-":
+        return nullcontext(sys.stdin)
+    return open(input_file, "r")
+
+
+def read_paths(stream: TextIO, delimiter: str = "\n") -> Iterator[str]:
+    """Read delimited paths in chunks, yielding each as soon as it is complete."""
+    pending = ""
+    while chunk := stream.read(65536):
+        *paths, pending = (pending + chunk).split(delimiter)
+        yield from (path.rstrip("\r") for path in paths if path)
+    if pending.strip("\r"):
+        yield pending.rstrip("\r")
+
+
+def expand_directories(paths: Iterable[str]) -> Iterator[str]:
+    """Replace every directory by the files below it, other paths are kept."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        pending = [path]
+        while pending:
+            with os.scandir(pending.pop()) as entries:
+                subdirs = []
+                for entry in sorted(entries, key=lambda entry: entry.name):
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    else:
+                        yield entry.path
+                pending.extend(reversed(subdirs))
+
+
 def create_openforklift_uri(filepath: str) -> str:
     """create openforklift uri based on the filepath"""
     return f"openforklift://{escape_url(filepath)}"
@@ -1,10 +1,29 @@
 """module for utils and configs"""
 
+import json
 import os
-from os.path import expanduser
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from os.path import expanduser, join
+from typing import Any, Callable, Iterable, Optional
 
 import yaml
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
+from rich.console import Console
+
+from flowutils.profiling import span, timed
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, saves are then only atomic
+    fcntl = None
+
+# optimistic attempts of update_config before it locks, and their base delay in seconds
+CONFIG_RETRIES = 3
+CONFIG_RETRY_DELAY = 0.01
 
 
 class LinkConfig(BaseModel):
@@ -48,6 +67,18 @@ class SortConfig(BaseModel):
     folder_configs: list[SortFolderConfig] = []
 
 
+INDEXED_FIELDS = {"links", "git_repos", "project_names"}
+
+
+# fields stored in each section file when the config is split
+CONFIG_SECTIONS = {
+    "links": ["links"],
+    "projects": ["project_names", "project_subdirs"],
+    "repos": ["git_repos", "repo_ignore_globs"],
+    "sort": ["sort"],
+}
+
+
 class FlowConfig(BaseModel):
     """Flow config model."""
 
@@ -55,9 +86,124 @@ class FlowConfig(BaseModel):
     project_location: str = "~/Projects"
     project_names: list[str] = []
     project_subdirs: list[str] = []
+    project_template: Optional[str] = None
+    project_archive_location: Optional[str] = None
     links: list[LinkConfig] = []
     git_repos: list[GitRepoConfig] = []
+    repo_ignore_globs: list[str] = []
+    repo_snapshot_location: str = "~/.flowutils/snapshots"
     sort: SortConfig = SortConfig()
+    sections: dict[str, str] = {}
+
+    _links_by_name: dict[str, LinkConfig] = PrivateAttr(default_factory=dict)
+    _repos_by_location: dict[str, GitRepoConfig] = PrivateAttr(default_factory=dict)
+    # one url can be cloned to several locations
+    _repos_by_url: dict[str, list[GitRepoConfig]] = PrivateAttr(default_factory=dict)
+    _project_name_set: set[str] = PrivateAttr(default_factory=set)
+    # split sections whose files were not read, they only hold defaults
+    _unloaded_sections: set[str] = PrivateAttr(default_factory=set)
+    # data as it was loaded, per section file and for the main file
+    _saved_dumps: dict[str, Any] = PrivateAttr(default_factory=dict)
+    # identity of every file read or written, to detect concurrent saves
+    _file_versions: dict[str, tuple] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context):
+        """Report and drop duplicate entries once at load time and build the indexes.
+
+        Later entries win, as they did when links were recreated in order.
+        """
+        links = {link.name: link for link in self.links}
+        repos = {repo.file_location: repo for repo in self.git_repos}
+        warn_duplicates("link", [link.name for link in self.links])
+        warn_duplicates("repo", [repo.file_location for repo in self.git_repos])
+        warn_duplicates("project", self.project_names)
+        self.links = list(links.values())
+        self.git_repos = list(repos.values())
+        self.project_names = list(dict.fromkeys(self.project_names))
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in INDEXED_FIELDS:
+            self._build_indexes()
+
+    def _build_indexes(self):
+        self._links_by_name = {link.name: link for link in self.links}
+        self._repos_by_location = {repo.file_location: repo for repo in self.git_repos}
+        self._repos_by_url = {}
+        for repo in self.git_repos:
+            self._repos_by_url.setdefault(repo.url, []).append(repo)
+        self._project_name_set = set(self.project_names)
+
+    def get_link(self, name: str) -> Optional[LinkConfig]:
+        """Get a link by name."""
+        return self._links_by_name.get(name)
+
+    def add_link(self, link: LinkConfig):
+        """Add a link, replacing the target of an existing link with the same name."""
+        existing = self._links_by_name.get(link.name)
+        if existing is None:
+            self.links.append(link)
+            self._links_by_name[link.name] = link
+        else:
+            existing.target = link.target
+
+    def get_git_repo(self, file_location: str) -> Optional[GitRepoConfig]:
+        """Get a Git repo by the location of its .git directory."""
+        return self._repos_by_location.get(file_location)
+
+    def get_git_repos_by_url(self, url: str) -> list[GitRepoConfig]:
+        """Get all Git repos cloned from a url."""
+        return list(self._repos_by_url.get(url, []))
+
+    def add_git_repo(self, repo: GitRepoConfig) -> bool:
+        """Add a Git repo, or update its url. Returns False if it was already known."""
+        existing = self._repos_by_location.get(repo.file_location)
+        if existing is None:
+            self.git_repos.append(repo)
+            self._repos_by_location[repo.file_location] = repo
+            self._repos_by_url.setdefault(repo.url, []).append(repo)
+            return True
+        if existing.url == repo.url:
+            return False
+        self._repos_by_url[existing.url].remove(existing)
+        if not self._repos_by_url[existing.url]:
+            del self._repos_by_url[existing.url]
+        existing.url = repo.url
+        self._repos_by_url.setdefault(repo.url, []).append(existing)
+        return True
+
+    def has_project(self, name: str) -> bool:
+        """Check if a project name is in the config."""
+        return name in self._project_name_set
+
+    def add_project(self, name: str) -> bool:
+        """Add a project name. Returns False if it was already known."""
+        if name in self._project_name_set:
+            return False
+        self.project_names.append(name)
+        self._project_name_set.add(name)
+        return True
+
+    def remove_project(self, name: str) -> bool:
+        """Remove a project name. Returns False if it was not known."""
+        if name not in self._project_name_set:
+            return False
+        self.project_names.remove(name)
+        self._project_name_set.discard(name)
+        return True
+
+    def is_section_loaded(self, section: str) -> bool:
+        """Check if a section is in memory, always true for a single-file config."""
+        return section not in self._unloaded_sections
+
+    def split_dump(self) -> dict[str, Any]:
+        """Dump the config split into the main file data and the section file data."""
+        dump = {"": self.model_dump()}
+        for section in self.sections:
+            dump[section] = {
+                name: dump[""].pop(name) for name in CONFIG_SECTIONS[section]
+            }
+        return dump
 
     def get_project_location(self) -> str:
         return expanduser(self.project_location)
@@ -65,6 +211,51 @@ class FlowConfig(BaseModel):
     def get_link_location(self) -> str:
         return expanduser(self.link_location)
 
+    def get_project_archive_location(self) -> str:
+        """Get the archive folder, '.archive' in the project location by default."""
+        if self.project_archive_location is None:
+            return join(self.get_project_location(), ".archive")
+        return expanduser(self.project_archive_location)
+
+    def get_repo_snapshot_location(self) -> str:
+        return expanduser(self.repo_snapshot_location)
+
+
+def warn_duplicates(kind: str, keys: list[str]):
+    """Print the keys that appear more than once, on stderr to keep outputs clean."""
+    counts = Counter(keys)
+    console = Console(stderr=True)
+    for key, count in counts.items():
+        if count > 1:
+            console.print(
+                f"[yellow]Duplicate {kind} '{key}' in the config, the last entry is used."
+            )
+
+
+def default_jobs() -> int:
+    """Get the default number of parallel workers."""
+    return os.cpu_count() or 1
+
+
+def format_size(size: int) -> str:
+    """Format a size in bytes like '512 B' or '1.5 MB'."""
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def format_age(timestamp: Optional[int], now: Optional[float] = None) -> str:
+    """Format the age of a unix timestamp like '3d' or '5h'."""
+    if timestamp is None:
+        return "-"
+    seconds = max(0, (now or time.time()) - timestamp)
+    for unit, unit_seconds in (("y", 31536000), ("d", 86400), ("h", 3600)):
+        if seconds >= unit_seconds:
+            return f"{int(seconds // unit_seconds)}{unit}"
+    return f"{int(seconds // 60)}m"
+
 
 def get_config_path():
     """Get the path to the config file. If the FLOW_CONFIG environment variable is set, use that."""
@@ -72,17 +263,193 @@ def get_config_path():
     return os.path.expanduser(flow_config)
 
 
-def load_config() -> FlowConfig:
-    """Load the config file."""
+def get_section_path(config: FlowConfig, section: str) -> str:
+    """Get the path of a section file, relative paths are next to the config file."""
+    section_path = os.path.expanduser(config.sections[section])
+    return join(os.path.dirname(get_config_path()), section_path)
+
+
+def _file_version(stat: os.stat_result) -> tuple:
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _read_yaml(path: str, versions: dict) -> dict:
+    with open(path, "r") as f:
+        # stat the open file, so the version always matches the content read
+        versions[path] = _file_version(os.fstat(f.fileno()))
+        return yaml.safe_load(f) or {}
+
+
+def _fsync_dir(path: str):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_yaml(path: str, data: dict, versions: dict):
+    """Write a file atomically: a synced temporary file renamed over the old one."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            yaml.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_dir(os.path.dirname(path) or ".")
+    versions[path] = _file_version(os.stat(path))
+
+
+@timed("load_config")
+def load_config(sections: Optional[Iterable[str]] = None) -> FlowConfig:
+    """
+    Load the config file.
+
+    If the config is split into section files, only the given sections are
+    read and validated, all of them by default. Sections that are not loaded
+    keep their defaults in memory and are never written back.
+    """
     config_path = get_config_path()
-    with open(config_path, "r") as f:
-        dict_conf = yaml.safe_load(f)
-    return FlowConfig(**dict_conf)
+    versions = {}
+    dict_conf = _read_yaml(config_path, versions)
+    section_files = dict_conf.get("sections") or {}
+    wanted = set(section_files if sections is None else sections) & set(section_files)
+    for section in wanted:
+        section_path = join(
+            os.path.dirname(config_path), os.path.expanduser(section_files[section])
+        )
+        section_conf = _read_yaml(section_path, versions)
+        for name in CONFIG_SECTIONS[section]:
+            if name in section_conf:
+                dict_conf[name] = section_conf[name]
+
+    config = FlowConfig(**dict_conf)
+    config._unloaded_sections = set(section_files) - wanted
+    dump = config.split_dump()
+    config._saved_dumps = {key: dump[key] for key in ["", *wanted]}
+    config._file_versions = versions
+    return config
+
+
+@contextmanager
+def config_lock():
+    """Hold an exclusive advisory lock on the config, released when the block exits."""
+    lock_path = f"{get_config_path()}.lock"
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        yield
+
+
+def is_config_changed(config: FlowConfig) -> bool:
+    """Check if any file the config was loaded from was written since."""
+    for path, version in config._file_versions.items():
+        try:
+            if _file_version(os.stat(path)) != version:
+                return True
+        except FileNotFoundError:
+            return True
+    return False
 
 
+def update_config(
+    mutate: Callable[[FlowConfig], Any],
+    sections: Optional[Iterable[str]] = None,
+    retries: int = CONFIG_RETRIES,
+) -> Any:
+    """
+    Load the config, apply a change and save it, without losing concurrent updates.
+
+    The change first runs without holding the lock. The config is saved under
+    the lock only if none of the files it was loaded from changed meanwhile.
+    Otherwise it is loaded again and the change is repeated. After the given
+    number of retries, the last attempt holds the lock throughout, so busy
+    writers cannot starve it. The change should do nothing but modify the
+    config, because it may run more than once. Returns the result of the change.
+    """
+    for attempt in range(retries):
+        config = load_config(sections)
+        result = mutate(config)
+        with config_lock(), span("save_config"):
+            if not is_config_changed(config):
+                _save_config(config)
+                return result
+        time.sleep(random.uniform(0, CONFIG_RETRY_DELAY * (attempt + 1)))
+
+    with config_lock():
+        config = load_config(sections)
+        result = mutate(config)
+        with span("save_config"):
+            _save_config(config)
+    return result
+
+
+def get_cache_path(name: str) -> str:
+    """Get the path of a named cache file, kept next to the config file."""
+    return os.path.join(os.path.dirname(get_config_path()), "cache", f"{name}.json")
+
+
+def load_cache(name: str) -> dict:
+    """Load a named cache, empty if it does not exist or is unreadable."""
+    try:
+        with open(get_cache_path(name), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(name: str, data: dict):
+    """Save a named cache, replacing the previous file atomically."""
+    cache_path = get_cache_path(name)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, cache_path)
+
+
+@timed("save_config")
 def save_config(config: FlowConfig):
-    """Save the config file."""
+    """
+    Save the config file.
+
+    Only files whose data changed since loading are written. Section files
+    of sections that were not loaded are left untouched. Every file is
+    replaced atomically while holding the config lock. Use update_config to
+    not overwrite changes saved by another process since loading.
+    """
+    with config_lock():
+        _save_config(config)
+
+
+def _save_config(config: FlowConfig):
     config_path = get_config_path()
     os.makedirs(os.path.dirname(config_path), exist_ok=True)
-    with open(config_path, "w") as f:
-        yaml.dump(config.model_dump(), f)
+    changed = False
+    for key, data in config.split_dump().items():
+        if key and not config.is_section_loaded(key):
+            continue
+        if config._saved_dumps.get(key) == data:
+            continue
+        path = get_section_path(config, key) if key else config_path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_yaml(path, data, config._file_versions)
+        config._saved_dumps[key] = data
+        changed = True
+
+    if changed:
+        # imported here, the shell module depends on this one
+        from flowutils.shell import refresh_exports
+
+        refresh_exports(config)
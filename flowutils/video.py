@@ -6,6 +6,7 @@ import typer
 import yaml
 
 from flowutils.audio import is_ffmpeg_installed
+from flowutils.profiling import span
 import subprocess
 
 
@@ -31,8 +32,9 @@ def convert_avchd_to_mp4(
     codec="libx264",
     crf=23,
     audio_bitrate="128k",
+    overwrite=False,
 ):
-    """Convert avchd file to mp4 files"""
+    """Convert avchd file to mp4 files, replacing existing ones with overwrite"""
     os.makedirs(output_folder, exist_ok=True)
     stream_dir = os.path.join(container_file_path, "BDMV", "STREAM")
 
@@ -52,6 +54,8 @@ def convert_avchd_to_mp4(
             # Construct the FFmpeg command
             command = [
                 "ffmpeg",
+                "-nostdin",
+                *(["-y"] if overwrite else []),
                 "-i",
                 input_path,
                 "-c:v",
@@ -67,7 +71,8 @@ def convert_avchd_to_mp4(
 
             try:
                 rich.print(f"[green]Starting with {idx}/{len(filenames)}[/green]")
-                subprocess.run(command, check=True)
+                with span("tool.ffmpeg"):
+                    subprocess.run(command, check=True)
                 rich.print(f"Successfully converted {filename}")
             except subprocess.CalledProcessError as e:
                 rich.print(f"Error converting {filename}: {e}")
@@ -95,6 +100,7 @@ def convert_video_to_mp3(video_file_path: str, output_file: str, audio_bitrate="
     # Construct the FFmpeg command
     command = [
         "ffmpeg",
+        "-nostdin",
         "-i",
         video_file_path,
         "-q:a",
@@ -108,7 +114,8 @@ def convert_video_to_mp3(video_file_path: str, output_file: str, audio_bitrate="
 
     try:
         rich.print(f"[green]Extracting audio from {video_file_path}[/green]")
-        subprocess.run(command, check=True)
+        with span("tool.ffmpeg"):
+            subprocess.run(command, check=True)
         rich.print(f"Successfully extracted audio to {output_file}")
     except subprocess.CalledProcessError as e:
         rich.print(f"Error extracting audio from {video_file_path}: {e}")
@@ -209,6 +216,7 @@ def cut_video_into_scenes(
 
         command = [
             "ffmpeg",
+            "-nostdin",
             "-i",
             input_video_path,
             "-ss",
@@ -226,9 +234,10 @@ def cut_video_into_scenes(
                 f"[green]Processing scene {idx + 1}/{total_scenes}: '{scene_name}' (from {formatted_start_time} to {formatted_end_time}) -> {output_path}[/green]"
             )
             # Using capture_output=True to get stderr/stdout in case of an error for better reporting
-            process = subprocess.run(
-                command, capture_output=True, text=True, encoding="utf-8"
-            )
+            with span("tool.ffmpeg"):
+                process = subprocess.run(
+                    command, capture_output=True, text=True, encoding="utf-8"
+                )
 
             if process.returncode == 0:
                 rich.print(f"Successfully extracted '{scene_name}' to '{output_path}'")
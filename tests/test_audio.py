@@ -1,8 +1,20 @@
+import json
+import os
 from os.path import isfile
 
+import numpy as np
 from pydub import AudioSegment
+from pydub.generators import Sine
 from typer.testing import CliRunner
-from flowutils.audio import is_ffmpeg_installed, app
+from flowutils.audio import (
+    is_ffmpeg_installed,
+    app,
+    build_m4a_command,
+    compute_split_points,
+    find_silence_runs,
+    frame_dbfs,
+    parse_ffprobe_output,
+)
 
 runner = CliRunner()
 
@@ -37,3 +49,136 @@ def test_info_audio():
 
         assert result.exit_code == 0
         assert "5" in result.output
+
+
+def test_to_m4a_folder_skips_up_to_date():
+    assert is_ffmpeg_installed()
+    with runner.isolated_filesystem():
+        os.makedirs("library/album")
+        silence = AudioSegment.silent(duration=2000)
+        silence.export("library/one.mp3", format="mp3", tags={"artist": "flow"})
+        silence.export("library/album/two.mp3", format="mp3")
+
+        result = runner.invoke(app, ["toipod", "library", "converted", "-j", "2"])
+
+        assert result.exit_code == 0
+        assert isfile("converted/one.m4a")
+        assert isfile("converted/album/two.m4a")
+        assert "2 converted" in result.output
+
+        result = runner.invoke(app, ["toipod", "library", "converted"])
+
+        assert result.exit_code == 0
+        assert "0 converted, 2 up to date" in result.output
+
+
+def test_info_audio_folder():
+    assert is_ffmpeg_installed()
+    with runner.isolated_filesystem():
+        os.makedirs("library/album")
+        silence = AudioSegment.silent(duration=2000)
+        silence.export("library/one.mp3", format="mp3")
+        silence.export("library/album/two.mp3", format="mp3")
+
+        result = runner.invoke(app, ["info", "library", "--json"])
+
+        assert result.exit_code == 0
+        infos = json.loads(result.output)
+        assert len(infos) == 2
+        assert all(info["codec"] == "mp3" for info in infos)
+        assert all(round(info["duration"]) == 2 for info in infos)
+
+
+def test_parse_ffprobe_output():
+    output = json.dumps(
+        {
+            "streams": [
+                {
+                    "codec_name": "aac",
+                    "sample_rate": "44100",
+                    "channels": 2,
+                    "bit_rate": "128000",
+                }
+            ],
+            "format": {"duration": "3600.5", "bit_rate": "130000"},
+        }
+    )
+
+    audio_info = parse_ffprobe_output("book.m4a", output)
+
+    assert audio_info.duration == 3600.5
+    assert audio_info.codec == "aac"
+    assert audio_info.bit_rate == 128000
+    assert audio_info.sample_rate == 44100
+    assert audio_info.channels == 2
+
+
+def test_build_m4a_command_encodes_mp3():
+    command = build_m4a_command("in.mp3", "out.m4a", "mp3")
+
+    assert command[command.index("-c:a") + 1] == "aac"
+    assert command[command.index("-f") + 1] == "ipod"
+    assert "-nostdin" in command
+    assert command[-1] == "out.m4a"
+
+
+def test_build_m4a_command_copies_aac():
+    command = build_m4a_command("in.m4a", "out.m4a", "aac")
+
+    assert command[command.index("-c:a") + 1] == "copy"
+
+
+def test_frame_dbfs():
+    samples = np.concatenate(
+        [np.zeros(160, dtype=np.int16), np.full(160, 16384, dtype=np.int16)]
+    )
+
+    dbfs = frame_dbfs(samples, 160)
+
+    assert len(dbfs) == 2
+    assert dbfs[0] < -150
+    assert round(float(dbfs[1])) == -6
+
+
+def test_frame_dbfs_keeps_trailing_partial_frame():
+    samples = np.concatenate(
+        [np.full(160, 16384, dtype=np.int16), np.zeros(50, dtype=np.int16)]
+    )
+
+    dbfs = frame_dbfs(samples, 160)
+
+    assert len(dbfs) == 2
+    assert dbfs[1] < -150
+
+
+def test_split_rejects_zero_frame_length():
+    result = runner.invoke(app, ["split", "in.mp3", "out", "--frame-ms", "0"])
+
+    assert result.exit_code == 1
+    assert "greater than 0" in result.output
+
+
+def test_find_silence_runs_and_split_points():
+    dbfs = np.array([-60, -10, -60, -60, -60, -10, -60, -10, -60, -60], dtype=float)
+
+    silences = find_silence_runs(dbfs, threshold=-40, min_frames=2)
+
+    assert silences == [(2, 5), (8, 10)]
+    assert compute_split_points(silences, len(dbfs), frame_ms=100) == [0.35]
+
+
+def test_split_audio():
+    assert is_ffmpeg_installed()
+    with runner.isolated_filesystem():
+        tone = Sine(440).to_audio_segment(duration=2000).apply_gain(-6)
+        silence = AudioSegment.silent(duration=1500)
+        (tone + silence + tone + silence + tone).export("talk.mp3", format="mp3")
+
+        result = runner.invoke(app, ["split", "talk.mp3", "segments"])
+
+        assert result.exit_code == 0
+        assert sorted(os.listdir("segments")) == [
+            "talk_001.mp3",
+            "talk_002.mp3",
+            "talk_003.mp3",
+        ]
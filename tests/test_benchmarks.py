@@ -0,0 +1,24 @@
+from typer.testing import CliRunner
+
+from benchmarks.run import app, find_regressions
+
+runner = CliRunner()
+
+
+def test_find_regressions():
+    baseline = {"results": {"fast": {"median": 1.0}, "slow": {"median": 1.0}}}
+    current = {"results": {"fast": {"median": 1.1}, "slow": {"median": 1.3}, "new": {}}}
+
+    assert find_regressions(current, baseline, threshold=0.2) == ["slow"]
+
+
+def test_benchmarks_run_and_gate_on_baseline(tmp_path):
+    args = ["sort_folder", "config_roundtrip", "--scale", "0.01", "--repeat", "1"]
+    baseline = str(tmp_path / "baseline.json")
+
+    result = runner.invoke(app, args + ["--baseline", baseline, "--save-baseline"])
+    assert result.exit_code == 0
+
+    result = runner.invoke(app, args + ["--baseline", baseline, "--threshold", "-1"])
+    assert result.exit_code == 1
+    assert "Slower than the baseline" in result.output
@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+from typer.testing import CliRunner
+
+from flowutils import links
+from flowutils.config import app
+from flowutils.utils import (
+    FlowConfig,
+    GitRepoConfig,
+    LinkConfig,
+    is_config_changed,
+    load_config,
+    save_config,
+    update_config,
+)
+
+runner = CliRunner()
+
+
+def test_split_config_loads_only_used_sections(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        flow_conf.git_repos = [GitRepoConfig(url="u", file_location="Projects/a/.git")]
+        save_config(flow_conf)
+
+        result = runner.invoke(app, ["split"])
+
+        assert result.exit_code == 0
+        with open(".flowutils/config.yaml") as f:
+            main_conf = yaml.safe_load(f)
+        assert "links" not in main_conf and "git_repos" not in main_conf
+        full_config = load_config()
+        assert full_config.links == flow_conf.links
+        assert full_config.git_repos == flow_conf.git_repos
+
+        # an invalid repos section is never read by link commands
+        with open(".flowutils/repos.yaml", "w") as f:
+            f.write("git_repos: invalid\n")
+        main_mtime = os.stat(".flowutils/config.yaml").st_mtime_ns
+
+        result = runner.invoke(links.app, ["add", "Projects/project2", "project2"])
+
+        assert result.exit_code == 0
+        assert os.stat(".flowutils/config.yaml").st_mtime_ns == main_mtime
+        with open(".flowutils/repos.yaml") as f:
+            assert f.read() == "git_repos: invalid\n"
+        assert [link.name for link in load_config(["links"]).links] == [
+            "project1",
+            "project2",
+        ]
+
+
+def add_projects(worker: int, count: int = 20):
+    def add_project(name: str):
+        update_config(lambda config: config.add_project(name), ["projects"])
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(add_project, [f"w{worker}-{idx}" for idx in range(count)]))
+
+
+def test_duplicates_are_reported_and_dropped(capsys):
+    config = FlowConfig(
+        links=[
+            LinkConfig(name="docs", target="/old"),
+            LinkConfig(name="docs", target="/new"),
+        ],
+        git_repos=[
+            GitRepoConfig(url="u", file_location="a/.git"),
+            GitRepoConfig(url="u", file_location="b/.git"),
+        ],
+    )
+
+    assert [link.target for link in config.links] == ["/new"]
+    assert "Duplicate link 'docs'" in capsys.readouterr().err
+
+
+def test_repos_are_indexed_by_url():
+    config = FlowConfig(git_repos=[GitRepoConfig(url="u", file_location="a/.git")])
+    config.add_git_repo(GitRepoConfig(url="u", file_location="b/.git"))
+    config.add_git_repo(GitRepoConfig(url="v", file_location="a/.git"))
+
+    assert [r.file_location for r in config.get_git_repos_by_url("u")] == ["b/.git"]
+    assert [r.file_location for r in config.get_git_repos_by_url("v")] == ["a/.git"]
+
+
+def test_parallel_writers_do_not_lose_updates(tmp_path, monkeypatch):
+    monkeypatch.setenv("FLOW_CONFIG", str(tmp_path / "config.yaml"))
+    save_config(FlowConfig(project_names=["existing"]))
+    stale_config = load_config()
+
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=add_projects, args=(w,)) for w in range(6)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert all(process.exitcode == 0 for process in processes)
+    project_names = load_config().project_names
+    assert len(project_names) == len(set(project_names)) == 6 * 20 + 1
+    assert is_config_changed(stale_config)
+    assert sorted(os.listdir(tmp_path)) == ["config.yaml", "config.yaml.lock"]
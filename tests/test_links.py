@@ -1,9 +1,11 @@
 import os
+import subprocess
+from unittest.mock import patch
 
 from typer.testing import CliRunner
 
 from flowutils.links import app
-from flowutils.utils import save_config, FlowConfig, load_config
+from flowutils.utils import save_config, FlowConfig, LinkConfig, load_config
 
 runner = CliRunner()
 
@@ -41,3 +43,69 @@ def test_list_links(flow_conf: FlowConfig):
         assert "project1" in result.output
         assert "Links:" in result.output
         assert "->" in result.output
+
+
+def test_add_existing_link_updates_target(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        save_config(flow_conf)
+
+        result = runner.invoke(app, ["add", "/path/to/other", "project1"])
+
+        assert result.exit_code == 0
+        assert "updated" in result.output
+        new_flow_conf = load_config()
+        assert len(new_flow_conf.links) == len(flow_conf.links)
+        assert new_flow_conf.get_link("project1").target == "/path/to/other"
+
+
+def test_create_reconciles_links(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        flow_conf.links.append(LinkConfig(target="./Projects/project2", name="p2"))
+        save_config(flow_conf)
+        os.makedirs("Links")
+        os.symlink("./missing/target", "Links/project1")
+        os.symlink("./Projects/project3", "Links/unmanaged")
+
+        result = runner.invoke(app, ["create", "--prune", "--dry"])
+
+        assert result.exit_code == 0
+        assert "Would retarget project1" in result.output
+        assert os.readlink("Links/project1") == "./missing/target"
+
+        result = runner.invoke(app, ["create", "--prune"])
+
+        assert result.exit_code == 0
+        assert os.readlink("Links/project1") == "./Projects/project1/subdir1"
+        assert os.readlink("Links/p2") == "./Projects/project2"
+        assert not os.path.lexists("Links/unmanaged")
+
+        with patch("flowutils.links.apply_link_change") as apply_change:
+            result = runner.invoke(app, ["create"])
+            assert apply_change.call_count == 0
+        assert "up to date" in result.output
+
+
+def test_export_bash_is_regenerated_on_save(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        save_config(flow_conf)
+        os.makedirs("Projects/project2/subdir2")
+        os.makedirs("Other")
+
+        result = runner.invoke(app, ["export", "--shell", "bash"])
+
+        assert result.exit_code == 0
+        export_path = ".flowutils/shell/flow.bash"
+        jump = subprocess.run(
+            ["bash", "-c", f"source {export_path} && fj project2/subdir2 && pwd"],
+            capture_output=True,
+            text=True,
+        )
+        assert jump.stdout.strip() == os.path.abspath("Projects/project2/subdir2")
+
+        assert runner.invoke(app, ["add", "Other", "other"]).exit_code == 0
+        jump = subprocess.run(
+            ["bash", "-c", f"source {export_path} && fj other && pwd"],
+            capture_output=True,
+            text=True,
+        )
+        assert jump.stdout.strip() == os.path.abspath("Other")
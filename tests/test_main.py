@@ -2,7 +2,8 @@ import os
 
 from typer.testing import CliRunner
 from flowutils.main import app
-from flowutils.utils import load_config
+from flowutils import profiling
+from flowutils.utils import load_config, save_config
 
 runner = CliRunner()
 
@@ -31,3 +32,17 @@ def test_init(configure_env, config_path: str):
         assert config.project_location == "./CustomProjects"
         assert isinstance(config.project_names, list)
         assert len(config.project_names) == 1
+
+
+def test_profile_option(flow_conf):
+    with runner.isolated_filesystem():
+        save_config(flow_conf)
+
+        result = runner.invoke(
+            app, ["--profile", "--profile-file", "flow.prof", "projects", "list"]
+        )
+
+        assert result.exit_code == 0
+        assert "load_config" in result.output
+        assert os.path.getsize("flow.prof") > 0
+        assert not profiling.is_enabled()
@@ -0,0 +1,225 @@
+import os
+import subprocess
+from unittest.mock import patch
+
+from PIL import Image
+from typer.testing import CliRunner
+
+from flowutils.pdf import (
+    app,
+    compress_pdfs,
+    compress_pdf_file,
+    split_page_ranges,
+    get_prescan_skip_reason,
+    CompressionOptions,
+)
+from flowutils.pdfscan import PdfImage, PdfInspection
+
+runner = CliRunner()
+
+
+def fake_ghostscript(command, **kwargs):
+    """Write half of the input file to the output file like a fake ghostscript."""
+    input_path = command[-1]
+    output_path = command[-2].removeprefix("-sOutputFile=")
+    if "broken" in input_path:
+        return subprocess.CompletedProcess(command, 1, "", "Unrecoverable error")
+    with open(input_path, "rb") as source, open(output_path, "wb") as target:
+        content = source.read()
+        target.write(content[: len(content) // 2])
+    return subprocess.CompletedProcess(command, 0, "", "")
+
+
+def create_pdf(path: str, size: int = 1000):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n" + b"0" * size)
+
+
+@patch("flowutils.pdf.subprocess.run", side_effect=fake_ghostscript)
+def test_compress_pdfs_mirrors_output_dir(mock_run):
+    with runner.isolated_filesystem():
+        create_pdf("scans/a.pdf")
+        create_pdf("scans/2024/b.pdf")
+
+        options = CompressionOptions(jobs=8)
+        results = compress_pdfs("scans", output_dir="small", options=options, jobs=2)
+
+        assert [result.error for result in results] == [None, None]
+        assert options.jobs == 8
+        assert os.path.isfile("small/a.pdf")
+        assert os.path.isfile("small/2024/b.pdf")
+        assert all(result.size_after < result.size_before for result in results)
+
+
+@patch("flowutils.pdf.subprocess.run", side_effect=fake_ghostscript)
+def test_compress_command_collects_failures(mock_run):
+    with runner.isolated_filesystem():
+        create_pdf("scans/good.pdf")
+        create_pdf("scans/broken.pdf")
+
+        result = runner.invoke(app, ["compress", "scans/*.pdf", "--in-place"])
+
+        assert result.exit_code == 1
+        assert "1 compressed, 0 kept, 1 failed" in result.output
+        assert result.output.rstrip().endswith("Unrecoverable error")
+        assert os.path.getsize("scans/good.pdf") < 1000
+        assert sorted(os.listdir("scans")) == ["broken.pdf", "good.pdf"]
+
+
+@patch("flowutils.pdf.subprocess.run", side_effect=fake_ghostscript)
+def test_compress_adaptive_keeps_smallest(mock_run):
+    with runner.isolated_filesystem():
+        create_pdf("scan.pdf")
+
+        result = compress_pdf_file(
+            "scan.pdf", "small.pdf", CompressionOptions(adaptive=True, min_dpi=200)
+        )
+
+        assert not result.kept_original
+        assert result.size_after < result.size_before
+        assert os.path.isfile("small.pdf")
+        dpis = {int(call.args[0][-3].split("=")[1]) for call in mock_run.call_args_list}
+        assert dpis == {200, 300}
+
+
+@patch("flowutils.pdf.subprocess.run", side_effect=fake_ghostscript)
+def test_compress_adaptive_keeps_original(mock_run):
+    with runner.isolated_filesystem():
+        create_pdf("scan.pdf")
+
+        result = compress_pdf_file(
+            "scan.pdf", "scan.pdf", CompressionOptions(adaptive=True, threshold=0.6)
+        )
+
+        assert result.kept_original
+        assert os.path.getsize("scan.pdf") == result.size_before
+        assert os.listdir(".") == ["scan.pdf"]
+
+
+@patch("flowutils.pdf.subprocess.run", side_effect=fake_ghostscript)
+def test_compress_single_file_in_place_and_output_dir(mock_run):
+    with runner.isolated_filesystem():
+        create_pdf("a.pdf")
+        create_pdf("b.pdf")
+
+        result = runner.invoke(app, ["compress", "a.pdf", "--in-place"])
+
+        assert result.exit_code == 0, result.output
+        assert os.path.getsize("a.pdf") < 1009
+        assert not os.path.exists("a_compressed.pdf")
+
+        result = runner.invoke(app, ["compress", "b.pdf", "--output-dir", "small"])
+
+        assert result.exit_code == 0, result.output
+        assert os.path.isfile("small/b.pdf")
+
+
+def fake_paged_ghostscript(command, **kwargs):
+    """Fake ghostscript on files with one 'page N' line per page."""
+    if "-dNODISPLAY" in command:
+        file_path = next(arg for arg in command if arg.startswith("-sFile="))[7:]
+        with open(file_path) as f:
+            return subprocess.CompletedProcess(command, 0, f"{len(f.readlines())}\n")
+    output_path = next(arg for arg in command if arg.startswith("-sOutputFile="))[13:]
+    input_paths = command[command.index(f"-sOutputFile={output_path}") + 1 :]
+    lines = []
+    for input_path in input_paths:
+        with open(input_path) as f:
+            lines += f.readlines()
+    page_options = {
+        arg.split("=")[0]: int(arg.split("=")[1])
+        for arg in command
+        if arg.startswith(("-dFirstPage=", "-dLastPage="))
+    }
+    if page_options:
+        lines = lines[page_options["-dFirstPage"] - 1 : page_options["-dLastPage"]]
+    with open(output_path, "w") as f:
+        f.writelines(lines)
+    return subprocess.CompletedProcess(command, 0, "", "")
+
+
+def test_split_page_ranges():
+    assert split_page_ranges(10, 3) == [(1, 4), (5, 7), (8, 10)]
+    assert split_page_ranges(2, 4) == [(1, 1), (2, 2)]
+
+
+@patch("flowutils.pdf.subprocess.run", side_effect=fake_paged_ghostscript)
+def test_compress_split_pages_keeps_page_order(mock_run):
+    with runner.isolated_filesystem():
+        with open("book.pdf", "w") as f:
+            f.writelines(f"page {page}\n" for page in range(1, 11))
+
+        result = compress_pdf_file(
+            "book.pdf", "small.pdf", CompressionOptions(split_pages=True, jobs=3)
+        )
+
+        assert result.error is None
+        with open("small.pdf") as f:
+            assert f.read().split() == open("book.pdf").read().split()
+        arguments = [arg for call in mock_run.call_args_list for arg in call.args[0]]
+        assert "-dFirstPage=8" in arguments
+        assert "-dSAFER" in arguments and "-dNOSAFER" not in arguments
+        assert sorted(os.listdir(".")) == ["book.pdf", "small.pdf"]
+
+
+@patch("flowutils.pdf.subprocess.run", side_effect=fake_paged_ghostscript)
+def test_compress_split_pages_reports_empty_files(mock_run):
+    with runner.isolated_filesystem():
+        open("empty.pdf", "w").close()
+
+        result = compress_pdf_file(
+            "empty.pdf", "small.pdf", CompressionOptions(split_pages=True, jobs=3)
+        )
+
+        assert result.error == "PDF file has no pages"
+
+
+def test_compress_split_pages_reports_merged_count_errors():
+    def fail_on_merged_file(command, **kwargs):
+        if "-dNODISPLAY" in command and "-sFile=book.pdf" not in command:
+            raise subprocess.CalledProcessError(1, command)
+        return fake_paged_ghostscript(command, **kwargs)
+
+    with runner.isolated_filesystem():
+        with patch("flowutils.pdf.subprocess.run", side_effect=fail_on_merged_file):
+            with open("book.pdf", "w") as f:
+                f.writelines(f"page {page}\n" for page in range(1, 5))
+
+            result = compress_pdf_file(
+                "book.pdf", "small.pdf", CompressionOptions(split_pages=True, jobs=2)
+            )
+
+            assert result.error.startswith("Could not count pages of the merged file")
+            assert sorted(os.listdir(".")) == ["book.pdf"]
+
+
+def create_scanned_pdf(path: str, dpi: int):
+    page = Image.new("L", (int(8.27 * dpi), int(11.69 * dpi)), "white")
+    page.save(path, resolution=dpi)
+
+
+@patch("flowutils.pdf.subprocess.run", side_effect=fake_ghostscript)
+def test_compress_prescan_skips_low_dpi_files(mock_run):
+    with runner.isolated_filesystem():
+        os.makedirs("scans")
+        create_scanned_pdf("scans/low.pdf", 100)
+        create_scanned_pdf("scans/high.pdf", 300)
+
+        results = compress_pdfs(
+            "scans", in_place=True, options=CompressionOptions(dpi=150, prescan=True)
+        )
+
+        assert [result.outcome for result in results] == [
+            "/screen @ 150 dpi",
+            "skipped: images at 100 dpi",
+        ]
+        compressed_inputs = [call.args[0][-1] for call in mock_run.call_args_list]
+        assert compressed_inputs == ["scans/high.pdf"]
+
+
+def test_prescan_does_not_skip_placed_photos():
+    # a 1200x800 photo placed 4 inches wide is 300 dpi, not 141 as a full page
+    inspection = PdfInspection(1, 612, 792, [PdfImage(width=1200, height=800)])
+
+    assert get_prescan_skip_reason(inspection, CompressionOptions(dpi=150)) is None
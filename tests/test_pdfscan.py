@@ -0,0 +1,116 @@
+import zlib
+
+import pytest
+from PIL import Image
+
+from flowutils.pdfscan import PdfImage, PdfInspection, PdfScanError, inspect_pdf
+
+
+def png_up_rows(rows: list[bytes]) -> bytes:
+    """Encode rows with the PNG 'up' predictor as used by xref streams."""
+    encoded = b""
+    previous = bytes(len(rows[0]))
+    for row in rows:
+        encoded += b"\x02" + bytes((a - b) & 0xFF for a, b in zip(row, previous))
+        previous = row
+    return encoded
+
+
+def write_compressed_pdf(path: str):
+    """Write a PDF with an object stream and an xref stream like modern writers."""
+    objects_in_stream = [
+        (1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, b"<< /Type /Pages /Kids [3 0 R] /Count 1 /MediaBox [0 0 612 792] >>"),
+        (3, b"<< /Type /Page /Parent 2 0 R /Resources << /XObject 7 0 R >> >>"),
+        (7, b"<< /Im0 4 0 R >>"),
+    ]
+    header = b""
+    body = b""
+    for num, content in objects_in_stream:
+        header += b"%d %d " % (num, len(body))
+        body += content + b"\n"
+    object_stream = zlib.compress(header + body)
+
+    pdf = b"%PDF-1.5\n"
+    offsets = {}
+    offsets[4] = len(pdf)
+    pdf += (
+        b"4 0 obj\n<< /Type /XObject /Subtype /Image /Width 1275 /Height 1650"
+        b" /ColorSpace /DeviceGray /BitsPerComponent 8 /Filter [/FlateDecode]"
+        b" /Length 3 >>\nstream\nxyz\nendstream\nendobj\n"
+    )
+    offsets[5] = len(pdf)
+    pdf += (
+        b"5 0 obj\n<< /Type /ObjStm /N 4 /First %d /Filter /FlateDecode"
+        b" /Length %d >>\nstream\n" % (len(header), len(object_stream))
+    )
+    pdf += object_stream + b"\nendstream\nendobj\n"
+
+    xref_offset = len(pdf)
+    rows = [bytes([0, 0, 0, 255, 255])]
+    rows += [bytes([2, 0, 0, 5, idx]) for idx in range(3)]
+    for offset in (offsets[4], offsets[5], xref_offset):
+        rows.append(bytes([1]) + offset.to_bytes(3, "big") + bytes([0]))
+    rows.append(bytes([2, 0, 0, 5, 3]))
+    xref_stream = zlib.compress(png_up_rows(rows))
+    pdf += (
+        b"6 0 obj\n<< /Type /XRef /Size 8 /W [1 3 1] /Root 1 0 R /Filter /FlateDecode"
+        b" /DecodeParms << /Columns 5 /Predictor 12 >> /Length %d >>\nstream\n"
+        % len(xref_stream)
+    )
+    pdf += xref_stream + b"\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n" % xref_offset
+    with open(path, "wb") as f:
+        f.write(pdf)
+
+
+def test_inspect_scanned_pdf(tmp_path):
+    path = str(tmp_path / "scan.pdf")
+    pages = [Image.new("L", (1240, 1754), "white") for _ in range(3)]
+    pages[0].save(path, save_all=True, append_images=pages[1:], resolution=150)
+
+    inspection = inspect_pdf(path)
+
+    assert inspection.page_count == 3
+    assert inspection.image_count == 3
+    assert inspection.images[0].filters == ["DCTDecode"]
+    assert round(inspection.effective_dpi()) == 150
+
+
+def test_inspect_pdf_with_xref_and_object_streams(tmp_path):
+    path = str(tmp_path / "compressed.pdf")
+    write_compressed_pdf(path)
+
+    inspection = inspect_pdf(path)
+
+    assert inspection.page_count == 1
+    assert (inspection.page_width, inspection.page_height) == (612, 792)
+    assert inspection.images[0].width == 1275
+    assert inspection.images[0].color_space == "DeviceGray"
+    assert round(inspection.effective_dpi()) == 150
+
+
+def test_inspect_broken_pdf(tmp_path):
+    path = tmp_path / "broken.pdf"
+    path.write_bytes(b"%PDF-1.4\nnot really a pdf\n")
+
+    with pytest.raises(PdfScanError):
+        inspect_pdf(str(path))
+
+
+def test_inspect_deeply_nested_pdf(tmp_path):
+    path = tmp_path / "nested.pdf"
+    body = b"%PDF-1.4\n"
+    xref_offset = len(body)
+    body += b"xref\n0 1\n0000000000 65535 f \ntrailer\n<< /Root " + b"[" * 5000
+    path.write_bytes(body + b"\nstartxref\n%d\n%%%%EOF\n" % xref_offset)
+
+    with pytest.raises(PdfScanError, match="nested too deeply"):
+        inspect_pdf(str(path))
+
+
+def test_effective_dpi_only_for_page_sized_images():
+    scan = PdfInspection(1, 612, 792, [PdfImage(width=2550, height=3300)])
+    photo = PdfInspection(1, 612, 792, [PdfImage(width=1200, height=800)])
+
+    assert round(scan.effective_dpi()) == 300
+    assert photo.effective_dpi() is None
@@ -0,0 +1,213 @@
+"""module for tests of pipeline module"""
+
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import yaml
+from PIL import Image
+from typer.testing import CliRunner
+
+from flowutils.main import app
+from flowutils.pipeline import ACTIONS, Action
+
+runner = CliRunner()
+
+
+def write_pipeline(pipeline: dict, path: str = "pipeline.yaml"):
+    with open(path, "w") as f:
+        yaml.safe_dump(pipeline, f)
+
+
+def test_run_resizes_and_sorts_every_file():
+    with runner.isolated_filesystem():
+        os.makedirs("photos")
+        for name in ["beach_1.jpg", "beach_2.jpg", "city_1.jpg"]:
+            Image.new("RGB", (400, 200), "white").save(os.path.join("photos", name))
+        write_pipeline(
+            {
+                "inputs": "photos/*.jpg",
+                "workdir": "out",
+                "steps": [
+                    {
+                        "name": "resize",
+                        "action": "resize_images",
+                        "options": {"max_size": 100},
+                    },
+                    {
+                        "name": "sort",
+                        "action": "sort_folder",
+                        "input": "resize",
+                        "options": {
+                            "rules": [
+                                {"sub_folder_name": "Beach", "contain_list": ["beach"]}
+                            ]
+                        },
+                    },
+                ],
+            }
+        )
+
+        result = runner.invoke(app, ["pipeline", "run", "pipeline.yaml"])
+
+        assert result.exit_code == 0, result.output
+        assert sorted(os.listdir("out/resize/Beach")) == ["beach_1.jpg", "beach_2.jpg"]
+        assert sorted(os.listdir("out/resize")) == ["Beach", "city_1.jpg"]
+        with Image.open("out/resize/city_1.jpg") as img:
+            assert max(img.size) == 100
+
+
+def test_run_respects_step_limits_and_stops_failed_files():
+    calls = []
+    running = {"slow": 0}
+    peak = {"slow": 0}
+    lock = threading.Lock()
+
+    def slow(path, output, options):
+        with lock:
+            running["slow"] += 1
+            peak["slow"] = max(peak["slow"], running["slow"])
+        time.sleep(0.02)
+        with lock:
+            running["slow"] -= 1
+        if "bad" in path:
+            raise RuntimeError("broken input")
+        return [output]
+
+    def record(path, output, options):
+        calls.append(os.path.basename(path))
+        return [output]
+
+    actions = {**ACTIONS, "slow": Action(slow), "record": Action(record)}
+    with patch.dict("flowutils.pipeline.ACTIONS", actions):
+        with runner.isolated_filesystem():
+            os.makedirs("in")
+            for name in ["a.txt", "b.txt", "c.txt", "bad.txt"]:
+                open(os.path.join("in", name), "w").close()
+            write_pipeline(
+                {
+                    "inputs": ["in/*.txt"],
+                    "steps": [
+                        {"name": "first", "action": "slow", "limit": 2},
+                        {"name": "second", "action": "record", "input": "first"},
+                    ],
+                }
+            )
+
+            result = runner.invoke(
+                app, ["pipeline", "run", "pipeline.yaml", "--jobs", "4"]
+            )
+
+    assert result.exit_code == 1
+    assert peak["slow"] == 2
+    assert sorted(calls) == ["a.txt", "b.txt", "c.txt"]
+
+
+def test_run_rejects_steps_reading_from_later_steps():
+    with runner.isolated_filesystem():
+        write_pipeline(
+            {
+                "inputs": "*.mp3",
+                "steps": [
+                    {"name": "m4a", "action": "convert_mp3_to_m4a", "input": "mp3"},
+                    {"name": "mp3", "action": "convert_video_to_mp3"},
+                ],
+            }
+        )
+
+        result = runner.invoke(app, ["pipeline", "run", "pipeline.yaml"])
+
+    assert result.exit_code == 1
+    assert "unknown step 'mp3'" in result.output
+
+
+def test_run_keeps_inputs_with_the_same_name_apart():
+    with runner.isolated_filesystem():
+        for folder in ["photos/a", "photos/b"]:
+            os.makedirs(folder)
+            Image.new("RGB", (400, 200), "white").save(os.path.join(folder, "x.jpg"))
+        steps = [{"name": "resize", "action": "resize_images"}]
+        write_pipeline({"inputs": "photos/**/*.jpg", "workdir": "out", "steps": steps})
+
+        result = runner.invoke(app, ["pipeline", "run", "pipeline.yaml"])
+
+        assert result.exit_code == 0, result.output
+        assert os.path.isfile("out/resize/a/x.jpg")
+        assert os.path.isfile("out/resize/b/x.jpg")
+
+        steps[0]["output"] = "{workdir}/flat/{stem}{suffix}"
+        write_pipeline({"inputs": "photos/**/*.jpg", "workdir": "out", "steps": steps})
+
+        result = runner.invoke(app, ["pipeline", "run", "pipeline.yaml"])
+
+        assert result.exit_code == 1
+        assert "is also written for" in result.output
+        assert os.listdir("out/flat") == ["x.jpg"]
+
+
+@patch("flowutils.pipeline.compress_pdf")
+def test_run_reports_missing_outputs(compress_pdf):
+    with runner.isolated_filesystem():
+        open("scan.pdf", "w").close()
+        steps = [{"name": "pdf", "action": "compress_pdf"}]
+        write_pipeline({"inputs": "*.pdf", "steps": steps})
+
+        result = runner.invoke(app, ["pipeline", "run", "pipeline.yaml"])
+
+    assert result.exit_code == 1
+    assert "no output written" in result.output
+
+
+@patch("flowutils.pipeline.convert_avchd_to_mp4")
+def test_run_passes_video_outputs_on_when_rerun(convert_avchd_to_mp4):
+    calls = []
+
+    def convert(path, output, overwrite=False):
+        if "empty" not in path:
+            open(os.path.join(output, "00001.mp4"), "w").close()
+
+    def record(path, output, options):
+        calls.append(os.path.relpath(path))
+        return [output]
+
+    convert_avchd_to_mp4.side_effect = convert
+    actions = {**ACTIONS, "record": Action(record)}
+    with patch.dict("flowutils.pipeline.ACTIONS", actions):
+        with runner.isolated_filesystem():
+            os.makedirs("cards/trip.AVCHD")
+            os.makedirs("cards/empty.AVCHD")
+            write_pipeline(
+                {
+                    "inputs": "cards/*.AVCHD",
+                    "workdir": "out",
+                    "steps": [
+                        {"name": "mp4", "action": "convert_avchd_to_mp4"},
+                        {"name": "record", "action": "record", "input": "mp4"},
+                    ],
+                }
+            )
+
+            for _ in range(2):
+                result = runner.invoke(app, ["pipeline", "run", "pipeline.yaml"])
+
+                assert result.exit_code == 1
+                assert "no output written to" in result.output
+                assert calls == [os.path.join("out", "mp4", "trip", "00001.mp4")]
+                calls.clear()
+
+
+@patch("flowutils.pipeline.convert_video_to_mp3")
+def test_run_does_not_pass_stale_outputs_on(convert_video_to_mp3):
+    with runner.isolated_filesystem():
+        open("clip.mp4", "w").close()
+        os.makedirs("out/mp3")
+        open("out/mp3/clip.mp3", "w").close()
+        steps = [{"name": "mp3", "action": "convert_video_to_mp3"}]
+        write_pipeline({"inputs": "*.mp4", "workdir": "out", "steps": steps})
+
+        result = runner.invoke(app, ["pipeline", "run", "pipeline.yaml"])
+
+        assert result.exit_code == 1
+        assert "no output written" in result.output
+        assert not os.path.exists("out/mp3/clip.mp3")
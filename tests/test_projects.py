@@ -1,4 +1,8 @@
+import errno
+import json
 import os
+import shutil
+from unittest.mock import patch
 
 from typer.testing import CliRunner
 
@@ -39,3 +43,200 @@ def test_list_projects(flow_conf: FlowConfig):
         assert result.exit_code == 0
         assert "project1" in result.output
         assert "Projects" in result.output
+
+
+def test_duplicate_projects_dropped_on_load(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        flow_conf.project_names = ["project1", "project2", "project1"]
+        save_config(flow_conf)
+
+        result = runner.invoke(app, ["add", "project2"])
+
+        assert result.exit_code == 0
+        assert "already exists" in result.output
+        assert load_config().project_names == ["project1", "project2"]
+
+
+def write_template():
+    os.makedirs("template/docs/assets")
+    with open("template/README.md", "w") as f:
+        f.write("# project\n")
+    with open("template/docs/assets/reference.bin", "wb") as f:
+        f.write(b"\0" * 4096)
+
+
+def test_create_from_template(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        write_template()
+        flow_conf.project_template = "template"
+        save_config(flow_conf)
+        os.makedirs("Projects/project1")
+        with open("Projects/project1/README.md", "w") as f:
+            f.write("custom\n")
+
+        result = runner.invoke(app, ["create"])
+
+        assert result.exit_code == 0
+        assert "1 already present" in result.output
+        for name in flow_conf.project_names:
+            assert os.path.getsize(f"Projects/{name}/docs/assets/reference.bin") == 4096
+            assert os.path.isdir(f"Projects/{name}/subdir1")
+        with open("Projects/project1/README.md") as f:
+            assert f.read() == "custom\n"
+
+
+@patch(
+    "flowutils.template.reflink_file",
+    side_effect=OSError(errno.EOPNOTSUPP, "unsupported"),
+)
+def test_create_from_template_hardlinks(reflink, flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        write_template()
+        save_config(flow_conf)
+
+        result = runner.invoke(
+            app, ["create", "--template", "template", "--mode", "hardlink", "-j", "1"]
+        )
+
+        assert result.exit_code == 0
+        assert reflink.call_count == 1
+        template_inode = os.stat("template/README.md").st_ino
+        assert os.stat("Projects/project2/README.md").st_ino == template_inode
+
+
+def test_create_with_missing_template(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        save_config(flow_conf)
+
+        result = runner.invoke(app, ["create", "--template", "missing"])
+
+        assert result.exit_code == 1
+        assert "Template folder 'missing' does not exist" in result.output
+        assert not os.path.exists("Projects")
+
+
+def test_stats_uses_mtime_cache(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        save_config(flow_conf)
+        os.makedirs("Projects/project1/data")
+        os.makedirs("Projects/project2")
+        with open("Projects/project1/data/big.bin", "wb") as f:
+            f.write(b"\0" * 2048)
+        with open("Projects/project1/notes.txt", "w") as f:
+            f.write("notes\n")
+
+        result = runner.invoke(app, ["stats", "--json"])
+
+        assert result.exit_code == 0
+        stats = {project["name"]: project for project in json.loads(result.output)}
+        assert (stats["project1"]["size"], stats["project1"]["files"]) == (2054, 2)
+        assert stats["project1"]["largest"][0] == ["data/big.bin", 2048]
+        assert stats["project3"]["missing"]
+
+        with open("Projects/project2/new.txt", "w") as f:
+            f.write("new\n")
+        with patch("os.scandir", wraps=os.scandir) as scandir:
+            result = runner.invoke(app, ["stats", "--json", "--sort", "name"])
+            assert [call.args[0] for call in scandir.call_args_list] == [
+                "./Projects/project2"
+            ]
+        assert json.loads(result.output)[1]["files"] == 1
+
+
+def test_stats_skips_unreadable_directories(flow_conf: FlowConfig):
+    scandir = os.scandir
+
+    def locked_scandir(path):
+        if path.endswith("locked"):
+            raise PermissionError(13, "Permission denied", path)
+        return scandir(path)
+
+    with runner.isolated_filesystem():
+        save_config(flow_conf)
+        os.makedirs("Projects/project1/locked")
+        os.makedirs("Projects/project2")
+        with open("Projects/project1/notes.txt", "w") as f:
+            f.write("notes\n")
+
+        with patch("flowutils.projects.os.scandir", side_effect=locked_scandir):
+            result = runner.invoke(app, ["stats", "--json", "--full"])
+
+        assert result.exit_code == 0, result.output
+        stats = {project["name"]: project for project in json.loads(result.output)}
+        assert (stats["project1"]["files"], stats["project1"]["unreadable"]) == (1, 1)
+
+
+def archive_and_restore(flow_conf: FlowConfig) -> str:
+    write_template()
+    flow_conf.project_template = "template"
+    save_config(flow_conf)
+    assert runner.invoke(app, ["create"]).exit_code == 0
+
+    result = runner.invoke(app, ["archive", "project1"])
+
+    assert result.exit_code == 0
+    assert not os.path.exists("Projects/project1")
+    assert "project1" not in load_config().project_names
+    archives = os.listdir("Projects/.archive")
+
+    result = runner.invoke(app, ["restore", "project1"])
+
+    assert result.exit_code == 0
+    assert os.path.getsize("Projects/project1/docs/assets/reference.bin") == 4096
+    assert os.path.isdir("Projects/project1/subdir2")
+    assert "project1" in load_config().project_names
+    assert os.listdir("Projects/.archive") == []
+    return archives[0]
+
+
+def test_archive_and_restore(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        archive_name = archive_and_restore(flow_conf)
+        if shutil.which("zstd"):
+            assert archive_name == "project1.tar.zst"
+
+
+@patch("flowutils.archive.shutil.which", return_value=None)
+def test_archive_and_restore_without_compressors(which, flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        assert archive_and_restore(flow_conf) == "project1.tar.gz"
+
+
+def test_archive_rejects_unsafe_names_and_locations(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        save_config(flow_conf)
+        os.makedirs("Projects/project1")
+        os.makedirs("Projects/other")
+
+        for name in [".", "..", "project1/..", "other"]:
+            result = runner.invoke(app, ["archive", name])
+            assert result.exit_code == 1, name
+        assert runner.invoke(app, ["restore", ".."]).exit_code == 1
+
+        flow_conf.project_archive_location = "Projects/project1/.archive"
+        save_config(flow_conf)
+        result = runner.invoke(app, ["archive", "project1"])
+
+        assert result.exit_code == 1
+        assert "contains the archive location" in result.output
+        assert os.path.isdir("Projects/project1")
+        assert os.path.isdir("Projects/other")
+
+
+def test_archive_and_restore_absolute_symlinks(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        save_config(flow_conf)
+        os.makedirs("Projects/project1/.venv/bin")
+        os.symlink("/usr/bin/python3", "Projects/project1/.venv/bin/python")
+
+        result = runner.invoke(app, ["archive", "project1"])
+
+        assert result.exit_code == 0, result.output
+        assert not os.path.exists("Projects/project1")
+
+        result = runner.invoke(app, ["restore", "project1"])
+
+        assert result.exit_code == 0, result.output
+        link = "Projects/project1/.venv/bin/python"
+        assert os.readlink(link) == "/usr/bin/python3"
+        assert sorted(os.listdir("Projects")) == [".archive", "project1"]
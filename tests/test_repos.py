@@ -0,0 +1,293 @@
+import json
+import os
+import subprocess
+from unittest.mock import patch
+
+import git
+from typer.testing import CliRunner
+
+from flowutils.repos import (
+    app,
+    discover_repos,
+    get_remote_url,
+    get_repo_key,
+    parse_status_output,
+    scan_directory,
+)
+from flowutils.utils import FlowConfig, GitRepoConfig, load_config, save_config
+
+runner = CliRunner()
+
+
+def init_repo(path: str, url: str = None):
+    os.makedirs(path, exist_ok=True)
+    subprocess.run(["git", "init", "-q", path], check=True)
+    if url is not None:
+        subprocess.run(["git", "-C", path, "remote", "add", "origin", url], check=True)
+
+
+def test_discover_repos_prunes_ignored_and_nested(tmp_path):
+    init_repo(str(tmp_path / "project1" / "app"), "https://example.com/app.git")
+    init_repo(str(tmp_path / "project1" / "app" / "vendor" / "nested"))
+    init_repo(str(tmp_path / "project2" / "node_modules" / "lib"))
+    init_repo(str(tmp_path / "project2" / "build" / "tool"))
+
+    git_paths = discover_repos(str(tmp_path), [".git", "node_modules", "build"], jobs=4)
+
+    assert git_paths == [str(tmp_path / "project1" / "app" / ".git")]
+
+
+def test_get_remote_url_parses_git_config(tmp_path):
+    init_repo(str(tmp_path / "app"), "git@example.com:team/app.git")
+
+    assert get_remote_url(str(tmp_path / "app" / ".git")) == (
+        "git@example.com:team/app.git"
+    )
+    init_repo(str(tmp_path / "local"))
+    assert get_remote_url(str(tmp_path / "local" / ".git")) is None
+
+
+def test_collect(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        init_repo("Projects/project1/app", "https://example.com/app.git")
+        init_repo("Projects/project2/.venv/src/pkg", "https://example.com/pkg.git")
+        flow_conf.repo_ignore_globs = ["skip*"]
+        init_repo("Projects/skipped/repo", "https://example.com/skipped.git")
+        save_config(flow_conf)
+
+        result = runner.invoke(app, ["collect"])
+
+        assert result.exit_code == 0
+        config = load_config()
+        assert [repo.url for repo in config.git_repos] == [
+            "https://example.com/app.git"
+        ]
+
+
+def create_bare_repo(path: str) -> str:
+    """Create a bare repository with two commits and return its file:// URL."""
+    work_tree = f"{path}_work"
+    init_repo(work_tree)
+    for idx in range(2):
+        with open(os.path.join(work_tree, "readme.md"), "w") as f:
+            f.write(f"version {idx}\n")
+        subprocess.run(["git", "-C", work_tree, "add", "."], check=True)
+        subprocess.run(
+            [
+                "git",
+                "-C",
+                work_tree,
+                "-c",
+                "user.name=flow",
+                "-c",
+                "user.email=flow@example.com",
+                "commit",
+                "-q",
+                "-m",
+                f"commit {idx}",
+            ],
+            check=True,
+        )
+    subprocess.run(["git", "clone", "-q", "--bare", work_tree, path], check=True)
+    subprocess.run(
+        ["git", "-C", path, "config", "uploadpack.allowFilter", "true"], check=True
+    )
+    return f"file://{os.path.abspath(path)}"
+
+
+def test_create_parallel_shallow_partial_clones(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        flow_conf.git_repos = [
+            GitRepoConfig(
+                url=create_bare_repo(f"remotes/repo{idx}.git"),
+                file_location=os.path.abspath(f"Projects/repo{idx}/.git"),
+            )
+            for idx in range(3)
+        ]
+        save_config(flow_conf)
+
+        result = runner.invoke(
+            app,
+            ["create", "-j", "3", "--depth", "1", "--filter", "blob:none"]
+            + ["--log-dir", "logs"],
+        )
+
+        assert result.exit_code == 0
+        for idx in range(3):
+            assert os.path.isfile(f"Projects/repo{idx}/.git/shallow")
+            log = subprocess.run(
+                ["git", "-C", f"Projects/repo{idx}", "rev-list", "--count", "HEAD"],
+                capture_output=True,
+                text=True,
+            )
+            assert log.stdout.strip() == "1"
+        assert len(os.listdir("logs")) == 3
+
+
+def test_create_clones_nested_repos_after_their_parent(flow_conf: FlowConfig):
+    events = []
+    clone_from = git.Repo.clone_from
+
+    def record_clone(url, to_path, **kwargs):
+        events.append(("start", os.path.basename(to_path)))
+        repo = clone_from(url, to_path, **kwargs)
+        events.append(("end", os.path.basename(to_path)))
+        return repo
+
+    with runner.isolated_filesystem():
+        flow_conf.git_repos = [
+            GitRepoConfig(
+                url=create_bare_repo(f"remotes/{name}.git"),
+                file_location=os.path.abspath(f"Projects/{location}/.git"),
+            )
+            for name, location in [("lib", "app/libs/lib"), ("app", "app")]
+        ]
+        save_config(flow_conf)
+
+        with patch("flowutils.repos.git.Repo.clone_from", side_effect=record_clone):
+            result = runner.invoke(app, ["create", "-j", "2"])
+
+        assert result.exit_code == 0, result.output
+        assert events.index(("end", "app")) < events.index(("start", "lib"))
+        assert os.path.isfile("Projects/app/readme.md")
+        assert os.path.isfile("Projects/app/libs/lib/readme.md")
+
+
+@patch("flowutils.repos.RETRY_DELAY", 0)
+def test_create_reports_failed_clones(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        flow_conf.git_repos = [
+            GitRepoConfig(
+                url=f"file://{os.path.abspath('missing.git')}",
+                file_location=os.path.abspath("Projects/missing/.git"),
+            )
+        ]
+        save_config(flow_conf)
+
+        result = runner.invoke(app, ["create", "--retries", "1"])
+
+        assert result.exit_code == 1
+        assert "after 2 attempts" in result.output
+
+
+def test_parse_status_output():
+    output = "\n".join(
+        [
+            "# branch.oid 0123456789abcdef",
+            "# branch.head main",
+            "# branch.upstream origin/main",
+            "# branch.ab +2 -3",
+            "1 .M N... 100644 100644 100644 abc abc readme.md",
+            "? notes.txt",
+        ]
+    )
+
+    status = parse_status_output("repo", output)
+
+    assert status.branch == "main"
+    assert (status.ahead, status.behind) == (2, 3)
+    assert status.dirty == 2
+
+
+def test_fetch_and_status(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        url = create_bare_repo("remotes/repo.git")
+        subprocess.run(["git", "clone", "-q", url, "Projects/repo"], check=True)
+        with open("Projects/repo/new.txt", "w") as f:
+            f.write("new\n")
+        flow_conf.git_repos = [
+            GitRepoConfig(url=url, file_location=os.path.abspath("Projects/repo/.git")),
+            GitRepoConfig(url=url, file_location=os.path.abspath("Missing/.git")),
+        ]
+        save_config(flow_conf)
+
+        result = runner.invoke(app, ["fetch", "--json"])
+
+        assert result.exit_code == 0
+        statuses = json.loads(result.output)
+        assert statuses[0]["dirty"] == 1
+        assert (statuses[0]["ahead"], statuses[0]["behind"]) == (0, 0)
+        assert statuses[0]["last_commit"] is not None
+        assert statuses[1]["error"] == "missing"
+
+
+def test_collect_uses_mtime_cache(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        init_repo("Projects/project1/app", "https://example.com/app.git")
+        init_repo("Projects/project2/lib", "https://example.com/lib.git")
+        save_config(flow_conf)
+        assert runner.invoke(app, ["collect"]).exit_code == 0
+
+        with patch("flowutils.repos.scan_directory", wraps=scan_directory) as scan:
+            assert runner.invoke(app, ["collect"]).exit_code == 0
+            assert scan.call_count == 0
+
+            init_repo("Projects/project2/tool", "https://example.com/tool.git")
+            assert runner.invoke(app, ["collect"]).exit_code == 0
+            scanned = [call.args[0] for call in scan.call_args_list]
+            assert scanned == ["./Projects/project2", "./Projects/project2/tool"]
+
+            assert runner.invoke(app, ["collect", "--full"]).exit_code == 0
+            assert len(scan.call_args_list) > len(scanned)
+
+        urls = [repo.url for repo in load_config().git_repos]
+        assert "https://example.com/tool.git" in urls
+
+
+def test_snapshot_and_create_from_snapshot(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        url = create_bare_repo("remotes/repo.git")
+        flow_conf.repo_snapshot_location = "./Snapshots"
+        flow_conf.git_repos = [
+            GitRepoConfig(url=url, file_location=os.path.abspath("Projects/repo/.git"))
+        ]
+        save_config(flow_conf)
+
+        assert runner.invoke(app, ["snapshot"]).exit_code == 0
+        result = runner.invoke(app, ["snapshot"])
+        assert result.exit_code == 0
+        assert "Updated mirror" in result.output
+        assert len(os.listdir("Snapshots")) == 1
+
+        result = runner.invoke(app, ["create", "--from-snapshot"])
+
+        assert result.exit_code == 0
+        assert "from 'snapshot'" in result.output
+        remote = subprocess.run(
+            ["git", "-C", "Projects/repo", "remote", "get-url", "origin"],
+            capture_output=True,
+            text=True,
+        )
+        assert remote.stdout.strip() == url
+        assert os.path.isfile("Projects/repo/readme.md")
+
+
+def test_repo_keys_do_not_collide():
+    keys = {
+        get_repo_key(GitRepoConfig(url="u", file_location=location))
+        for location in ["/home/u/my_app/api/.git", "/home/u/my/app_api/.git"]
+    }
+
+    assert len(keys) == 2
+
+
+def test_create_ignores_mirror_of_another_url(flow_conf: FlowConfig):
+    with runner.isolated_filesystem():
+        location = os.path.abspath("Projects/repo/.git")
+        flow_conf.repo_snapshot_location = "./Snapshots"
+        flow_conf.git_repos = [
+            GitRepoConfig(
+                url=create_bare_repo("remotes/old.git"), file_location=location
+            )
+        ]
+        save_config(flow_conf)
+        assert runner.invoke(app, ["snapshot"]).exit_code == 0
+
+        url = create_bare_repo("remotes/new.git")
+        flow_conf.git_repos = [GitRepoConfig(url=url, file_location=location)]
+        save_config(flow_conf)
+        result = runner.invoke(app, ["create", "--from-snapshot"])
+
+        assert result.exit_code == 0, result.output
+        assert "from 'snapshot'" not in result.output
+        assert os.path.isfile("Projects/repo/readme.md")
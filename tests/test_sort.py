@@ -65,11 +65,10 @@ def test_sort_command(mock_load_config, temp_dir):
     assert os.path.exists(os.path.join(temp_dir, "Images", "image1.jpg"))
 
 
-@patch("flowutils.sort.load_config")
-@patch("flowutils.sort.save_config")
-def test_add_rule_command(mock_save_config, mock_load_config):
+@patch("flowutils.sort.update_config")
+def test_add_rule_command(mock_update_config):
     mock_config = FlowConfig()
-    mock_load_config.return_value = mock_config
+    mock_update_config.side_effect = lambda mutate, sections: mutate(mock_config)
 
     result = runner.invoke(app, ["add-rule", "~/Downloads", "PDFs", "pdf"])
 
@@ -79,7 +78,7 @@ def test_add_rule_command(mock_save_config, mock_load_config):
     assert len(mock_config.sort.folder_configs[0].rules) == 1
     assert mock_config.sort.folder_configs[0].rules[0].sub_folder_name == "PDFs"
     assert mock_config.sort.folder_configs[0].rules[0].contain_list == ["pdf"]
-    mock_save_config.assert_called_once()
+    mock_update_config.assert_called_once()
 
 
 @patch("flowutils.sort.load_config")
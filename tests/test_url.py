@@ -1,6 +1,13 @@
 """module for tests of url module"""
 
-from flowutils.url import escape_url
+import os
+from unittest.mock import patch
+
+from typer.testing import CliRunner
+
+from flowutils.url import app, escape_url
+
+runner = CliRunner()
 
 
 def test_escape_url_with_spaces():
@@ -41,3 +48,37 @@ def test_escape_url_no_changes_needed():
 
 def test_escape_url_empty_string():
     assert escape_url("") == ""
+
+
+def test_forklift_links_streams_nul_delimited_stdin():
+    result = runner.invoke(app, ["forklift-links", "-0"], input="/a b\0/c~d\0")
+
+    assert result.exit_code == 0
+    assert result.output.splitlines() == [
+        "openforklift:///a%20b",
+        "openforklift:///c%7Ed",
+    ]
+
+
+@patch("flowutils.url.pyperclip.copy")
+def test_forklift_links_expands_directories(copy):
+    with runner.isolated_filesystem():
+        os.makedirs("docs/sub")
+        for path in ["docs/b.pdf", "docs/a.pdf", "docs/sub/c.pdf"]:
+            open(path, "w").close()
+        with open("paths.txt", "w") as f:
+            f.write("docs\nother file.txt\n")
+
+        result = runner.invoke(
+            app, ["forklift-links", "paths.txt", "--expand", "--copy"]
+        )
+
+        assert result.exit_code == 0
+        links = [
+            "openforklift://docs/a.pdf",
+            "openforklift://docs/b.pdf",
+            "openforklift://docs/sub/c.pdf",
+            "openforklift://other%20file.txt",
+        ]
+        assert result.output.splitlines()[:4] == links
+        copy.assert_called_once_with("\n".join(links))